@@ -13,24 +13,53 @@ import threading
 import re
 import requests
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify
-from quark_failed_task_update import FailedTaskIncrementalUpdater
+from quark_failed_task_update import (FailedTaskIncrementalUpdater, JobContext, MirrorIndex, TaskStatusStore,
+                                     TriggerCoordinator, orjson)
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:  # Flask < 2.2 不支持自定义JSON provider
+    DefaultJSONProvider = None
 
 app = Flask(__name__)
 
-# 全局任务存储
-task_status = {}
+if orjson is not None and DefaultJSONProvider is not None:
+    class OrjsonProvider(DefaultJSONProvider):
+        """使用orjson序列化接口响应，orjson不支持的值回退到默认实现"""
+
+        def dumps(self, obj, **kwargs):
+            try:
+                return orjson.dumps(obj).decode('utf-8')
+            except TypeError:
+                return super().dumps(obj, **kwargs)
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = OrjsonProvider(app)
 
 
 class AsyncResourceSearchAPI:
     def __init__(self, config_path):
         self.config_path = config_path
+        # 更新器初始化时已加载配置，之后仅在文件变化时重新加载
         self.updater = FailedTaskIncrementalUpdater(config_path)
-        self.updater.load_config()
 
-        # 从环境变量获取配置
+        # 任务状态存入SQLite（与配置文件同目录），多个工作进程共享
+        self.task_status = TaskStatusStore(f"{os.path.splitext(config_path)[0]}_api_tasks.db")
+
+        # 从环境变量获取配置；更新器的搜索、分享详情和触发请求也使用这里的地址和token，同一进程只访问一个上游
         self.api_token = os.getenv('QUARK_API_TOKEN', '87e7eb745cb0d5d8')
         self.base_url = os.getenv('QUARK_BASE_URL', 'http://192.168.2.99:15005')
+        self.updater.api_token = self.api_token
+        self.updater.base_url = self.base_url
+
+        # 窗口期内多次添加成功只触发一次资源更新，多个工作进程通过任务状态库共享触发记录
+        self.updater.trigger_coordinator = TriggerCoordinator(
+            self.trigger_resource_update, self.updater.get_setting('trigger_window', 10), history=self.task_status
+        )
 
     def clean_taskname(self, taskname):
         """清理任务名称，去除空格、换行等特殊字符"""
@@ -50,15 +79,17 @@ class AsyncResourceSearchAPI:
         return cleaned
 
     def trigger_resource_update(self):
-        """触发资源更新脚本"""
+        """触发资源更新脚本（SQLite任务存储中新增的任务先导出到配置文件）"""
+        self.updater.export_tasks()
         try:
-            url = f"{self.base_url}/run_script_now?token={self.api_token}"
+            params = {"token": self.api_token}
             headers = {
                 "Content-Type": "application/json"
             }
 
             print("🔄 触发资源更新脚本...")
-            response = requests.post(url, json={}, headers=headers, timeout=30)
+            response = self.updater.upstream_request('post', 'run_script_now', json={}, headers=headers,
+                                                     params=params)
 
             if response.status_code == 200:
                 result = response.json()
@@ -79,226 +110,437 @@ class AsyncResourceSearchAPI:
             print(f"❌ 触发资源更新脚本时出错: {e}")
             return False
 
-    def background_add_resource(self, task_id, taskname, savepath=None, runweek=None, pattern="", replace=""):
-        """后台添加资源的线程函数"""
-        try:
-            # 清理任务名称
-            cleaned_taskname = self.clean_taskname(taskname)
-
-            task_status[task_id] = {
-                'status': 'processing',
-                'message': f'正在搜索资源: {cleaned_taskname}',
-                'progress': 10
-            }
+    def upstream_unavailable(self, taskname=None):
+        """上游服务熔断中时返回失败状态（调用方直接返回，不再发出请求），否则返回None"""
+        breaker = self.updater.breaker
+        if not breaker.is_open():
+            return None
+        status = {
+            'status': 'upstream_unavailable',
+            'message': f'上游服务暂不可用，{breaker.retry_after():.0f}秒后重试',
+            'retry_after': round(breaker.retry_after())
+        }
+        if taskname is not None:
+            status['taskname'] = taskname
+        return status
+
+    def task_exists(self, taskname):
+        """配置中是否已有同名任务"""
+        return self.updater.task_exists(taskname)
+
+    def build_new_task(self, cleaned_taskname, best_resource, savepath=None, runweek=None, pattern="", replace=""):
+        """根据选出的最佳资源生成新任务配置"""
+        # 生成默认保存路径（使用清理后的任务名）
+        if not savepath:
+            savepath = f"/qh_nas/Movie/{cleaned_taskname}"
+
+        # 设置默认运行周期
+        if not runweek:
+            runweek = [1, 2, 3, 4, 5, 6, 7]  # 每天运行
+
+        # 创建新任务配置（使用清理后的任务名）
+        new_task = {
+            "taskname": cleaned_taskname,
+            "shareurl": best_resource['url'],
+            "savepath": savepath,
+            "pattern": pattern,
+            "replace": replace,
+            "enddate": "",  # 无结束日期
+            "emby_id": "",
+            "update_subdir": "",
+            "runweek": runweek,
+            "ignore_extension": False,
+            "media_id": "",
+            "addition": {
+                "emby": {
+                    "media_id": "",
+                    "try_match": True
+                },
+                "alist_strm_gen": {
+                    "auto_gen": True
+                },
+                "aria2": {
+                    "auto_download": False,
+                    "pause": False
+                },
+                "alist_sync": {
+                    "enable": False,
+                    "save_path": "",
+                    "verify_path": "",
+                    "full_path_mode": False
+                },
+                "smartstrm": {},
+                "fnv": {
+                    "auto_refresh": False,
+                    "mdb_name": ""
+                }
+            },
+            "last_updated": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
 
-            # 检查任务是否已存在
-            existing_tasks = [task for task in self.updater.config_data.get('tasklist', [])
-                              if task.get('taskname') == cleaned_taskname]
-            if existing_tasks:
-                task_status[task_id] = {
-                    'status': 'exists',
-                    'message': f'任务 "{cleaned_taskname}" 已存在',
-                    'taskname': cleaned_taskname
+        # 如果有最佳文件夹信息，使用最佳文件夹的分享链接和起始fid
+        if best_resource.get('best_folder'):
+            best_folder = best_resource['best_folder']
+            new_task['shareurl'] = best_folder['share_url']
+
+            # 使用最佳文件夹中的第一个剧集作为起始点
+            if best_folder.get('episodes'):
+                first_episode = min(best_folder['episodes'], key=lambda x: x.episode)
+                new_task['startfid'] = first_episode.fid
+
+                # 记录文件夹信息
+                new_task['best_folder_info'] = {
+                    'folder_path': [item.get('file_name', '') for item in best_folder['folder_path']],
+                    'min_episode': best_folder['min_episode'],
+                    'max_episode': best_folder['max_episode'],
+                    'episode_count': len(best_folder['episodes'])
                 }
-                return
 
-            task_status[task_id] = {
-                'status': 'processing',
-                'message': f'正在获取资源列表: {cleaned_taskname}',
-                'progress': 30
+        return new_task
+
+    def save_new_task(self, cleaned_taskname, new_task, job=None):
+        """写入新任务配置，返回 'saved'、'exists'、'cancelled' 或 'save_error'"""
+        # 加锁后重新读取配置再添加，多个工作进程同时添加时不会互相覆盖
+        with self.updater.config_lock():
+            # 写入前最后检查一次取消请求，已取消的任务不修改配置
+            if job is not None and job.cancelled():
+                return 'cancelled'
+            self.updater.reload_config_if_changed()
+            if self.task_exists(cleaned_taskname):
+                return 'exists'
+
+            # 保存配置（SQLite任务存储只写入一行）
+            if self.updater.add_tasks([new_task]):
+                return 'saved'
+            return 'save_error'
+
+    @staticmethod
+    def save_failure_status(cleaned_taskname, result):
+        """新任务未写入配置时的任务状态"""
+        if result == 'exists':
+            return {
+                'status': 'exists',
+                'message': f'任务 "{cleaned_taskname}" 已存在',
+                'taskname': cleaned_taskname
+            }
+        if result == 'cancelled':
+            return {
+                'status': 'cancelled',
+                'message': f'任务已取消，未修改配置: {cleaned_taskname}',
+                'taskname': cleaned_taskname
             }
+        return {
+            'status': 'save_error',
+            'message': '配置保存失败',
+            'taskname': cleaned_taskname
+        }
 
-            # 获取新的资源列表（使用清理后的任务名）
-            new_resources = self.updater.get_new_resources(cleaned_taskname)
-            if not new_resources:
-                task_status[task_id] = {
-                    'status': 'not_found',
-                    'message': f'未找到资源: {cleaned_taskname}',
-                    'taskname': cleaned_taskname
-                }
-                return
+    @staticmethod
+    def success_status(cleaned_taskname, best_resource, new_task):
+        """新任务添加成功时的任务状态"""
+        episode_info = ""
+        if best_resource.get('all_episodes'):
+            min_ep = best_resource.get('min_episode', '?')
+            max_ep = best_resource.get('max_episode', '?')
+            episode_info = f"，共{len(best_resource['all_episodes'])}集，从第{min_ep}到第{max_ep}集"
+
+        # 如果有最佳文件夹信息，添加文件夹详情
+        folder_info = ""
+        if best_resource.get('best_folder'):
+            folder_path = "/".join(
+                [item.get('file_name', '') for item in best_resource['best_folder']['folder_path']]) or "根目录"
+            folder_info = f"，最佳文件夹: {folder_path}"
+
+        # 处理超时时结果来自已完成的部分分析
+        partial = bool(best_resource.get('partial'))
+        partial_info = "（处理超时，基于已完成的分析选出）" if partial else ""
+
+        # 内容相同的镜像分享只分析了一次
+        mirrors_skipped = best_resource.get('mirrors_skipped', 0)
+        mirror_info = f"，跳过{mirrors_skipped}个镜像分享" if mirrors_skipped else ""
+
+        return {
+            'status': 'success',
+            'message': f'成功添加"{cleaned_taskname}"{episode_info}{folder_info}{mirror_info}{partial_info}',
+            'taskname': cleaned_taskname,
+            'task': new_task,
+            'episodes': len(best_resource.get('all_episodes', [])),
+            'min_episode': best_resource.get('min_episode'),
+            'max_episode': best_resource.get('max_episode'),
+            'best_folder': best_resource.get('best_folder') is not None,
+            'partial': partial,
+            'mirrors_skipped': mirrors_skipped
+        }
 
-            task_status[task_id] = {
-                'status': 'processing',
-                'message': f'分析匹配资源: {cleaned_taskname}',
-                'progress': 50
+    def request_trigger(self, task_id, status):
+        """新任务保存后请求触发资源更新，任务状态记录加入的批次和触发结果"""
+        def on_join(batch_id):
+            self.task_status.update_fields(task_id, trigger_batch=batch_id, update_triggered=None,
+                                           message=f"{status['message']}，等待触发资源更新（批次 {batch_id}）")
+
+        def on_triggered(batch_id, update_triggered):
+            # 状态存储返回的是副本，原地修改不会生效，需要整体写回
+            result = "，已触发资源更新" if update_triggered else "，资源更新触发失败"
+            self.task_status.update_fields(task_id, trigger_batch=batch_id, update_triggered=update_triggered,
+                                           message=f"{status['message']}{result}（批次 {batch_id}）")
+
+        return self.updater.request_resource_update(on_triggered, on_join)
+
+    def new_job(self, task_id, auto_check=True):
+        """创建后台添加任务的截止时间和取消状态，时长取配置项 job_timeout（秒，默认120，0为不限时）
+
+        取消请求记录在任务状态库中，由任一工作进程收到的 DELETE 请求写入；auto_check 见 JobContext
+        """
+        return JobContext(self.updater.get_setting('job_timeout', 120),
+                          lambda: self.task_status.cancel_requested(task_id), auto_check)
+
+    def cancel_task(self, task_id):
+        """请求取消排队中或运行中的添加任务，返回 (响应内容, HTTP状态码)
+
+        取消是协作式的：任务在下次请求上游前停止，写入配置前再检查一次，已取消的任务不修改配置
+        """
+        info = self.task_status.get(task_id)
+        if info is None:
+            return {'success': False, 'message': '任务ID不存在'}, 404
+
+        status = info.get('status')
+        if status not in ('accepted', 'processing'):
+            return {
+                'success': False,
+                'message': f'任务已结束（{status}），无法取消',
+                'task_id': task_id,
+                'status': status
+            }, 409
+
+        self.task_status.request_cancel(task_id)
+        return {
+            'success': True,
+            'message': '已请求取消任务，正在停止',
+            'task_id': task_id,
+            'status': 'cancelling',
+            'status_url': f'/api/task/{task_id}'
+        }, 202
+
+    @staticmethod
+    def timeout_status(cleaned_taskname):
+        """到截止时间时还没有任何可用分析结果的任务状态"""
+        return {
+            'status': 'timeout',
+            'message': f'处理超时，未找到合适的资源: {cleaned_taskname}',
+            'taskname': cleaned_taskname
+        }
+
+    def find_best_resource(self, cleaned_taskname, report, share_cache=None, job=None):
+        """搜索、分析候选资源并选出最佳资源，返回 (最佳资源, None) 或 (None, 失败时的任务状态)
+
+        report(message, progress, **extra) 报告处理进度；share_cache 为批量添加时共享的分享详情缓存，
+        命中缓存时不再请求上游也不再等待；
+        job 为任务截止时间，到时后不再请求上游，从已完成的分析中选出最佳资源并标记 partial；
+        任务被取消时立即停止，返回取消状态
+        """
+        return self.run_steps(self.find_best_resource_steps(cleaned_taskname, report, share_cache, job))
+
+    def run_steps(self, steps):
+        """执行 find_best_resource_steps 产出的步骤：调用对应的 step_<步骤名> 方法并把结果送回"""
+        result = None
+        while True:
+            try:
+                name, *args = steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            result = getattr(self, f'step_{name}')(*args)
+
+    def step_cancelled(self, job):
+        return job.cancelled()
+
+    def step_report(self, report, message, progress, extra):
+        report(message, progress, **extra)
+
+    def step_call(self, func, *args):
+        """读写SQLite等阻塞操作"""
+        return func(*args)
+
+    def step_new_share_cache(self):
+        return self.updater.new_share_cache()
+
+    def step_search(self, taskname, job):
+        return self.updater.get_new_resources(taskname, job)
+
+    def step_prerank(self, resources, taskname, target_episode, share_cache, job, mirrors):
+        return self.updater.prerank_candidates(resources, taskname, target_episode, share_cache, job, mirrors)
+
+    def step_skip_mirror(self, resource, share_cache, mirrors):
+        return self.updater.skip_mirror(resource, share_cache, mirrors)
+
+    def step_prefetch(self, resources, share_cache):
+        self.updater.prefetch_candidates(resources, share_cache)
+
+    def step_analyze(self, share_url, taskname, on_folder, share_cache, job):
+        return self.updater.analyze_resource_structure_optimized(share_url, taskname, on_folder=on_folder,
+                                                                 share_cache=share_cache, job=job)
+
+    def find_best_resource_steps(self, cleaned_taskname, report, share_cache=None, job=None):
+        """find_best_resource 的处理流程，同步版本和 api_async.py 的异步版本共用
+
+        生成器：请求上游、读写SQLite等步骤以 (步骤名, 参数...) 产出，由 run_steps 执行后把结果送回，
+        最后返回 (最佳资源, None) 或 (None, 失败时的任务状态)；参数见 find_best_resource
+        """
+        if job is not None and (yield ('cancelled', job)):
+            return None, self.save_failure_status(cleaned_taskname, 'cancelled')
+
+        yield ('report', report, f'正在获取资源列表: {cleaned_taskname}', 30, {})
+
+        # 获取新的资源列表（使用清理后的任务名）
+        new_resources = yield ('search', cleaned_taskname, job)
+        if job is not None and (yield ('cancelled', job)):
+            return None, self.save_failure_status(cleaned_taskname, 'cancelled')
+        unavailable = self.upstream_unavailable(cleaned_taskname)
+        if unavailable:
+            return None, unavailable
+        if job is not None and job.expired():
+            return None, self.timeout_status(cleaned_taskname)
+        if not new_resources:
+            return None, {
+                'status': 'not_found',
+                'message': f'未找到资源: {cleaned_taskname}',
+                'taskname': cleaned_taskname
             }
 
-            # 过滤匹配的任务名
-            matched_resources = []
-            for resource in new_resources:
-                candidate_taskname = resource.get('taskname', '')
-                if candidate_taskname and self.updater.is_taskname_match(candidate_taskname, cleaned_taskname):
-                    matched_resources.append(resource)
-
-            if not matched_resources:
-                task_status[task_id] = {
-                    'status': 'no_match',
-                    'message': f'未找到任务名匹配的资源: {cleaned_taskname}',
-                    'taskname': cleaned_taskname
-                }
-                return
+        yield ('report', report, f'分析匹配资源: {cleaned_taskname}', 50, {})
 
-            task_status[task_id] = {
-                'status': 'processing',
-                'message': f'分析资源结构: {len(matched_resources)}个匹配资源',
-                'progress': 70
+        # 过滤匹配的任务名，按相似度排序（合并重复链接，跳过近期已确认失效或无剧集的候选）
+        matched_resources = yield ('call', self.updater.select_candidates, new_resources, cleaned_taskname)
+
+        if not matched_resources:
+            return None, {
+                'status': 'no_match',
+                'message': f'未找到任务名匹配的资源: {cleaned_taskname}',
+                'taskname': cleaned_taskname
             }
 
+        # 预排序：只请求各候选的根目录，挑出最可能从第1集开始完整收录的几个再深度分析
+        yield ('report', report, f'预排序候选资源: {len(matched_resources)}个匹配资源', 60, {})
+        own_cache = share_cache is None
+        if own_cache:
+            share_cache = yield ('new_share_cache',)
+        mirrors = MirrorIndex()
+        try:
+            candidates = yield ('prerank', matched_resources[:10], cleaned_taskname, 1, share_cache, job, mirrors)
+            candidates = candidates[:3]  # 只深度分析前3个
+
+            yield ('report', report, f'分析资源结构: {len(candidates)}个候选资源', 70, {})
+
             # 分析候选资源 - 使用优化版分析方法
             resources_analysis = []
-            for i, resource in enumerate(matched_resources[:3]):  # 只分析前3个
+            for i, resource in enumerate(candidates):
                 new_url = resource.get('shareurl')
                 new_taskname = resource.get('taskname', '未知资源')
 
+                if job is not None and (yield ('cancelled', job)):
+                    break
                 if not new_url:
                     continue
 
-                task_status[task_id] = {
-                    'status': 'processing',
-                    'message': f'分析资源 {i + 1}/{min(3, len(matched_resources))}: {new_taskname}',
-                    'progress': 70 + (i * 10)
-                }
+                yield ('report', report, f'分析资源 {i + 1}/{len(candidates)}: {new_taskname}', 70 + (i * 10), {})
+
+                # 每解析完一个文件夹就更新实时剧集数
+                def report_folder(analysis, folder_info, i=i, new_taskname=new_taskname):
+                    episode_count = len(analysis['all_episodes'])
+                    report(f'分析资源 {i + 1}/{len(candidates)}: {new_taskname}'
+                           f'（已发现 {episode_count} 集）', 70 + (i * 10), episodes_found=episode_count)
+
+                # 内容与已分析候选相同的镜像分享不再深度分析
+                if (yield ('skip_mirror', resource, share_cache, mirrors)):
+                    continue
+
+                # 分析当前候选期间，后台预取后续候选的目录
+                yield ('prefetch', candidates[i + 1:], share_cache)
 
-                # 使用优化版资源结构分析方法
-                analysis = self.updater.analyze_resource_structure_optimized(new_url, cleaned_taskname)
+                # 使用优化版资源结构分析方法（根目录已在预排序时获取）
+                analysis = yield ('analyze', new_url, cleaned_taskname, report_folder, share_cache, job)
+                if (yield ('skip_mirror', resource, share_cache, mirrors)):
+                    continue
                 resources_analysis.append(analysis)
-                time.sleep(1)  # 稍微增加延迟避免请求过快
+        finally:
+            if own_cache:
+                share_cache.close()
+
+        if job is not None and (yield ('cancelled', job)):
+            return None, self.save_failure_status(cleaned_taskname, 'cancelled')
+
+        # 分析途中上游熔断时部分候选未能获取，结果不可靠
+        unavailable = self.upstream_unavailable(cleaned_taskname)
+        if unavailable:
+            return None, unavailable
+
+        yield ('report', report, f'选择最佳资源', 90, {})
+
+        # 选择最佳资源（没有已保存剧集，所以传入空列表）
+        timed_out = job is not None and job.expired()
+        if timed_out:
+            yield ('report', report, f'处理超时，从已完成的分析中选择最佳资源', 90, {})
+        best_resource = self.updater.select_best_resource(resources_analysis, cleaned_taskname, [])
+
+        if not best_resource and timed_out:
+            return None, self.timeout_status(cleaned_taskname)
+        if timed_out:
+            best_resource['partial'] = True
+        if not best_resource:
+            return None, {
+                'status': 'no_suitable',
+                'message': f'未找到合适的资源: {cleaned_taskname}',
+                'taskname': cleaned_taskname
+            }
+        best_resource['mirrors_skipped'] = mirrors.skipped
+        return best_resource, None
+
+    def background_add_resource(self, task_id, taskname, savepath=None, runweek=None, pattern="", replace=""):
+        """后台添加资源的线程函数"""
+        job = self.new_job(task_id)
+        try:
+            # 清理任务名称
+            cleaned_taskname = self.clean_taskname(taskname)
 
-            task_status[task_id] = {
+            self.task_status[task_id] = {
                 'status': 'processing',
-                'message': f'选择最佳资源',
-                'progress': 90
+                'message': f'正在搜索资源: {cleaned_taskname}',
+                'progress': 10
             }
 
-            # 选择最佳资源（没有已保存剧集，所以传入空列表）
-            best_resource = self.updater.select_best_resource(resources_analysis, cleaned_taskname, [])
+            # 检查任务是否已存在（配置可能已被转存脚本或其他工作进程修改）
+            self.updater.reload_config_if_changed()
+            if self.task_exists(cleaned_taskname):
+                self.task_status[task_id] = self.save_failure_status(cleaned_taskname, 'exists')
+                return
 
-            if not best_resource:
-                task_status[task_id] = {
-                    'status': 'no_suitable',
-                    'message': f'未找到合适的资源: {cleaned_taskname}',
-                    'taskname': cleaned_taskname
+            def report(message, progress, **extra):
+                self.task_status[task_id] = {
+                    'status': 'processing',
+                    'message': message,
+                    'progress': progress,
+                    **extra
                 }
-                return
 
-            # 生成默认保存路径（使用清理后的任务名）
-            if not savepath:
-                savepath = f"/qh_nas/Movie/{cleaned_taskname}"
-
-            # 设置默认运行周期
-            if not runweek:
-                runweek = [1, 2, 3, 4, 5, 6, 7]  # 每天运行
-
-            # 创建新任务配置（使用清理后的任务名）
-            new_task = {
-                "taskname": cleaned_taskname,
-                "shareurl": best_resource['url'],
-                "savepath": savepath,
-                "pattern": pattern,
-                "replace": replace,
-                "enddate": "",  # 无结束日期
-                "emby_id": "",
-                "update_subdir": "",
-                "runweek": runweek,
-                "ignore_extension": False,
-                "media_id": "",
-                "addition": {
-                    "emby": {
-                        "media_id": "",
-                        "try_match": True
-                    },
-                    "alist_strm_gen": {
-                        "auto_gen": True
-                    },
-                    "aria2": {
-                        "auto_download": False,
-                        "pause": False
-                    },
-                    "alist_sync": {
-                        "enable": False,
-                        "save_path": "",
-                        "verify_path": "",
-                        "full_path_mode": False
-                    },
-                    "smartstrm": {},
-                    "fnv": {
-                        "auto_refresh": False,
-                        "mdb_name": ""
-                    }
-                },
-                "last_updated": time.strftime("%Y-%m-%dT%H:%M:%S")
-            }
+            best_resource, failure = self.find_best_resource(cleaned_taskname, report, job=job)
+            if failure:
+                self.task_status[task_id] = failure
+                return
 
-            # 如果有最佳文件夹信息，使用最佳文件夹的分享链接和起始fid
-            if best_resource.get('best_folder'):
-                best_folder = best_resource['best_folder']
-                new_task['shareurl'] = best_folder['share_url']
-
-                # 使用最佳文件夹中的第一个剧集作为起始点
-                if best_folder.get('episodes'):
-                    first_episode = min(best_folder['episodes'], key=lambda x: x['episode'])
-                    new_task['startfid'] = first_episode['fid']
-
-                    # 记录文件夹信息
-                    new_task['best_folder_info'] = {
-                        'folder_path': [item.get('file_name', '') for item in best_folder['folder_path']],
-                        'min_episode': best_folder['min_episode'],
-                        'max_episode': best_folder['max_episode'],
-                        'episode_count': len(best_folder['episodes'])
-                    }
-
-            # 添加到配置
-            if 'tasklist' not in self.updater.config_data:
-                self.updater.config_data['tasklist'] = []
-
-            self.updater.config_data['tasklist'].append(new_task)
-
-            # 保存配置
-            if self.updater.save_config():
-                episode_info = ""
-                if best_resource.get('all_episodes'):
-                    min_ep = best_resource.get('min_episode', '?')
-                    max_ep = best_resource.get('max_episode', '?')
-                    episode_info = f"，共{len(best_resource['all_episodes'])}集，从第{min_ep}到第{max_ep}集"
-
-                # 如果有最佳文件夹信息，添加文件夹详情
-                folder_info = ""
-                if best_resource.get('best_folder'):
-                    folder_path = "/".join(
-                        [item.get('file_name', '') for item in best_resource['best_folder']['folder_path']]) or "根目录"
-                    folder_info = f"，最佳文件夹: {folder_path}"
-
-                task_status[task_id] = {
-                    'status': 'success',
-                    'message': f'成功添加"{cleaned_taskname}"{episode_info}{folder_info}',
-                    'taskname': cleaned_taskname,
-                    'task': new_task,
-                    'episodes': len(best_resource.get('all_episodes', [])),
-                    'min_episode': best_resource.get('min_episode'),
-                    'max_episode': best_resource.get('max_episode'),
-                    'best_folder': best_resource.get('best_folder') is not None
-                }
+            new_task = self.build_new_task(cleaned_taskname, best_resource, savepath, runweek, pattern, replace)
 
-                # 成功添加资源后触发资源更新
-                print("🔄 新资源添加成功，触发资源更新...")
-                update_triggered = self.trigger_resource_update()
-                if update_triggered:
-                    task_status[task_id]['update_triggered'] = True
-                    task_status[task_id]['message'] += "，已触发资源更新"
-                else:
-                    task_status[task_id]['update_triggered'] = False
-                    task_status[task_id]['message'] += "，资源更新触发失败"
+            result = self.save_new_task(cleaned_taskname, new_task, job)
+            if result == 'saved':
+                status = self.success_status(cleaned_taskname, best_resource, new_task)
+                self.task_status[task_id] = status
 
+                # 成功添加资源后触发资源更新（窗口期内的多次添加合并为一次）
+                print("🔄 新资源添加成功，请求触发资源更新...")
+                self.request_trigger(task_id, status)
             else:
-                task_status[task_id] = {
-                    'status': 'save_error',
-                    'message': '配置保存失败',
-                    'taskname': cleaned_taskname
-                }
+                self.task_status[task_id] = self.save_failure_status(cleaned_taskname, result)
 
         except Exception as e:
-            task_status[task_id] = {
+            self.task_status[task_id] = {
                 'status': 'error',
                 'message': f'处理过程中出错: {str(e)}',
                 'taskname': cleaned_taskname
@@ -312,7 +554,7 @@ class AsyncResourceSearchAPI:
         task_id = str(uuid.uuid4())
 
         # 立即返回任务ID
-        task_status[task_id] = {
+        self.task_status[task_id] = {
             'status': 'accepted',
             'message': f'已开始处理资源添加: {cleaned_taskname}',
             'task_id': task_id,
@@ -330,6 +572,194 @@ class AsyncResourceSearchAPI:
 
         return task_id
 
+    def format_search_result(self, cleaned_taskname, new_resources, limit=5):
+        """按任务名匹配度筛选搜索结果，生成搜索接口的返回内容"""
+        if not new_resources:
+            return {
+                'success': False,
+                'message': f'未找到资源: {cleaned_taskname}'
+            }
+
+        # 过滤匹配的任务名，按相似度排序
+        matched_resources = self.updater.rank_matched_resources(new_resources, cleaned_taskname)
+
+        if not matched_resources:
+            return {
+                'success': False,
+                'message': f'未找到任务名匹配的资源: {cleaned_taskname}'
+            }
+
+        # 返回搜索结果
+        result_resources = []
+        for resource in matched_resources[:limit]:
+            result_resources.append({
+                'taskname': resource.get('taskname'),
+                'shareurl': resource.get('shareurl'),
+                'source': resource.get('source', 'unknown'),
+                'match_score': resource.get('match_score')
+            })
+
+        return {
+            'success': True,
+            'message': f'找到 {len(result_resources)} 个匹配资源',
+            'resources': result_resources
+        }
+
+    @staticmethod
+    def parse_batch_tasks(tasks):
+        """解析批量添加请求的任务列表：每项为任务名字符串，或包含 taskname/savepath/runweek/pattern/replace 的字典
+
+        格式不正确时返回None
+        """
+        if not isinstance(tasks, list) or not tasks:
+            return None
+        parsed = []
+        for task in tasks:
+            if isinstance(task, str):
+                task = {'taskname': task}
+            if not isinstance(task, dict) or not task.get('taskname'):
+                return None
+            parsed.append(task)
+        return parsed
+
+    def async_add_batch(self, tasks):
+        """批量添加资源：立即返回批次ID和各项初始状态，在后台线程中统一处理"""
+        batch_id = str(uuid.uuid4())
+        items = [{
+            'taskname': self.clean_taskname(task['taskname']),
+            'original_taskname': task['taskname'],
+            'status': 'accepted'
+        } for task in tasks]
+
+        self.task_status[batch_id] = {
+            'status': 'accepted',
+            'message': f'已开始批量添加 {len(items)} 个资源',
+            'task_id': batch_id,
+            'batch': True,
+            'total': len(items),
+            'items': items
+        }
+
+        thread = threading.Thread(target=self.background_add_batch, args=(batch_id, tasks, items))
+        thread.daemon = True
+        thread.start()
+
+        return batch_id, items
+
+    def set_batch_item(self, batch_id, index, status):
+        """更新批量任务中第 index 项的状态"""
+        def change(info):
+            item = info['items'][index]
+            info['items'][index] = {'taskname': item['taskname'], 'original_taskname': item['original_taskname'],
+                                    **status}
+
+        self.task_status.modify(batch_id, change)
+
+    def prepare_batch_item(self, batch_id, index, task, taskname, share_cache):
+        """为批量任务中的一项选出最佳资源并生成任务配置，失败时返回None"""
+        def report(message, progress, **extra):
+            self.set_batch_item(batch_id, index, {
+                'status': 'processing',
+                'message': message,
+                'progress': progress,
+                **extra
+            })
+
+        try:
+            report(f'正在搜索资源: {taskname}', 10)
+            best_resource, failure = self.find_best_resource(taskname, report, share_cache, self.new_job(batch_id))
+            if failure:
+                self.set_batch_item(batch_id, index, failure)
+                return None
+
+            new_task = self.build_new_task(taskname, best_resource, task.get('savepath'), task.get('runweek'),
+                                           task.get('pattern', ''), task.get('replace', ''))
+            report(f'已选出最佳资源，等待写入配置: {taskname}', 95)
+            return index, taskname, best_resource, new_task
+        except Exception as e:
+            self.set_batch_item(batch_id, index, {
+                'status': 'error',
+                'message': f'处理过程中出错: {str(e)}',
+                'taskname': taskname
+            })
+            return None
+
+    def background_add_batch(self, batch_id, tasks, items):
+        """后台批量添加资源：共享分享详情缓存，统一保存一次配置、触发一次资源更新"""
+        try:
+            self.task_status.update_fields(batch_id, status='processing',
+                                           message=f'正在批量添加 {len(items)} 个资源')
+
+            # 跳过配置中已存在和本批次中重复的任务
+            self.updater.reload_config_if_changed()
+            pending = []
+            seen = set()
+            for index, (task, item) in enumerate(zip(tasks, items)):
+                taskname = item['taskname']
+                if taskname in seen:
+                    self.set_batch_item(batch_id, index, {
+                        'status': 'exists',
+                        'message': f'任务 "{taskname}" 在本批次中重复',
+                        'taskname': taskname
+                    })
+                elif self.task_exists(taskname):
+                    self.set_batch_item(batch_id, index, self.save_failure_status(taskname, 'exists'))
+                else:
+                    pending.append((index, task, taskname))
+                seen.add(taskname)
+
+            # 各项共用一个线程池和分享详情缓存（包括限速器），同一分享链接只请求一次，总请求速率与逐个添加时相同
+            workers = self.updater.get_setting('batch_workers', 2)
+            share_cache = self.updater.new_share_cache()
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(self.prepare_batch_item, batch_id, index, task, taskname, share_cache)
+                               for index, task, taskname in pending]
+                    prepared = [future.result() for future in futures]
+            finally:
+                share_cache.close()
+
+            # 所有新任务一次性写入配置（整个批次已被取消时不修改配置）
+            added = []
+            with self.updater.config_lock():
+                if self.task_status.cancel_requested(batch_id):
+                    for index, taskname, _, _ in filter(None, prepared):
+                        self.set_batch_item(batch_id, index, self.save_failure_status(taskname, 'cancelled'))
+                    self.task_status.update_fields(batch_id, status='cancelled', message='批量添加已取消，未修改配置')
+                    return
+
+                self.updater.reload_config_if_changed()
+                for entry in filter(None, prepared):
+                    index, taskname, best_resource, new_task = entry
+                    if self.task_exists(taskname) or any(taskname == added_name for _, added_name, _, _ in added):
+                        self.set_batch_item(batch_id, index, self.save_failure_status(taskname, 'exists'))
+                        continue
+                    added.append(entry)
+
+                saved = bool(added) and self.updater.add_tasks([new_task for _, _, _, new_task in added])
+
+            for index, taskname, best_resource, new_task in added:
+                if saved:
+                    self.set_batch_item(batch_id, index, self.success_status(taskname, best_resource, new_task))
+                else:
+                    self.set_batch_item(batch_id, index, self.save_failure_status(taskname, 'save_error'))
+
+            succeeded = len(added) if saved else 0
+            status = {
+                'status': 'completed',
+                'message': f'批量添加完成: 成功 {succeeded}/{len(items)}',
+                'succeeded': succeeded
+            }
+            self.task_status.update_fields(batch_id, **status)
+
+            # 整个批次只请求触发一次资源更新
+            if saved:
+                print(f"🔄 批量添加成功 {succeeded} 个资源，请求触发资源更新...")
+                self.request_trigger(batch_id, status)
+
+        except Exception as e:
+            self.task_status.update_fields(batch_id, status='error', message=f'批量处理过程中出错: {str(e)}')
+
     def search_resources(self, taskname, limit=5):
         """只搜索资源，不添加到配置"""
         try:
@@ -338,39 +768,7 @@ class AsyncResourceSearchAPI:
             print(f"🔍 正在搜索资源: {cleaned_taskname}")
 
             new_resources = self.updater.get_new_resources(cleaned_taskname)
-            if not new_resources:
-                return {
-                    'success': False,
-                    'message': f'未找到资源: {cleaned_taskname}'
-                }
-
-            # 过滤匹配的任务名
-            matched_resources = []
-            for resource in new_resources:
-                candidate_taskname = resource.get('taskname', '')
-                if candidate_taskname and self.updater.is_taskname_match(candidate_taskname, cleaned_taskname):
-                    matched_resources.append(resource)
-
-            if not matched_resources:
-                return {
-                    'success': False,
-                    'message': f'未找到任务名匹配的资源: {cleaned_taskname}'
-                }
-
-            # 返回搜索结果
-            result_resources = []
-            for resource in matched_resources[:limit]:
-                result_resources.append({
-                    'taskname': resource.get('taskname'),
-                    'shareurl': resource.get('shareurl'),
-                    'source': resource.get('source', 'unknown')
-                })
-
-            return {
-                'success': True,
-                'message': f'找到 {len(result_resources)} 个匹配资源',
-                'resources': result_resources
-            }
+            return self.format_search_result(cleaned_taskname, new_resources, limit)
 
         except Exception as e:
             return {
@@ -378,6 +776,36 @@ class AsyncResourceSearchAPI:
                 'message': f'搜索过程中出错: {str(e)}'
             }
 
+    def cleanup_task_status(self):
+        """清理已完成的任务状态，返回清理数量"""
+        task_status = self.task_status
+
+        # 保留最近100个任务，清理更早的已完成任务
+        task_ids_to_remove = []
+
+        # 按创建时间排序，保留最新的
+        all_statuses = task_status.statuses()
+        all_task_ids = [task_id for task_id, _ in all_statuses]
+        if len(all_task_ids) > 100:
+            # 保留最新的100个
+            task_ids_to_remove = all_task_ids[:-100]
+
+        # 额外清理24小时前的已完成任务
+        removing = set(task_ids_to_remove)
+        for task_id, status in all_statuses:
+            if task_id in removing:
+                continue
+
+            if status in ['success', 'error', 'exists', 'not_found', 'no_match', 'no_suitable',
+                          'save_error', 'completed', 'upstream_unavailable', 'timeout', 'cancelled']:
+                # 这里可以添加时间检查逻辑，如果需要的话
+                if len(all_task_ids) <= 100:  # 如果总数不多，不清除
+                    continue
+                task_ids_to_remove.append(task_id)
+
+        task_status.delete(task_ids_to_remove)
+        return len(task_ids_to_remove)
+
 
 # 全局API实例
 api_instance = None
@@ -395,6 +823,10 @@ def search_resources():
             'message': '缺少 taskname 参数'
         }), 400
 
+    unavailable = api_instance.upstream_unavailable()
+    if unavailable:
+        return jsonify({'success': False, **unavailable}), 503
+
     result = api_instance.search_resources(taskname, limit)
     return jsonify(result)
 
@@ -415,6 +847,11 @@ def add_resource():
             'message': '缺少 taskname 参数'
         }), 400
 
+    # 上游服务熔断中时直接失败，不再创建后台任务
+    unavailable = api_instance.upstream_unavailable(taskname)
+    if unavailable:
+        return jsonify({'success': False, **unavailable}), 503
+
     # 异步处理，立即返回任务ID
     task_id = api_instance.async_add_resource(taskname, savepath, runweek, pattern, replace)
 
@@ -443,6 +880,10 @@ def add_resource_simple():
             'message': '缺少 taskname 参数'
         }), 400
 
+    unavailable = api_instance.upstream_unavailable(taskname)
+    if unavailable:
+        return jsonify({'success': False, **unavailable}), 503
+
     # 异步处理，立即返回任务ID
     task_id = api_instance.async_add_resource(taskname, savepath)
 
@@ -459,16 +900,43 @@ def add_resource_simple():
     })
 
 
+@app.route('/api/add_batch', methods=['POST'])
+def add_resource_batch():
+    """批量添加资源接口：返回一个批次ID，通过 /api/task/<批次ID> 查询各项状态"""
+    data = request.json
+    tasks = api_instance.parse_batch_tasks(data.get('tasks') if isinstance(data, dict) else None)
+
+    if not tasks:
+        return jsonify({
+            'success': False,
+            'message': '缺少 tasks 参数，或其中有任务缺少 taskname'
+        }), 400
+
+    unavailable = api_instance.upstream_unavailable()
+    if unavailable:
+        return jsonify({'success': False, **unavailable}), 503
+
+    batch_id, items = api_instance.async_add_batch(tasks)
+
+    return jsonify({
+        'success': True,
+        'message': f'已开始批量添加 {len(items)} 个资源',
+        'batch_id': batch_id,
+        'items': items,
+        'status_url': f'/api/task/{batch_id}'
+    })
+
+
 @app.route('/api/task/<task_id>', methods=['GET'])
 def get_task_status(task_id):
     """获取任务状态接口"""
-    if task_id not in task_status:
+    status_info = api_instance.task_status.get(task_id)
+    if status_info is None:
         return jsonify({
             'success': False,
             'message': '任务ID不存在'
         }), 404
 
-    status_info = task_status[task_id]
     return jsonify({
         'success': True,
         'task_id': task_id,
@@ -476,11 +944,19 @@ def get_task_status(task_id):
     })
 
 
+@app.route('/api/task/<task_id>', methods=['DELETE'])
+def cancel_task(task_id):
+    """取消排队中或运行中的添加任务（包括批量任务）"""
+    result, status_code = api_instance.cancel_task(task_id)
+    return jsonify(result), status_code
+
+
 @app.route('/api/tasks', methods=['GET'])
 def list_tasks():
     """获取任务列表接口"""
     try:
-        tasks = api_instance.updater.config_data.get('tasklist', [])
+        api_instance.updater.reload_config_if_changed()
+        tasks = api_instance.updater.list_tasks()
         return jsonify({
             'success': True,
             'tasks': tasks,
@@ -500,7 +976,8 @@ def health_check():
         'success': True,
         'message': '服务运行正常',
         'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
-        'active_tasks': len([t for t in task_status.values() if t.get('status') == 'processing'])
+        'active_tasks': api_instance.task_status.count('processing'),
+        'upstream': 'open' if api_instance.updater.breaker.is_open() else 'closed'
     })
 
 
@@ -523,41 +1000,43 @@ def trigger_update():
 @app.route('/api/cleanup', methods=['POST'])
 def cleanup_tasks():
     """清理已完成的任务状态（可选）"""
-    global task_status
-
-    # 保留最近100个任务，清理更早的已完成任务
-    current_time = time.time()
-    task_ids_to_remove = []
-
-    # 按任务ID排序，保留最新的
-    all_task_ids = sorted(task_status.keys())
-    if len(all_task_ids) > 100:
-        # 保留最新的100个
-        task_ids_to_remove = all_task_ids[:-100]
-
-    # 额外清理24小时前的已完成任务
-    for task_id in list(task_status.keys()):
-        if task_id in task_ids_to_remove:
-            continue
-
-        task_info = task_status[task_id]
-        if task_info.get('status') in ['success', 'error', 'exists', 'not_found', 'no_match', 'no_suitable',
-                                       'save_error']:
-            # 这里可以添加时间检查逻辑，如果需要的话
-            if len(all_task_ids) <= 100:  # 如果总数不多，不清除
-                continue
-            task_ids_to_remove.append(task_id)
-
-    for task_id in task_ids_to_remove:
-        del task_status[task_id]
+    removed = api_instance.cleanup_task_status()
 
     return jsonify({
         'success': True,
-        'message': f'已清理 {len(task_ids_to_remove)} 个任务状态',
-        'remaining_tasks': len(task_status)
+        'message': f'已清理 {removed} 个任务状态',
+        'remaining_tasks': len(api_instance.task_status)
     })
 
 
+def serve_with_gunicorn(args):
+    """以gunicorn多进程方式运行，每个工作进程各自初始化API实例"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("⚠️ 未安装gunicorn（pip install gunicorn），改为单进程运行")
+        return False
+
+    class APIApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{args.host}:{args.port}")
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', args.threads)
+            # 搜索接口最长需要等待上游100秒
+            self.cfg.set('timeout', 120)
+
+        def load(self):
+            # 在fork之后创建，SQLite连接和HTTP连接池不跨进程共享
+            global api_instance
+            api_instance = AsyncResourceSearchAPI(args.config)
+            return app
+
+    print(f"🚀 多进程模式: {args.workers} 个工作进程，每个进程 {args.threads} 个线程")
+    APIApplication().run()
+    return True
+
+
 def main():
     """主函数"""
     global api_instance
@@ -566,6 +1045,8 @@ def main():
     parser.add_argument('--config', default='quark_config.json', help='配置文件路径')
     parser.add_argument('--host', default='0.0.0.0', help='监听地址')
     parser.add_argument('--port', type=int, default=5001, help='监听端口')
+    parser.add_argument('--workers', type=int, default=1, help='工作进程数量（大于1时使用gunicorn运行）')
+    parser.add_argument('--threads', type=int, default=4, help='多进程模式下每个工作进程的线程数')
 
     args = parser.parse_args()
 
@@ -573,10 +1054,14 @@ def main():
         print(f"❌ 配置文件不存在: {args.config}")
         sys.exit(1)
 
+    if args.workers > 1 and serve_with_gunicorn(args):
+        return
+
     try:
         # 初始化API
+        started = time.perf_counter()
         api_instance = AsyncResourceSearchAPI(args.config)
-        print(f"✅ API服务初始化成功（异步版本）")
+        print(f"✅ API服务初始化成功（异步版本），耗时 {(time.perf_counter() - started) * 1000:.1f}ms")
         print(f"📁 配置文件: {args.config}")
         print(f"🌐 服务地址: http://{args.host}:{args.port}")
         print(f"🔄 异步接口: POST /api/add 或 GET /api/add_simple?taskname=资源名")
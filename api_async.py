@@ -0,0 +1,701 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+夸克资源搜索与添加接口（ASGI异步版本）
+功能：路由和返回格式与 api.py 相同，上游请求全部异步等待，大量慢搜索不再各占一个线程
+依赖：pip install starlette httpx uvicorn
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+try:
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+except ImportError:
+    Starlette = None
+
+from api import AsyncResourceSearchAPI
+from quark_failed_task_update import JobStopped, ShareRef, UpstreamUnavailable, json_dumps
+
+if Starlette is not None:
+    class FastJSONResponse(JSONResponse):
+        """中文不转义，安装了orjson时使用orjson序列化"""
+
+        def render(self, content):
+            return json_dumps(content)
+
+
+class AsyncRateLimiter:
+    """异步版本的请求限速器，规则同 RateLimiter：相邻两次请求的开始时间至少间隔 interval 秒"""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.next_time = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        delay = self.next_time - now
+        self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AsyncShareCache(dict):
+    """异步版本的分享详情缓存，用法同 ShareCache：持有限速器，并在后台协程中依次预取后续要用到的分享详情，
+    取用时若该链接正在预取则等待其完成；获取失败的链接缓存为None"""
+
+    def __init__(self, interval=1.0):
+        super().__init__()
+        self.limiter = AsyncRateLimiter(interval)
+        self.prefetching = {}
+        self.last_prefetch = None
+
+    def prefetch(self, fetch, urls):
+        """在后台依次获取尚未缓存的链接，fetch(url, share_cache) 为实际请求协程"""
+        for url in urls:
+            key = ShareRef.key_of(url)
+            if key in self or key in self.prefetching:
+                continue
+            self.last_prefetch = asyncio.create_task(self._prefetch_one(fetch, url, self.last_prefetch))
+            self.prefetching[key] = self.last_prefetch
+
+    async def _prefetch_one(self, fetch, url, previous):
+        if previous is not None:
+            await asyncio.wait([previous])
+        await fetch(url, self)
+
+    async def wait(self, key):
+        """等待该链接的预取完成（没有预取时或在预取协程内立即返回）"""
+        task = self.prefetching.get(key)
+        if task is not None and task is not asyncio.current_task():
+            await asyncio.wait([task])
+
+    def close(self):
+        """停止预取，未完成的预取直接取消"""
+        for task in self.prefetching.values():
+            task.cancel()
+
+
+class ASGIResourceSearchAPI(AsyncResourceSearchAPI):
+    """异步版本：上游请求使用httpx异步客户端，处理流程（find_best_resource_steps）、解析、评分、任务状态和配置写入
+    复用同步版本的实现；读写SQLite和配置文件的步骤放到线程中执行，不阻塞事件循环"""
+
+    def __init__(self, config_path):
+        super().__init__(config_path)
+        # 合并触发在定时线程中执行，使用同步版本的触发请求
+        self.updater.trigger_coordinator.trigger = super().trigger_resource_update
+        self.client = None
+        # 保存后台任务的引用，避免执行中被垃圾回收
+        self.background_tasks = set()
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=20)
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def upstream_request(self, method, endpoint, job=None, **kwargs):
+        """请求上游接口，熔断器、超时设置和截止时间与同步版本相同，见 FailedTaskIncrementalUpdater.upstream_request"""
+        updater = self.updater
+        if job is not None:
+            await asyncio.to_thread(job.refresh)
+        if job is not None and job.stopped():
+            raise JobStopped("任务已取消" if job.cancelled() else "任务已到截止时间")
+        if not updater.breaker.allow():
+            raise UpstreamUnavailable(f"上游服务熔断中，{updater.breaker.retry_after():.0f}秒后重试")
+
+        timeout = updater.get_timeout(endpoint)
+        limited = job.limit_timeout(timeout) if job is not None else timeout
+        capped = limited != timeout
+        if isinstance(limited, tuple):
+            limited = httpx.Timeout(limited[1], connect=limited[0])
+
+        try:
+            response = await self.client.request(method, f"{updater.base_url}/{endpoint}", timeout=limited, **kwargs)
+        except httpx.TimeoutException:
+            if not capped:
+                updater.breaker.record_failure()
+            else:
+                updater.breaker.release_probe()
+            raise
+        except httpx.HTTPError:
+            updater.breaker.record_failure()
+            raise
+        except BaseException:
+            updater.breaker.release_probe()
+            raise
+
+        if response.status_code >= 500:
+            updater.breaker.record_failure()
+        else:
+            updater.breaker.record_success()
+        return response
+
+    async def get_new_resources(self, taskname, job=None):
+        """从接口获取新的资源地址"""
+        updater = self.updater
+        try:
+            params = {
+                "q": taskname,
+                "d": 1,
+                "token": updater.api_token
+            }
+
+            response = await self.upstream_request('GET', 'task_suggestions', job=job, params=params)
+            if response.status_code == 200:
+                data = response.json()
+                print(f"完整请求URL: {response.url}")
+                if data.get('success'):
+                    return data['data']
+                else:
+                    print(f"❌ 接口返回数据格式异常: {data}")
+                    return None
+            else:
+                print(f"❌ 接口请求失败，状态码: {response.status_code}")
+                return None
+        except Exception as e:
+            print(f"❌ 获取新资源时出错: {e}")
+            return None
+
+    async def get_share_detail(self, share_url, share_cache=None, job=None):
+        """获取分享链接详情，share_cache（AsyncShareCache 或普通字典）和 job 用法同
+        FailedTaskIncrementalUpdater.get_share_detail"""
+        key = ShareRef.key_of(share_url)
+        if isinstance(share_cache, AsyncShareCache):
+            await share_cache.wait(key)
+        if share_cache is not None and key in share_cache:
+            return share_cache[key]
+        if job is not None and job.stopped():
+            return None
+        if isinstance(share_cache, AsyncShareCache):
+            await share_cache.limiter.wait()
+
+        updater = self.updater
+        try:
+            response = await self.upstream_request('POST', 'get_share_detail', job=job,
+                                                   params={"token": updater.api_token}, json={"shareurl": share_url})
+            response.raise_for_status()
+            result = response.json()
+
+            if result.get("success"):
+                await asyncio.to_thread(updater.negative_cache.discard, key, 'dead')
+                if share_cache is not None:
+                    share_cache[key] = result["data"]
+                return result["data"]
+            else:
+                print(f"获取分享详情失败: {result}")
+                await asyncio.to_thread(updater.record_dead_share, share_url, result)
+                if share_cache is not None:
+                    share_cache[key] = None
+                return None
+
+        except (UpstreamUnavailable, JobStopped) as e:
+            print(f"请求失败: {e}")
+            return None
+        except Exception as e:
+            print(f"请求失败: {e}")
+            if share_cache is not None:
+                share_cache[key] = None
+            return None
+
+    async def trigger_resource_update(self):
+        """触发资源更新脚本（SQLite任务存储中新增的任务先导出到配置文件）"""
+        await asyncio.to_thread(self.updater.export_tasks)
+        try:
+            params = {"token": self.api_token}
+            headers = {
+                "Content-Type": "application/json"
+            }
+
+            print("🔄 触发资源更新脚本...")
+            response = await self.upstream_request('POST', 'run_script_now', json={}, headers=headers, params=params)
+
+            if response.status_code == 200:
+                result = response.json()
+                if result.get('success'):
+                    print("✅ 资源更新脚本触发成功")
+                    return True
+                else:
+                    print(f"❌ 资源更新脚本返回错误: {result.get('message', '未知错误')}")
+                    return False
+            else:
+                print(f"❌ 资源更新脚本请求失败，状态码: {response.status_code}")
+                return False
+
+        except httpx.TimeoutException:
+            print("❌ 资源更新脚本请求超时")
+            return False
+        except Exception as e:
+            print(f"❌ 触发资源更新脚本时出错: {e}")
+            return False
+
+    async def analyze_resource_structure(self, share_url, taskname, on_folder=None, share_cache=None, job=None):
+        """异步版资源结构分析，结果与 analyze_resource_structure_optimized 相同"""
+        updater = self.updater
+        analysis = {'url': share_url, 'is_valid': False}
+        print(f"   🔍 开始深度分析资源结构: {share_url}")
+
+        root = updater.start_resource_analysis(analysis, await self.get_share_detail(share_url, share_cache, job))
+        if root is not None:
+            print(f"   🔄 开始递归遍历文件夹结构...")
+            await self.analyze_folders(ShareRef.canonical_url(share_url), *root, taskname, analysis, 0, on_folder,
+                                       share_cache, job)
+
+        analysis = updater.finalize_resource_analysis(analysis)
+        await asyncio.to_thread(updater.record_negative_analysis, share_url, analysis, job)
+        return analysis
+
+    async def prerank_candidates(self, resources, taskname, target_episode, share_cache, job=None, mirrors=None):
+        """异步版预排序，逻辑同 FailedTaskIncrementalUpdater.prerank_candidates"""
+        top_k = self.updater.get_setting('prerank_top_k', 3)
+        if not top_k:
+            return resources
+
+        print(f"   🧮 预排序 {len(resources)} 个候选资源（目标: 第{target_episode}集）...")
+        for resource in resources:
+            if job is not None and job.stopped():
+                print(f"   ⏱️ 任务已取消或已到截止时间，其余候选不再获取根目录")
+                break
+            url = resource.get('shareurl')
+            if url and ShareRef.key_of(url) not in share_cache:
+                # 请求间隔由 share_cache 的限速器控制
+                await self.get_share_detail(url, share_cache, job)
+
+        return self.updater.rank_root_listings(resources, share_cache, taskname, target_episode, top_k, mirrors)
+
+    async def analyze_folders(self, base_share_url, folder, items, taskname, analysis, depth, on_folder,
+                              share_cache=None, job=None):
+        """递归分析文件夹结构，每解析完一个包含剧集的文件夹就回调 on_folder"""
+        indent = "  " * depth
+
+        folder_info, subfolders = self.updater.parse_folder_items(base_share_url, folder, items, taskname,
+                                                                  analysis, depth)
+        if folder_info and on_folder:
+            # 进度回调会写入任务状态库
+            await asyncio.to_thread(on_folder, analysis, folder_info)
+
+        for sub_folder, new_share_url in subfolders:
+            if job is not None and job.cancelled():
+                return
+
+            print(f"{indent}     └─ 分析文件夹: {sub_folder.name or '未知'}")
+
+            cached = share_cache is not None and ShareRef.key_of(new_share_url) in share_cache
+            if job is not None and job.expired() and not cached:
+                print(f"{indent}       ⏱️ 已到截止时间，跳过该文件夹")
+                analysis['partial'] = True
+                continue
+
+            # 请求间隔由 share_cache 的限速器控制
+            sub_dir_data = await self.get_share_detail(new_share_url, share_cache, job)
+            if sub_dir_data:
+                await self.analyze_folders(new_share_url, sub_folder, sub_dir_data.get("list", []), taskname,
+                                           analysis, depth + 1, on_folder, share_cache, job)
+            else:
+                print(f"{indent}       ❌ 获取子目录失败")
+                analysis['incomplete'] = True
+
+    async def find_best_resource_async(self, cleaned_taskname, report, share_cache=None, job=None):
+        """异步版 find_best_resource，参数和返回值相同"""
+        return await self.run_steps_async(
+            self.find_best_resource_steps(cleaned_taskname, report, share_cache, job))
+
+    async def run_steps_async(self, steps):
+        """执行 find_best_resource_steps 产出的步骤：等待对应的 async_step_<步骤名> 协程并把结果送回"""
+        result = None
+        while True:
+            try:
+                name, *args = steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            result = await getattr(self, f'async_step_{name}')(*args)
+
+    async def async_step_cancelled(self, job):
+        return await asyncio.to_thread(job.refresh)
+
+    async def async_step_report(self, report, message, progress, extra):
+        await asyncio.to_thread(report, message, progress, **extra)
+
+    async def async_step_call(self, func, *args):
+        return await asyncio.to_thread(func, *args)
+
+    async def async_step_new_share_cache(self):
+        return AsyncShareCache(self.updater.get_setting('request_interval', 1))
+
+    async def async_step_search(self, taskname, job):
+        return await self.get_new_resources(taskname, job)
+
+    async def async_step_prerank(self, resources, taskname, target_episode, share_cache, job, mirrors):
+        return await self.prerank_candidates(resources, taskname, target_episode, share_cache, job, mirrors)
+
+    async def async_step_skip_mirror(self, resource, share_cache, mirrors):
+        # 根目录正在预取时等其完成
+        if isinstance(share_cache, AsyncShareCache):
+            await share_cache.wait(ShareRef.key_of(resource.get('shareurl')))
+        return self.updater.skip_mirror(resource, share_cache, mirrors)
+
+    async def async_step_prefetch(self, resources, share_cache):
+        if isinstance(share_cache, AsyncShareCache):
+            share_cache.prefetch(self.get_share_detail, self.updater.prefetch_urls(resources, share_cache))
+
+    async def async_step_analyze(self, share_url, taskname, on_folder, share_cache, job):
+        return await self.analyze_resource_structure(share_url, taskname, on_folder, share_cache, job)
+
+    async def set_task_status(self, task_id, status):
+        await asyncio.to_thread(self.task_status.__setitem__, task_id, status)
+
+    async def background_add_resource(self, task_id, taskname, savepath=None, runweek=None, pattern="", replace=""):
+        """后台添加资源的协程，流程同同步版本，任务状态和配置的读写在线程中执行"""
+        job = self.new_job(task_id, auto_check=False)
+        cleaned_taskname = self.clean_taskname(taskname)
+        try:
+            if await asyncio.to_thread(job.refresh):
+                await self.set_task_status(task_id, self.save_failure_status(cleaned_taskname, 'cancelled'))
+                return
+
+            await self.set_task_status(task_id, {
+                'status': 'processing',
+                'message': f'正在搜索资源: {cleaned_taskname}',
+                'progress': 10
+            })
+
+            # 检查任务是否已存在（配置可能已被转存脚本或其他工作进程修改）
+            await asyncio.to_thread(self.updater.reload_config_if_changed)
+            if await asyncio.to_thread(self.task_exists, cleaned_taskname):
+                await self.set_task_status(task_id, self.save_failure_status(cleaned_taskname, 'exists'))
+                return
+
+            # 在线程中调用（见 async_step_report）
+            def report(message, progress, **extra):
+                self.task_status[task_id] = {
+                    'status': 'processing',
+                    'message': message,
+                    'progress': progress,
+                    **extra
+                }
+
+            best_resource, failure = await self.find_best_resource_async(cleaned_taskname, report, job=job)
+            if failure:
+                await self.set_task_status(task_id, failure)
+                return
+
+            new_task = self.build_new_task(cleaned_taskname, best_resource, savepath, runweek, pattern, replace)
+
+            result = await asyncio.to_thread(self.save_new_task, cleaned_taskname, new_task, job)
+            if result == 'saved':
+                status = self.success_status(cleaned_taskname, best_resource, new_task)
+                await self.set_task_status(task_id, status)
+
+                # 窗口为0时会立即发出触发请求，放到线程中执行避免阻塞事件循环
+                print("🔄 新资源添加成功，请求触发资源更新...")
+                await asyncio.to_thread(self.request_trigger, task_id, status)
+            else:
+                await self.set_task_status(task_id, self.save_failure_status(cleaned_taskname, result))
+
+        except Exception as e:
+            await self.set_task_status(task_id, {
+                'status': 'error',
+                'message': f'处理过程中出错: {str(e)}',
+                'taskname': cleaned_taskname
+            })
+
+    async def async_add_resource(self, taskname, savepath=None, runweek=None, pattern="", replace=""):
+        """异步添加资源：在事件循环中创建后台协程，立即返回任务ID"""
+        cleaned_taskname = self.clean_taskname(taskname)
+
+        task_id = str(uuid.uuid4())
+
+        await self.set_task_status(task_id, {
+            'status': 'accepted',
+            'message': f'已开始处理资源添加: {cleaned_taskname}',
+            'task_id': task_id,
+            'taskname': cleaned_taskname,
+            'original_taskname': taskname
+        })
+
+        task = asyncio.create_task(
+            self.background_add_resource(task_id, cleaned_taskname, savepath, runweek, pattern, replace)
+        )
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+        return task_id
+
+    async def search_resources(self, taskname, limit=5):
+        """只搜索资源，不添加到配置"""
+        try:
+            cleaned_taskname = self.clean_taskname(taskname)
+            print(f"🔍 正在搜索资源: {cleaned_taskname}")
+
+            new_resources = await self.get_new_resources(cleaned_taskname)
+            return self.format_search_result(cleaned_taskname, new_resources, limit)
+
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'搜索过程中出错: {str(e)}'
+            }
+
+
+def missing_parameter():
+    return FastJSONResponse({
+        'success': False,
+        'message': '缺少 taskname 参数'
+    }, status_code=400)
+
+
+def unavailable_response(api, taskname=None):
+    """上游服务熔断中时返回503响应，否则返回None"""
+    unavailable = api.upstream_unavailable(taskname)
+    if unavailable:
+        return FastJSONResponse({'success': False, **unavailable}, status_code=503)
+    return None
+
+
+def accepted_response(api, taskname, task_id):
+    return FastJSONResponse({
+        'success': True,
+        'message': '已开始处理资源添加请求',
+        'task_id': task_id,
+        'taskname': api.clean_taskname(taskname),
+        'original_taskname': taskname,
+        'status_url': f'/api/task/{task_id}'
+    })
+
+
+async def search_resources(request):
+    """搜索资源接口"""
+    taskname = request.query_params.get('taskname')
+    limit = int(request.query_params.get('limit', 5))
+
+    if not taskname:
+        return missing_parameter()
+
+    unavailable = unavailable_response(request.app.state.api)
+    if unavailable:
+        return unavailable
+
+    return FastJSONResponse(await request.app.state.api.search_resources(taskname, limit))
+
+
+async def add_resource(request):
+    """添加资源到配置接口"""
+    api = request.app.state.api
+    data = await request.json()
+    taskname = data.get('taskname')
+
+    if not taskname:
+        return missing_parameter()
+
+    # 上游服务熔断中时直接失败，不再创建后台任务
+    unavailable = unavailable_response(api, taskname)
+    if unavailable:
+        return unavailable
+
+    task_id = await api.async_add_resource(taskname, data.get('savepath'), data.get('runweek', [1, 2, 3, 4, 5, 6, 7]),
+                                           data.get('pattern', ''), data.get('replace', ''))
+    return accepted_response(api, taskname, task_id)
+
+
+async def add_resource_simple(request):
+    """简化版添加资源接口（GET请求，适合快捷指令）"""
+    api = request.app.state.api
+    taskname = request.query_params.get('taskname')
+
+    if not taskname:
+        return missing_parameter()
+
+    unavailable = unavailable_response(api, taskname)
+    if unavailable:
+        return unavailable
+
+    task_id = await api.async_add_resource(taskname, request.query_params.get('savepath'))
+    return accepted_response(api, taskname, task_id)
+
+
+async def add_resource_batch(request):
+    """批量添加资源接口：后台线程统一处理，返回一个批次ID"""
+    api = request.app.state.api
+    data = await request.json()
+    tasks = api.parse_batch_tasks(data.get('tasks') if isinstance(data, dict) else None)
+
+    if not tasks:
+        return FastJSONResponse({
+            'success': False,
+            'message': '缺少 tasks 参数，或其中有任务缺少 taskname'
+        }, status_code=400)
+
+    unavailable = unavailable_response(api)
+    if unavailable:
+        return unavailable
+
+    # 批量添加在后台线程中处理（与同步版本相同），创建批次时写入任务状态库
+    batch_id, items = await asyncio.to_thread(api.async_add_batch, tasks)
+
+    return FastJSONResponse({
+        'success': True,
+        'message': f'已开始批量添加 {len(items)} 个资源',
+        'batch_id': batch_id,
+        'items': items,
+        'status_url': f'/api/task/{batch_id}'
+    })
+
+
+async def get_task_status(request):
+    """获取任务状态接口"""
+    task_id = request.path_params['task_id']
+    status_info = await asyncio.to_thread(request.app.state.api.task_status.get, task_id)
+    if status_info is None:
+        return FastJSONResponse({
+            'success': False,
+            'message': '任务ID不存在'
+        }, status_code=404)
+
+    return FastJSONResponse({
+        'success': True,
+        'task_id': task_id,
+        **status_info
+    })
+
+
+async def cancel_task(request):
+    """取消排队中或运行中的添加任务（包括批量任务）"""
+    result, status_code = await asyncio.to_thread(request.app.state.api.cancel_task, request.path_params['task_id'])
+    return FastJSONResponse(result, status_code=status_code)
+
+
+async def list_tasks(request):
+    """获取任务列表接口"""
+    updater = request.app.state.api.updater
+    try:
+        await asyncio.to_thread(updater.reload_config_if_changed)
+        tasks = await asyncio.to_thread(updater.list_tasks)
+        return FastJSONResponse({
+            'success': True,
+            'tasks': tasks,
+            'count': len(tasks)
+        })
+    except Exception as e:
+        return FastJSONResponse({
+            'success': False,
+            'message': f'获取任务列表失败: {str(e)}'
+        }, status_code=500)
+
+
+async def health_check(request):
+    """健康检查接口"""
+    active_tasks = await asyncio.to_thread(request.app.state.api.task_status.count, 'processing')
+    return FastJSONResponse({
+        'success': True,
+        'message': '服务运行正常',
+        'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'active_tasks': active_tasks,
+        'upstream': 'open' if request.app.state.api.updater.breaker.is_open() else 'closed'
+    })
+
+
+async def trigger_update(request):
+    """手动触发资源更新接口"""
+    try:
+        result = await request.app.state.api.trigger_resource_update()
+        return FastJSONResponse({
+            'success': result,
+            'message': '资源更新脚本触发成功' if result else '资源更新脚本触发失败'
+        })
+    except Exception as e:
+        return FastJSONResponse({
+            'success': False,
+            'message': f'触发资源更新时出错: {str(e)}'
+        }, status_code=500)
+
+
+async def cleanup_tasks(request):
+    """清理已完成的任务状态"""
+    api = request.app.state.api
+    removed = await asyncio.to_thread(api.cleanup_task_status)
+    remaining = await asyncio.to_thread(len, api.task_status)
+    return FastJSONResponse({
+        'success': True,
+        'message': f'已清理 {removed} 个任务状态',
+        'remaining_tasks': remaining
+    })
+
+
+def create_app(config_path):
+    """创建ASGI应用"""
+    api = ASGIResourceSearchAPI(config_path)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await api.start()
+        try:
+            yield
+        finally:
+            await api.close()
+
+    app = Starlette(routes=[
+        Route('/api/search', search_resources, methods=['GET']),
+        Route('/api/add', add_resource, methods=['POST']),
+        Route('/api/add_simple', add_resource_simple, methods=['GET']),
+        Route('/api/add_batch', add_resource_batch, methods=['POST']),
+        Route('/api/task/{task_id}', get_task_status, methods=['GET']),
+        Route('/api/task/{task_id}', cancel_task, methods=['DELETE']),
+        Route('/api/tasks', list_tasks, methods=['GET']),
+        Route('/api/health', health_check, methods=['GET']),
+        Route('/api/trigger_update', trigger_update, methods=['POST']),
+        Route('/api/cleanup', cleanup_tasks, methods=['POST']),
+    ], lifespan=lifespan)
+    app.state.api = api
+    return app
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='夸克资源搜索与添加API（ASGI异步版本）')
+    parser.add_argument('--config', default='quark_config.json', help='配置文件路径')
+    parser.add_argument('--host', default='0.0.0.0', help='监听地址')
+    parser.add_argument('--port', type=int, default=5001, help='监听端口')
+
+    args = parser.parse_args()
+
+    if Starlette is None or httpx is None or uvicorn is None:
+        print("❌ 异步模式需要安装依赖: pip install starlette httpx uvicorn")
+        sys.exit(1)
+
+    if not os.path.exists(args.config):
+        print(f"❌ 配置文件不存在: {args.config}")
+        sys.exit(1)
+
+    try:
+        started = time.perf_counter()
+        app = create_app(args.config)
+        print(f"✅ API服务初始化成功（ASGI异步版本），耗时 {(time.perf_counter() - started) * 1000:.1f}ms")
+        print(f"📁 配置文件: {args.config}")
+        print(f"🌐 服务地址: http://{args.host}:{args.port}")
+    except Exception as e:
+        print(f"❌ API服务启动失败: {e}")
+        sys.exit(1)
+
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
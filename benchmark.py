@@ -0,0 +1,649 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+夸克资源失效任务增量更新脚本 - 性能基准测试
+功能：在大规模合成数据上测试评分、剧集集合等热点代码的耗时与内存，并校验结果与旧版实现一致
+"""
+import os
+import json
+import random
+import time
+import zlib
+import argparse
+import tempfile
+import tracemalloc
+from contextlib import redirect_stdout
+
+from quark_failed_task_update import EpisodeFile, EpisodeSet, FailedTaskIncrementalUpdater
+
+# 屏蔽被测函数的日志输出（不缓存在内存中，避免影响内存统计）
+DEVNULL = open(os.devnull, 'w', encoding='utf-8')
+# 更新器的配置文件、锁文件等放在临时目录中，退出时一起删除，不在当前目录留下文件
+WORK_DIR = tempfile.TemporaryDirectory(prefix='quark-benchmark-')
+
+
+def create_updater():
+    """创建不依赖真实配置文件的更新器实例"""
+    with redirect_stdout(DEVNULL):
+        return FailedTaskIncrementalUpdater(os.path.join(WORK_DIR.name, 'config.json'))
+
+
+def make_synthetic_analysis(rng, share_index, folder_count, episodes_per_folder):
+    """生成一个包含大量文件夹和剧集的合成资源分析结果"""
+    share_url = f"https://pan.quark.cn/s/bench{share_index:04d}"
+    analysis = {
+        'url': share_url,
+        'is_valid': True,
+        'folders': [],
+        'all_episodes': [],
+        'folder_episodes': {}
+    }
+
+    for folder_index in range(folder_count):
+        depth = rng.randint(0, 3)
+        folder_path = [{'fid': f"{share_index}-{folder_index}-{d}", 'file_name': f"第{folder_index}部分-{d}"}
+                       for d in range(depth)]
+        start = rng.randint(1, 1500)
+        episodes = []
+        for episode in range(start, start + episodes_per_folder):
+            # 模拟缺集和同一集的多个版本
+            if rng.random() < 0.1:
+                continue
+            copies = 2 if rng.random() < 0.05 else 1
+            for copy in range(copies):
+                episodes.append(EpisodeFile(f"{share_index}-{folder_index}-{episode}-{copy}",
+                                            f"测试剧 第{episode}集.mp4", episode))
+        if not episodes:
+            continue
+        rng.shuffle(episodes)
+
+        folder_key = "/".join(item['file_name'] for item in folder_path) or "根目录"
+        folder_key = f"{folder_key}#{folder_index}"
+        analysis['folder_episodes'][folder_key] = {
+            'episodes': episodes,
+            'episode_numbers': sorted(ep.episode for ep in episodes),
+            'min_episode': min(ep.episode for ep in episodes),
+            'max_episode': max(ep.episode for ep in episodes),
+            'folder_path': folder_path,
+            'share_url': f"{share_url}#/list/share/{share_index}-{folder_index}"
+        }
+        analysis['all_episodes'].extend(episodes)
+
+    episodes = [ep.episode for ep in analysis['all_episodes']]
+    analysis['min_episode'] = min(episodes)
+    analysis['max_episode'] = max(episodes)
+    return analysis
+
+
+def legacy_select_best_folder(resource_analysis, saved_episodes):
+    """旧版文件夹评分实现（逐个文件夹重建列表），用于校验排名一致性"""
+    if not resource_analysis.get('folder_episodes'):
+        return None, None
+
+    max_saved = max(saved_episodes) if saved_episodes else 0
+    continuation_point = max_saved + 1
+
+    best_folder_info = None
+    best_score = -1
+    best_episode_gap = float('inf')
+
+    for folder_name, folder_info in resource_analysis['folder_episodes'].items():
+        folder_episodes = [ep.episode for ep in folder_info['episodes']]
+        min_ep = folder_info['min_episode']
+        max_ep = folder_info['max_episode']
+
+        if continuation_point in folder_episodes:
+            episode_gap = 0
+        elif continuation_point < min_ep:
+            episode_gap = min_ep - continuation_point
+        elif continuation_point > max_ep:
+            episode_gap = continuation_point - max_ep
+        else:
+            episode_gap = 0
+
+        score = 0
+        if continuation_point in folder_episodes:
+            score += 200
+            print(f"     ✅ {folder_name}: 完美匹配续播点第{continuation_point}集")
+        if min_ep <= continuation_point <= max_ep:
+            score += 100
+            score += min(len([ep for ep in folder_episodes if ep >= continuation_point]), 20)
+        elif continuation_point < min_ep:
+            gap = min_ep - continuation_point
+            if gap <= 5:
+                score += 80 - gap * 10
+                print(f"     ⚠️  {folder_name}: 最接近续播点，从第{min_ep}集开始（差{gap}集）")
+        elif continuation_point > max_ep:
+            gap = continuation_point - max_ep
+            if gap <= 10:
+                score += 60 - gap * 5
+
+        relevant_episodes = len([ep for ep in folder_episodes if ep >= continuation_point - 10])
+        score += min(relevant_episodes * 3, 30)
+        score -= len(folder_info['folder_path']) * 3
+
+        if episode_gap < best_episode_gap or (episode_gap == best_episode_gap and score > best_score):
+            best_episode_gap = episode_gap
+            best_score = score
+            best_folder_info = folder_info
+
+    if best_folder_info:
+        return best_folder_info, best_episode_gap
+    return None, None
+
+
+def legacy_select_best_resource(resources_analysis, saved_episodes):
+    """旧版资源评分实现，返回 (资源, 文件夹, 起始集数)"""
+    valid_resources = [r for r in resources_analysis if r['is_valid'] and r['all_episodes']]
+    if not valid_resources:
+        return None, None, None
+
+    max_saved = max(saved_episodes) if saved_episodes else 0
+    best_resource = None
+    best_folder = None
+    best_continuation_point = max_saved + 1
+    best_episode_gap = float('inf')
+    best_score = -1
+
+    for resource in valid_resources:
+        best_folder_for_resource, episode_gap = legacy_select_best_folder(resource, saved_episodes)
+        if not best_folder_for_resource:
+            continue
+
+        folder_episodes = [ep.episode for ep in best_folder_for_resource['episodes']]
+        min_ep = best_folder_for_resource['min_episode']
+        max_ep = best_folder_for_resource['max_episode']
+
+        score = 0
+        if best_continuation_point in folder_episodes:
+            score += 300
+        elif min_ep <= best_continuation_point <= max_ep:
+            score += 200
+        else:
+            distance = min(abs(min_ep - best_continuation_point), abs(max_ep - best_continuation_point))
+            if distance <= 10:
+                score += 150 - distance * 10
+
+        if min_ep <= best_continuation_point <= max_ep:
+            continuous_count = 0
+            current = best_continuation_point
+            while current in folder_episodes:
+                continuous_count += 1
+                current += 1
+            score += min(continuous_count * 5, 50)
+
+        future_episodes = len([ep for ep in folder_episodes if ep >= best_continuation_point])
+        score += min(future_episodes * 2, 40)
+        score += min(max_ep / 10, 20)
+
+        if (episode_gap < best_episode_gap or
+                (episode_gap == best_episode_gap and score > best_score)):
+            best_episode_gap = episode_gap
+            best_score = score
+            best_resource = resource
+            best_folder = best_folder_for_resource
+
+    if not best_resource:
+        return None, None, None
+
+    folder_episodes = [ep.episode for ep in best_folder['episodes']]
+    if best_continuation_point in folder_episodes:
+        start_episode = best_continuation_point
+    else:
+        larger_episodes = [ep for ep in folder_episodes if ep >= best_continuation_point]
+        start_episode = min(larger_episodes) if larger_episodes else max(folder_episodes)
+    return best_resource, best_folder, start_episode
+
+
+def timed(func, repeat):
+    """多次运行取最短耗时（秒），屏蔽被测函数的日志输出"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        with redirect_stdout(DEVNULL):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_scoring(args):
+    """文件夹/资源评分基准测试"""
+    rng = random.Random(args.seed)
+    updater = create_updater()
+
+    print(f"📊 评分基准: {args.resources} 个资源 × {args.folders} 个文件夹 × {args.episodes} 集")
+    analyses = [make_synthetic_analysis(rng, i, args.folders, args.episodes) for i in range(args.resources)]
+
+    # 有序集数列表在分析阶段每个文件夹只构建一次，这里单独统计其耗时
+    def rebuild_index():
+        for analysis in analyses:
+            for folder_info in analysis['folder_episodes'].values():
+                folder_info['episode_numbers'] = sorted(ep.episode for ep in folder_info['episodes'])
+    index_time, _ = timed(rebuild_index, args.repeat)
+
+    saved_cases = [[], list(range(1, rng.randint(2, 1500)))]
+    saved_cases += [sorted(rng.sample(range(1, 1600), rng.randint(1, 200))) for _ in range(args.cases)]
+
+    mismatches = 0
+    legacy_total = 0.0
+    engine_total = 0.0
+
+    for saved_episodes in saved_cases:
+        legacy_time, legacy = timed(lambda: legacy_select_best_resource(analyses, saved_episodes), args.repeat)
+        engine_time, best = timed(lambda: updater.select_best_resource(analyses, 'bench', saved_episodes), args.repeat)
+        legacy_total += legacy_time
+        engine_total += engine_time
+
+        engine = (best, best['best_folder'], best['continuation_point']) if best else (None, None, None)
+        if any(a is not b for a, b in zip(legacy[:2], engine[:2])) or legacy[2] != engine[2]:
+            mismatches += 1
+
+        # 逐个资源校验文件夹排名
+        for analysis in analyses:
+            with redirect_stdout(DEVNULL):
+                engine_folder = updater.select_best_folder_for_continuation(analysis, saved_episodes)
+                legacy_folder = legacy_select_best_folder(analysis, saved_episodes)
+            if engine_folder[0] is not legacy_folder[0] or engine_folder[1] != legacy_folder[1]:
+                mismatches += 1
+
+    print(f"   预排序集数（每次分析一次）: {index_time * 1000:.1f} ms")
+    print(f"   旧版实现: {legacy_total * 1000:.1f} ms")
+    print(f"   评分引擎: {engine_total * 1000:.1f} ms")
+    print(f"   加速比: {legacy_total / engine_total:.2f}x")
+    if mismatches:
+        print(f"   ❌ 排名不一致: {mismatches} 处")
+        return False
+    print(f"   ✅ {len(saved_cases)} 组已转存剧集下排名完全一致")
+    return True
+
+
+def measure_memory(factory):
+    """统计构建对象时新分配的内存（字节）"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = factory()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, obj
+
+
+def bench_episode_set(args):
+    """剧集集合的内存占用与常用操作耗时"""
+    rng = random.Random(args.seed)
+    episode_total = max(args.episodes * 50, 1000)
+    episodes = [ep for ep in range(1, episode_total + 1) if rng.random() > 0.02]
+    queries = [rng.randint(1, episode_total + 100) for _ in range(2000)]
+
+    print(f"📊 剧集集合基准: {len(episodes)} 集（共{episode_total}集，随机缺集）")
+
+    dict_memory, episode_dicts = measure_memory(lambda: [
+        {'fid': f"{ep:032d}", 'file_name': f"测试剧 第{ep}集.mp4", 'episode': ep} for ep in episodes])
+    list_memory, episode_list = measure_memory(lambda: sorted(ep['episode'] for ep in episode_dicts))
+    set_memory, episode_set = measure_memory(lambda: EpisodeSet(episode_list))
+
+    print(f"   剧集字典列表: {dict_memory / 1024:.1f} KB")
+    print(f"   集数列表: {list_memory / 1024:.1f} KB")
+    print(f"   EpisodeSet: {set_memory / 1024:.1f} KB")
+
+    list_time, list_hits = timed(lambda: sum(1 for q in queries if q in episode_list), args.repeat)
+    set_time, set_hits = timed(lambda: sum(1 for q in queries if q in episode_set), args.repeat)
+    print(f"   成员判断 ×{len(queries)}: 列表 {list_time * 1000:.2f} ms / EpisodeSet {set_time * 1000:.2f} ms")
+
+    list_gap_time, list_gaps = timed(lambda: [ep for ep in range(episode_list[0], episode_list[-1] + 1)
+                                              if ep not in episode_list], args.repeat)
+    set_gap_time, set_gaps = timed(lambda: [ep for a, b in episode_set.gaps() for ep in range(a, b + 1)],
+                                   args.repeat)
+    print(f"   缺集查找: 列表 {list_gap_time * 1000:.2f} ms / EpisodeSet {set_gap_time * 1000:.2f} ms")
+
+    if list_hits != set_hits or list_gaps != set_gaps:
+        print(f"   ❌ EpisodeSet 结果与列表不一致")
+        return False
+    print(f"   ✅ 结果一致，内存为集数列表的 {set_memory / list_memory:.1%}")
+    return True
+
+
+def make_share_listing(share_index, folder_tokens, files_per_folder):
+    """模拟 get_share_detail 返回的一层目录列表（每次调用都生成新对象，与 response.json() 一致）"""
+    depth = len(folder_tokens)
+    folder_fid = f"{share_index}:{'.'.join(folder_tokens)}" if folder_tokens else '0'
+    items = []
+    if depth < 2:
+        for i in range(3):
+            items.append({'fid': f"{share_index}:{'.'.join(folder_tokens + [f'd{i}'])}",
+                          'file_name': f"第{i + 1}季 4K 高码率 国语中字", 'dir': True, 'file': False, 'size': 0,
+                          'pdir_fid': folder_fid, 'format_type': '', 'updated_at': 1700000000000,
+                          'share_fid_token': 'x' * 40})
+    for i in range(files_per_folder):
+        episode = (zlib.crc32(folder_fid.encode()) + i) % 1900 + 1
+        items.append({'fid': f"{folder_fid}.f{i}", 'file_name': f"测试剧.S01E{episode:03d}.2160p.WEB-DL.mkv",
+                      'dir': False, 'file': True, 'size': 1024 ** 3, 'pdir_fid': folder_fid,
+                      'format_type': 'video/x-matroska', 'updated_at': 1700000000000,
+                      'share_fid_token': 'x' * 40, 'thumbnail': 'https://example.com/' + 'y' * 80})
+    return {'share': {'title': f"测试剧{share_index}", 'all_file_num': len(items)},
+            'list': items, 'full_path': []}
+
+
+def fake_get_share_detail(share_url, files_per_folder):
+    """根据合成分享URL中的fid还原目录层级并返回对应列表"""
+    base, _, fid = share_url.partition('#/list/share/')
+    share_index = base.rpartition('/s/bench')[2]
+    folder_tokens = fid.partition(':')[2].split('.') if fid else []
+    return make_share_listing(share_index, folder_tokens, files_per_folder)
+
+
+def legacy_analyze_listing(updater, share_index, files_per_folder, taskname):
+    """旧版分析结果结构：每集一个字典并复制完整路径，同时保存在多个列表中，并保留原始文件列表"""
+    share_url = f"https://pan.quark.cn/s/bench{share_index}"
+    share_data = fake_get_share_detail(share_url, files_per_folder)
+    analysis = {'url': share_url, 'is_valid': True, 'folders': [], 'files': [],
+                'all_episodes': [], 'folder_episodes': {}, 'share_info': share_data['share'],
+                'full_path': share_data['full_path'], 'file_list': share_data['list']}
+
+    def walk(current_path, items):
+        folder_episodes = []
+        for item in items:
+            if item['file'] and updater.is_video_file(item['file_name']):
+                episode = updater.extract_episode_number_enhanced(item['file_name'], taskname)
+                if episode is None:
+                    continue
+                file_data = {'fid': item['fid'], 'file_name': item['file_name'], 'episode': episode,
+                             'pdir_fid': item['pdir_fid'], 'size': item['size'], 'is_folder': False,
+                             'folder_path': [p.get('file_name') for p in current_path],
+                             'folder_fids': [p.get('fid') for p in current_path]}
+                analysis['files'].append(file_data)
+                analysis['all_episodes'].append(file_data)
+                folder_episodes.append(file_data)
+        if folder_episodes:
+            key = "/".join(p.get('file_name', '') for p in current_path) or "根目录"
+            analysis['folder_episodes'][key] = {
+                'episodes': folder_episodes,
+                'min_episode': min(ep['episode'] for ep in folder_episodes),
+                'max_episode': max(ep['episode'] for ep in folder_episodes),
+                'folder_path': current_path, 'share_url': analysis['url']}
+        for item in [i for i in items if i['dir']][:3]:
+            new_path = current_path + [item]
+            sub = fake_get_share_detail(f"{share_url}#/list/share/{item['fid']}", files_per_folder)
+            walk(new_path, sub['list'])
+
+    walk([], share_data['list'])
+    return analysis
+
+
+def bench_records(args):
+    """分析结果的内存占用：旧版字典结构 vs 紧凑剧集记录"""
+    import quark_failed_task_update
+
+    updater = create_updater()
+    files_per_folder = args.episodes * 5
+    taskname = '测试剧'
+
+    def fake_share_detail(share_url, share_cache=None, job=None):
+        return fake_get_share_detail(share_url, files_per_folder)
+
+    updater.get_share_detail = fake_share_detail
+    original_sleep = quark_failed_task_update.time.sleep
+    quark_failed_task_update.time.sleep = lambda seconds: None
+    try:
+        with redirect_stdout(DEVNULL):
+            legacy_memory, legacy = measure_memory(
+                lambda: [legacy_analyze_listing(updater, i, files_per_folder, taskname) for i in range(args.resources)])
+            compact_memory, compact = measure_memory(
+                lambda: [updater.analyze_resource_structure_optimized(f"https://pan.quark.cn/s/bench{i}", taskname)
+                         for i in range(args.resources)])
+    finally:
+        quark_failed_task_update.time.sleep = original_sleep
+
+    legacy_count = sum(len(a['all_episodes']) for a in legacy)
+    compact_count = sum(len(a['all_episodes']) for a in compact)
+    print(f"📊 分析结果内存基准: {args.resources} 个资源，共 {compact_count} 个剧集文件")
+    print(f"   旧版字典结构: {legacy_memory / 1024:.1f} KB")
+    print(f"   紧凑剧集记录: {compact_memory / 1024:.1f} KB")
+    if legacy_count != compact_count:
+        print(f"   ❌ 剧集数量不一致: {legacy_count} / {compact_count}")
+        return False
+    print(f"   ✅ 内存降低 {1 - compact_memory / legacy_memory:.1%}")
+    return True
+
+
+# 微基准语料：中英文剧名 × 常见剧集文件命名（模板, 是否应解析出集数）
+MICRO_SEED = 20240901
+MICRO_TASKNAMES = ['庆余年', '凡人修仙传', '斗罗大陆2', '繁花', 'The Last of Us', 'Silo', 'Reacher', 'Shogun']
+MICRO_FILE_TEMPLATES = [
+    ('{name} 第{ep:02d}集.mp4', True),
+    ('{name} 第{ep}集 4K 国语中字.mkv', True),
+    ('【高清】{name} 第{ep}话.mp4', True),
+    ('{name} 第{ep}期 完整版.mp4', True),
+    ('{name}.S01E{ep:02d}.1080p.WEB-DL.H264.AAC.mkv', True),
+    ('{name}.s02e{ep:03d}.2160p.HDR.mkv', True),
+    ('[字幕组][{name}][{ep:02d}][1080P][简繁内封].mkv', True),
+    ('{name} EP{ep:02d} 4K.mp4', True),
+    ('{name}.E{ep:02d}.WEB-DL.mp4', True),
+    ('{name}.{ep:03d}.HD1080P.国语中字.mp4', True),
+    ('{name} - {ep:02d} [1080p].mkv', True),
+    ('{ep:02d}.mp4', True),
+    ('{name} 花絮 幕后特辑.mp4', False),
+    ('{name} 海报.jpg', False),
+    ('{name} 简体中文字幕.srt', False),
+]
+MICRO_CANDIDATE_TEMPLATES = ['{name}', '【{name}】全集 4K', '{name} 第二季', '{name} S01 1080p', '{name}（2024）更新至20集',
+                             '{other}', '{other} 全集']
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+
+def make_micro_corpus(size):
+    """生成 size 个 (文件名, 任务名, 期望集数) 的剧集文件名语料，不应解析出集数的文件期望为None"""
+    rng = random.Random(MICRO_SEED)
+    corpus = []
+    for i in range(size):
+        template, has_episode = MICRO_FILE_TEMPLATES[i % len(MICRO_FILE_TEMPLATES)]
+        name = rng.choice(MICRO_TASKNAMES)
+        episode = rng.randint(1, 200)
+        corpus.append((template.format(name=name, ep=episode), name, episode if has_episode else None))
+    return corpus
+
+
+def make_micro_candidates(size):
+    """生成 size 个 (候选任务名, 原任务名) 组合，包含同名、带季数/画质修饰的写法和无关剧名"""
+    rng = random.Random(MICRO_SEED)
+    pairs = []
+    for i in range(size):
+        template = MICRO_CANDIDATE_TEMPLATES[i % len(MICRO_CANDIDATE_TEMPLATES)]
+        name, other = rng.sample(MICRO_TASKNAMES, 2)
+        pairs.append((template.format(name=name, other=other), name))
+    return pairs
+
+
+def ops_per_second(func, min_time, rounds):
+    """重复调用 func（返回本次完成的操作数）直到耗时不少于 min_time 秒，取 rounds 轮中最快的每秒操作数"""
+    best = 0.0
+    for _ in range(rounds):
+        ops = 0
+        with redirect_stdout(DEVNULL):
+            start = time.perf_counter()
+            while True:
+                ops += func()
+                elapsed = time.perf_counter() - start
+                if elapsed >= min_time:
+                    break
+        best = max(best, ops / elapsed)
+    return best
+
+
+def calibrate():
+    """固定的纯Python负载（字符串处理、排序、字典和集合操作），用来估算当前机器的单线程速度；
+    各项结果先除以它再与基准比较，不同机器之间的绝对速度差异被抵消"""
+    words = [f"测试剧.S{i % 9:02d}E{i:03d}.1080p" for i in range(200)]
+
+    def work():
+        counts = {}
+        for word in sorted(words, key=lambda w: w[::-1]):
+            key = word.lower().partition('.')[2]
+            counts[key] = counts.get(key, 0) + len(set(key))
+        return 1
+    return work
+
+
+def load_baseline(path):
+    """读取基准文件，不存在时返回None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path, results, baseline, threshold, params, calibration):
+    """保存当前结果为新基准，记录运行参数和机器速度，保留原基准中各项单独设置的阈值"""
+    old_results = (baseline or {}).get('results', {})
+    data = {
+        'threshold': threshold,
+        'params': params,
+        'calibration_ops_per_sec': round(calibration, 1),
+        'results': {name: {'ops_per_sec': round(ops, 1),
+                           **({'threshold': old_results[name]['threshold']}
+                              if 'threshold' in old_results.get(name, {}) else {})}
+                    for name, ops in results.items()}
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def bench_micro(args):
+    """纯CPU热点函数的微基准：每秒操作数，并与基准文件比较，低于 基准 ×（1 - 阈值）时判为性能回退"""
+    updater = create_updater()
+    corpus = make_micro_corpus(args.corpus)
+    candidates = make_micro_candidates(args.corpus)
+    rng = random.Random(MICRO_SEED)
+    analyses = [make_synthetic_analysis(rng, i, 20, 40) for i in range(5)]
+    saved_cases = [[], list(range(1, 300)), sorted(rng.sample(range(1, 1600), 100))]
+
+    print(f"📊 微基准: {len(corpus)} 个文件名，{len(candidates)} 组任务名，"
+          f"{len(analyses)} 个资源 × 20 个文件夹 × 40 集，{len(saved_cases)} 组已转存剧集")
+
+    # 语料中的期望集数与解析结果不一致时先报错，性能数字才有意义
+    wrong = [(filename, expected, updater.extract_episode_number_enhanced(filename, taskname))
+             for filename, taskname, expected in corpus
+             if updater.extract_episode_number_enhanced(filename, taskname) != expected]
+    for filename, expected, actual in wrong[:5]:
+        print(f"   ❌ {filename}: 期望 {expected}，解析为 {actual}")
+
+    def extract():
+        for filename, taskname, _ in corpus:
+            updater.extract_episode_number_enhanced(filename, taskname)
+        return len(corpus)
+
+    # 匹配器在计时前构建一次并预热规范化缓存，结果不随语料数量变化
+    updater.get_name_matcher()
+    for candidate, original in candidates:
+        updater.is_taskname_match(candidate, original)
+
+    def match():
+        for candidate, original in candidates:
+            updater.is_taskname_match(candidate, original)
+        return len(candidates)
+
+    def video():
+        for filename, _, _ in corpus:
+            updater.is_video_file(filename)
+        return len(corpus)
+
+    def select_folder():
+        for saved_episodes in saved_cases:
+            for analysis in analyses:
+                updater.select_best_folder_for_continuation(analysis, saved_episodes)
+        return len(saved_cases) * len(analyses)
+
+    def select_resource():
+        for saved_episodes in saved_cases:
+            updater.select_best_resource(analyses, 'bench', saved_episodes)
+        return len(saved_cases)
+
+    benchmarks = {
+        'extract_episode_number_enhanced': extract,
+        'is_taskname_match': match,
+        'is_video_file': video,
+        'select_best_folder_for_continuation': select_folder,
+        'select_best_resource': select_resource,
+    }
+    results = {name: ops_per_second(func, args.min_time, args.repeat) for name, func in benchmarks.items()}
+    calibration = ops_per_second(calibrate(), args.min_time, args.repeat)
+
+    params = {'corpus': args.corpus, 'min_time': args.min_time}
+    baseline = load_baseline(args.baseline)
+    if baseline is not None and baseline.get('params') != params:
+        # 语料数量、每轮时间不同时结果不可比，只输出数值
+        print(f"   ⚠️ 运行参数 {params} 与基准 {baseline.get('params')} 不同，不与基准比较")
+        compare = None
+    else:
+        compare = baseline
+    # 各项结果按机器速度换算后比较；旧基准没有记录机器速度时直接比较
+    speed = calibration / compare['calibration_ops_per_sec'] if compare and 'calibration_ops_per_sec' in compare else 1.0
+    if compare:
+        print(f"   机器速度: 基准的 {speed:.2f}x")
+    threshold = args.threshold if args.threshold is not None else (baseline or {}).get('threshold', 0.3)
+    regressions = 0
+    for name, ops in results.items():
+        entry = (compare or {}).get('results', {}).get(name)
+        if not entry:
+            print(f"   {name}: {ops:,.0f} ops/s")
+            continue
+        limit = entry.get('threshold', threshold)
+        ratio = ops / (entry['ops_per_sec'] * speed)
+        regressed = ratio < 1 - limit
+        regressions += regressed
+        print(f"   {'❌' if regressed else '✅'} {name}: {ops:,.0f} ops/s（基准 {entry['ops_per_sec']:,.0f}，"
+              f"按机器速度换算后 {ratio:.2f}x，允许下降 {limit:.0%}）")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results, baseline, threshold, params, calibration)
+        print(f"   💾 已保存为基准: {args.baseline}")
+    elif baseline is None:
+        print(f"   ℹ️ 没有基准文件 {args.baseline}，使用 --save-baseline 生成")
+
+    if wrong:
+        print(f"   ❌ {len(wrong)} 个文件名的集数解析与期望不一致")
+        return False
+    if regressions and not args.save_baseline:
+        print(f"   ❌ {regressions} 项性能回退超过阈值")
+        return False
+    print(f"   ✅ 集数解析与期望一致" + ("，没有超过阈值的性能回退" if compare and not args.save_baseline else ""))
+    return True
+
+
+SUITES = {
+    'scoring': bench_scoring,
+    'episode_set': bench_episode_set,
+    'records': bench_records,
+    'micro': bench_micro,
+}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='夸克资源失效任务增量更新脚本 - 性能基准测试')
+    parser.add_argument('--resources', type=int, default=10, help='每组候选资源数量')
+    parser.add_argument('--folders', type=int, default=300, help='每个资源的文件夹数量')
+    parser.add_argument('--episodes', type=int, default=40, help='每个文件夹的剧集数量')
+    parser.add_argument('--cases', type=int, default=8, help='随机已转存剧集用例数量')
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例的重复次数')
+    parser.add_argument('--seed', type=int, default=20240601, help='随机种子')
+    parser.add_argument('--suite', choices=['all'] + list(SUITES), default='all', help='要运行的基准测试')
+    parser.add_argument('--corpus', type=int, default=3000, help='微基准文件名/任务名语料数量')
+    parser.add_argument('--min-time', type=float, default=0.2, help='微基准每轮最短运行时间（秒）')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='微基准的基准文件')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='允许的性能下降比例（默认取基准文件中的设置，没有时为0.3）')
+    parser.add_argument('--save-baseline', action='store_true', help='将本次微基准结果保存为新基准')
+    args = parser.parse_args()
+
+    suites = SUITES.values() if args.suite == 'all' else [SUITES[args.suite]]
+    success = True
+    for suite in suites:
+        success = suite(args) and success
+        print()
+    raise SystemExit(0 if success else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,19 +6,1214 @@
 """
 import os
 import re
+import sys
 import json
 import time
+import signal
+import codecs
+import threading
+import uuid
 import requests
 import hashlib
+import sqlite3
+import unicodedata
 import urllib.parse
+from bisect import bisect_left
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from functools import lru_cache
 from urllib.parse import unquote
 
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库json
+    orjson = None
+
+# 设置 QUARK_JSON_BACKEND=json 可强制使用标准库json
+if os.getenv('QUARK_JSON_BACKEND', '').lower() == 'json':
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有fcntl，只在进程内加锁
+    fcntl = None
+
+
+def json_loads(data):
+    """解析JSON文本或UTF-8字节（安装了orjson时使用orjson）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj, indent=False):
+    """序列化为UTF-8字节，中文不转义；indent为True时按2空格缩进"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+        except TypeError:
+            pass  # orjson不支持的值（如超过64位的整数）回退到标准库
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode('utf-8')
+
+
+def iter_json_array(chunks, key):
+    """从UTF-8字节块流中增量解析第一个名为 key 的数组，逐个产出其中的元素（元素须为对象或数组）
+
+    只缓存尚未解析完的一段文本，不需要完整响应体；流结束时数组仍未闭合或没有找到 key 时抛出 ValueError
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    key_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    buffer = ''
+    pos = None  # 数组内下一个元素的起始位置，找到 key 之前为None
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        if pos is None:
+            match = key_pattern.search(buffer)
+            if not match:
+                buffer = buffer[-(len(key) + 64):]  # 保留末尾，key 可能被块边界截断
+                continue
+            pos = match.end()
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == ']':
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                break  # 元素不完整，等待下一块
+            yield item
+        buffer = buffer[pos:]
+        pos = 0
+    raise ValueError(f"响应中没有完整的 {key} 数组")
+
+
+class EpisodeSet:
+    """紧凑的剧集集合 - 位图存储，支持O(1)成员判断、区间计数和缺集查找"""
+    __slots__ = ('_bits', '_count', 'min_episode', 'max_episode')
+
+    def __init__(self, episodes=()):
+        self._bits = bytearray()
+        self._count = 0
+        self.min_episode = None
+        self.max_episode = None
+        for episode in episodes:
+            self.add(episode)
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        """从 [(起始集, 结束集), ...] 区间列表恢复集合"""
+        episode_set = cls()
+        for start, end in intervals:
+            for episode in range(start, end + 1):
+                episode_set.add(episode)
+        return episode_set
+
+    def add(self, episode):
+        """添加一集（集数必须为非负整数）"""
+        if episode < 0:
+            raise ValueError(f"集数不能为负数: {episode}")
+        byte_index = episode >> 3
+        if byte_index >= len(self._bits):
+            self._bits.extend(bytes(byte_index + 1 - len(self._bits)))
+        mask = 1 << (episode & 7)
+        if self._bits[byte_index] & mask:
+            return
+        self._bits[byte_index] |= mask
+        self._count += 1
+        if self.min_episode is None or episode < self.min_episode:
+            self.min_episode = episode
+        if self.max_episode is None or episode > self.max_episode:
+            self.max_episode = episode
+
+    def __contains__(self, episode):
+        if not isinstance(episode, int) or episode < 0:
+            return False
+        byte_index = episode >> 3
+        return byte_index < len(self._bits) and bool(self._bits[byte_index] >> (episode & 7) & 1)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for byte_index, value in enumerate(self._bits):
+            if value:
+                base = byte_index << 3
+                for bit in range(8):
+                    if value >> bit & 1:
+                        yield base + bit
+
+    def count_range(self, start, end):
+        """统计 [start, end] 闭区间内的集数数量"""
+        start = max(start, 0)
+        end = min(end, len(self._bits) * 8 - 1)
+        if end < start:
+            return 0
+        chunk = int.from_bytes(self._bits[start >> 3:(end >> 3) + 1], 'little') >> (start & 7)
+        chunk &= (1 << (end - start + 1)) - 1
+        return bin(chunk).count('1')
+
+    def next_episode(self, start):
+        """返回大于等于 start 的最小集数，不存在时返回 None"""
+        if self.max_episode is None or start > self.max_episode:
+            return None
+        episode = max(start, self.min_episode)
+        byte_index = episode >> 3
+        value = self._bits[byte_index] >> (episode & 7)
+        if value:
+            return episode + ((value & -value).bit_length() - 1)
+        for byte_index in range(byte_index + 1, len(self._bits)):
+            value = self._bits[byte_index]
+            if value:
+                return (byte_index << 3) + ((value & -value).bit_length() - 1)
+        return None
+
+    def intervals(self):
+        """返回连续集数区间列表 [(起始集, 结束集), ...]"""
+        result = []
+        for episode in self:
+            if result and result[-1][1] == episode - 1:
+                result[-1][1] = episode
+            else:
+                result.append([episode, episode])
+        return [tuple(interval) for interval in result]
+
+    def gaps(self, start=None, end=None):
+        """返回 [start, end] 范围内缺失的集数区间，默认范围为已有的最小到最大集"""
+        if not self._count:
+            return []
+        start = self.min_episode if start is None else start
+        end = self.max_episode if end is None else end
+        result = []
+        missing_from = None
+        for episode in range(start, end + 1):
+            if episode in self:
+                if missing_from is not None:
+                    result.append((missing_from, episode - 1))
+                    missing_from = None
+            elif missing_from is None:
+                missing_from = episode
+        if missing_from is not None:
+            result.append((missing_from, end))
+        return result
+
+    def __str__(self):
+        return ", ".join(f"{a}" if a == b else f"{a}-{b}" for a, b in self.intervals())
+
+    def __repr__(self):
+        return f"EpisodeSet({self})"
+
+
+class FolderNode:
+    """分享内的文件夹节点 - 同一文件夹下的所有剧集共享同一个节点，通过父节点引用还原路径"""
+    __slots__ = ('fid', 'name', 'parent')
+
+    def __init__(self, fid=None, name='', parent=None):
+        self.fid = fid
+        self.name = sys.intern(name) if name else ''
+        self.parent = parent
+
+    @classmethod
+    def from_path(cls, path_items):
+        """由接口返回的 full_path 列表构建节点链，返回最深一级节点"""
+        node = cls()
+        for item in path_items:
+            node = cls(item.get('fid'), item.get('file_name', ''), node)
+        return node
+
+    def child(self, item):
+        """为列表中的子文件夹条目创建子节点"""
+        return FolderNode(item.get('fid'), item.get('file_name', ''), self)
+
+    def path(self):
+        """从分享根目录到当前文件夹的节点列表（不含根节点）"""
+        nodes = []
+        node = self
+        while node is not None and node.parent is not None:
+            nodes.append(node)
+            node = node.parent
+        nodes.reverse()
+        return nodes
+
+    def path_items(self):
+        """与接口 full_path 格式一致的路径列表 [{'fid':..., 'file_name':...}, ...]"""
+        return [{'fid': node.fid, 'file_name': node.name} for node in self.path()]
+
+
+class ShareRef:
+    """分享链接的规范身份：分享ID + 提取码 + 可选的文件夹fid，每个链接只解析一次
+
+    同一分享的不同写法（有无 #/list/share/ 片段、不同的查询参数）得到相同的 key，
+    key 用作分享详情缓存、失效候选记录和断点状态的键；url 为规范链接（保留提取码）
+    """
+    __slots__ = ('share_id', 'pwd', 'fid')
+    SHARE_ID_PATTERN = re.compile(r'/s/(\w+)')
+    PWD_PATTERN = re.compile(r'[?&]pwd=(\w+)')
+    FID_PATTERN = re.compile(r'[0-9a-f]{32}')
+    SHARE_BASE_URL = 'https://pan.quark.cn/s/'
+
+    def __init__(self, share_id, pwd=None, fid=None):
+        self.share_id = share_id
+        self.pwd = pwd
+        self.fid = fid
+
+    @classmethod
+    @lru_cache(maxsize=4096)
+    def parse(cls, share_url):
+        """解析分享链接，无法识别分享ID时返回None；片段中有多级目录时取最深一级的fid"""
+        if not share_url:
+            return None
+        match = cls.SHARE_ID_PATTERN.search(share_url.split('#')[0])
+        if not match:
+            return None
+        pwd = cls.PWD_PATTERN.search(share_url)
+        _, _, fragment = share_url.partition('#')
+        fids = cls.FID_PATTERN.findall(fragment) if '/list/share/' in fragment else []
+        return cls(match.group(1), pwd.group(1) if pwd else None, fids[-1] if fids else None)
+
+    @classmethod
+    def key_of(cls, share_url):
+        """分享链接的规范键，无法解析的链接原样作为键"""
+        ref = cls.parse(share_url)
+        return ref.key if ref else share_url
+
+    @classmethod
+    def canonical_url(cls, share_url):
+        """规范链接，无法解析的链接原样返回"""
+        ref = cls.parse(share_url)
+        return ref.url if ref else share_url
+
+    @property
+    def key(self):
+        return f"{self.share_id}/{self.fid}" if self.fid else self.share_id
+
+    @property
+    def url(self):
+        url = f"{self.SHARE_BASE_URL}{self.share_id}"
+        if self.pwd:
+            url += f"?pwd={self.pwd}"
+        if self.fid:
+            url += f"#/list/share/{self.fid}"
+        return url
+
+    def child(self, fid):
+        """同一分享中另一个文件夹的身份"""
+        return ShareRef(self.share_id, self.pwd, fid)
+
+    def __eq__(self, other):
+        return isinstance(other, ShareRef) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"ShareRef({self.key!r})"
+
+
+class MirrorIndex:
+    """候选分享的内容指纹索引，识别内容相同的镜像分享（同一资源被多次转发）
+
+    指纹由根目录中各条目的规范化文件名和大小（文件夹取条目数）计算；
+    根目录里没有任何大小或条目数信息时不计算指纹，避免只凭文件夹名误判
+    """
+    WHITESPACE_PATTERN = re.compile(r'\s+')
+
+    def __init__(self):
+        self.seen = {}  # {指纹: 首个出现该内容的分享规范键}
+        self.skipped = 0
+
+    @classmethod
+    def normalize_name(cls, name):
+        return cls.WHITESPACE_PATTERN.sub('', unicodedata.normalize('NFKC', name or '')).lower()
+
+    @classmethod
+    def fingerprint(cls, share_data):
+        """根目录列表的内容指纹，无法计算时返回None"""
+        if not share_data:
+            return None
+        entries = []
+        informative = False
+        for item in share_data.get('list', []):
+            name = cls.normalize_name(item.get('file_name'))
+            if item.get('dir'):
+                count = item.get('include_items') or 0
+                entries.append(f"d\t{name}\t{count}")
+            else:
+                count = item.get('size') or 0
+                entries.append(f"f\t{name}\t{count}")
+            informative = informative or bool(count)
+        if not informative:
+            return None
+        return hashlib.sha1('\n'.join(sorted(entries)).encode('utf-8')).hexdigest()
+
+    def mirror_of(self, share_url, share_data):
+        """share_url 的根目录与之前登记的分享内容相同时返回该分享的规范键（并计入 skipped），
+        否则登记该分享并返回None"""
+        fingerprint = self.fingerprint(share_data)
+        if fingerprint is None:
+            return None
+        key = ShareRef.key_of(share_url)
+        original = self.seen.setdefault(fingerprint, key)
+        if original == key:
+            return None
+        self.skipped += 1
+        return original
+
+
+class EpisodeFile:
+    """剧集文件记录 - 使用 __slots__ 并引用共享的文件夹节点，避免每集复制路径列表"""
+    __slots__ = ('fid', 'file_name', 'episode', 'pdir_fid', 'size', 'folder')
+
+    def __init__(self, fid, file_name, episode, pdir_fid=None, size=0, folder=None):
+        self.fid = fid
+        self.file_name = file_name
+        self.episode = episode
+        # 同一文件夹下的文件共享同一个父目录fid字符串
+        self.pdir_fid = sys.intern(pdir_fid) if isinstance(pdir_fid, str) else pdir_fid
+        self.size = size
+        self.folder = folder
+
+    @property
+    def folder_path(self):
+        return [node.name for node in self.folder.path()] if self.folder else []
+
+    @property
+    def folder_fids(self):
+        return [node.fid for node in self.folder.path()] if self.folder else []
+
+    def to_dict(self):
+        return {
+            'fid': self.fid,
+            'file_name': self.file_name,
+            'episode': self.episode,
+            'pdir_fid': self.pdir_fid,
+            'size': self.size,
+            'folder_path': self.folder_path,
+            'folder_fids': self.folder_fids
+        }
+
+    def __repr__(self):
+        return f"EpisodeFile({self.episode}, {self.file_name!r})"
+
+
+class TasknameMatcher:
+    """任务名匹配器 - 名称只规范化一次并缓存，支持别名表，按字符n-gram相似度对候选资源排序"""
+    BRACKET_PATTERN = re.compile(r'[【】\[\]\(\)（）]')
+    MISSING_SEASON_SCORE = 0.5
+    SPACE_PATTERN = re.compile(r'\s+')
+    SEASON_PATTERN = re.compile(r'第([0-9一二三四五六七八九十]+)季|(?<![a-z0-9])s(\d{1,2})(?!\d)')
+    CHINESE_DIGITS = {'一': 1, '二': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+
+    # 内置别名：别名 -> 标准名称
+    DEFAULT_ALIASES = {
+        '斗罗大陆Ⅱ': '斗罗大陆2',
+        '绝世唐门': '斗罗大陆2',
+    }
+
+    def __init__(self, aliases=None, threshold=0.75):
+        self.threshold = threshold
+        self.normalize = lru_cache(maxsize=4096)(self._normalize)
+        self.parse = lru_cache(maxsize=4096)(self._parse)
+
+        alias_table = dict(self.DEFAULT_ALIASES)
+        alias_table.update(aliases or {})
+        # 先替换较长的别名，避免被较短的别名截断
+        self.aliases = sorted(
+            ((self._clean(alias), self._clean(canonical)) for alias, canonical in alias_table.items()
+             if self._clean(alias)),
+            key=lambda pair: len(pair[0]), reverse=True)
+
+    def _clean(self, name):
+        """全角转半角、去括号、转小写、统一季数写法（S2/第二季 -> 第2季），最后去除空白"""
+        name = unicodedata.normalize('NFKC', name or '')
+        name = self.BRACKET_PATTERN.sub('', name).lower()
+        name = self.SEASON_PATTERN.sub(lambda m: f"第{self._season_number(m.group(1) or m.group(2))}季", name)
+        return self.SPACE_PATTERN.sub('', name)
+
+    def _normalize(self, name):
+        """规范化名称，并把别名替换为标准名称"""
+        name = self._clean(name)
+        for alias, canonical in self.aliases:
+            if alias in name:
+                name = name.replace(alias, canonical)
+                # "斗罗大陆Ⅱ绝世唐门" 这类别名与标准名称并列的写法只保留一份
+                while canonical * 2 in name:
+                    name = name.replace(canonical * 2, canonical)
+        return name
+
+    def _season_number(self, text):
+        if text.isdigit():
+            return int(text)
+        if text.startswith('十'):
+            return 10 + self.CHINESE_DIGITS.get(text[1:], 0)
+        if '十' in text:
+            tens, _, ones = text.partition('十')
+            return self.CHINESE_DIGITS.get(tens, 0) * 10 + self.CHINESE_DIGITS.get(ones, 0)
+        return self.CHINESE_DIGITS.get(text)
+
+    def _parse(self, name):
+        """返回 (规范化名称, 去掉季数后的名称, 季数, 名称n-gram集合)"""
+        normalized = self.normalize(name)
+        season = None
+        match = self.SEASON_PATTERN.search(normalized)
+        if match:
+            season = self._season_number(match.group(1) or match.group(2))
+        base = self.SEASON_PATTERN.sub('', normalized)
+        if len(base) > 1:
+            grams = frozenset(base[i:i + 2] for i in range(len(base) - 1))
+        else:
+            grams = frozenset(base)
+        return normalized, base, season, grams
+
+    def score(self, candidate_taskname, original_taskname):
+        """计算候选名称与原始名称的相似度（0~1）"""
+        candidate, candidate_base, candidate_season, candidate_grams = self.parse(candidate_taskname)
+        original, original_base, original_season, original_grams = self.parse(original_taskname)
+        if not candidate or not original:
+            return 0.0
+
+        # 季数明确不同的直接排除
+        if candidate_season is not None and original_season is not None and candidate_season != original_season:
+            return 0.0
+
+        if original in candidate:
+            return 1.0
+
+        # 原始名称指定了季数而候选名称没有（如「测试剧 第二季」与「测试剧」）时无法确认是同一季，分数不超过 MISSING_SEASON_SCORE
+        season_unknown = original_season is not None and candidate_season is None
+        if original_base and original_base in candidate_base and not season_unknown:
+            return 0.9
+
+        # 原始名称的n-gram在候选名称中出现的比例
+        if not original_grams:
+            return 0.0
+        score = len(original_grams & candidate_grams) / len(original_grams) * 0.85
+        return min(score, self.MISSING_SEASON_SCORE) if season_unknown else score
+
+    def is_match(self, candidate_taskname, original_taskname):
+        return self.score(candidate_taskname, original_taskname) >= self.threshold
+
+    def rank(self, resources, original_taskname):
+        """过滤并按相似度从高到低排序候选资源（相同分数保持原有顺序），分数记录在 match_score 中"""
+        scored = []
+        for resource in resources:
+            candidate_taskname = resource.get('taskname', '')
+            if not candidate_taskname:
+                continue
+            score = self.score(candidate_taskname, original_taskname)
+            if score >= self.threshold:
+                resource['match_score'] = round(score, 3)
+                scored.append((score, resource))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [resource for _, resource in scored]
+
+
+class SQLiteStore:
+    """SQLite存储基类：每个线程各自持有连接（WAL模式），多个进程可同时读写"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # sqlite3连接不能跨线程使用，每个线程各自持有一个连接
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """写事务（BEGIN IMMEDIATE），多个进程同时写入时排队执行"""
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+
+class TaskStatusStore(SQLiteStore):
+    """后台任务状态存储 - SQLite持久化，多个API工作进程共享同一份任务状态"""
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        with self.transaction() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS task_status ('
+                         'task_id TEXT PRIMARY KEY, status TEXT, data TEXT NOT NULL, '
+                         'created REAL NOT NULL, updated REAL NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS trigger_batches ('
+                         'batch_id TEXT PRIMARY KEY, fired_at REAL NOT NULL, success INTEGER NOT NULL, '
+                         'requests INTEGER NOT NULL)')
+            # 取消请求单独存放，任务自身写入进度时不会覆盖
+            conn.execute('CREATE TABLE IF NOT EXISTS task_cancels ('
+                         'task_id TEXT PRIMARY KEY, requested REAL NOT NULL)')
+
+    def __setitem__(self, task_id, info):
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute('INSERT INTO task_status (task_id, status, data, created, updated) '
+                         'VALUES (?, ?, ?, ?, ?) ON CONFLICT(task_id) DO UPDATE SET '
+                         'status = excluded.status, data = excluded.data, updated = excluded.updated',
+                         (task_id, info.get('status'), json_dumps(info).decode('utf-8'), now, now))
+
+    def get(self, task_id, default=None):
+        row = self.connection().execute('SELECT data FROM task_status WHERE task_id = ?',
+                                        (task_id,)).fetchone()
+        return json_loads(row[0]) if row else default
+
+    def __getitem__(self, task_id):
+        info = self.get(task_id)
+        if info is None:
+            raise KeyError(task_id)
+        return info
+
+    def __contains__(self, task_id):
+        return self.connection().execute('SELECT 1 FROM task_status WHERE task_id = ?',
+                                         (task_id,)).fetchone() is not None
+
+    def __len__(self):
+        return self.connection().execute('SELECT COUNT(*) FROM task_status').fetchone()[0]
+
+    def modify(self, task_id, change):
+        """在同一事务内读取、修改并写回任务状态，避免多个进程/线程的修改互相覆盖"""
+        with self.transaction() as conn:
+            row = conn.execute('SELECT data FROM task_status WHERE task_id = ?', (task_id,)).fetchone()
+            if row is None:
+                return None
+            info = json_loads(row[0])
+            change(info)
+            conn.execute('UPDATE task_status SET status = ?, data = ?, updated = ? WHERE task_id = ?',
+                         (info.get('status'), json_dumps(info).decode('utf-8'), time.time(), task_id))
+            return info
+
+    def update_fields(self, task_id, **fields):
+        """合并任务状态的字段"""
+        return self.modify(task_id, lambda info: info.update(fields))
+
+    def keys(self):
+        """按创建时间从旧到新返回全部任务ID"""
+        return [row[0] for row in self.connection().execute(
+            'SELECT task_id FROM task_status ORDER BY created, rowid')]
+
+    def statuses(self):
+        """按创建时间从旧到新返回 [(任务ID, 状态), ...]"""
+        return self.connection().execute(
+            'SELECT task_id, status FROM task_status ORDER BY created, rowid').fetchall()
+
+    def count(self, status):
+        return self.connection().execute('SELECT COUNT(*) FROM task_status WHERE status = ?',
+                                         (status,)).fetchone()[0]
+
+    def delete(self, task_ids):
+        with self.transaction() as conn:
+            conn.executemany('DELETE FROM task_status WHERE task_id = ?', [(task_id,) for task_id in task_ids])
+            conn.executemany('DELETE FROM task_cancels WHERE task_id = ?', [(task_id,) for task_id in task_ids])
+
+    def request_cancel(self, task_id):
+        """记录取消请求，由执行该任务的工作进程在下次检查时停止"""
+        with self.transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO task_cancels (task_id, requested) VALUES (?, ?)',
+                         (task_id, time.time()))
+
+    def cancel_requested(self, task_id):
+        return self.connection().execute('SELECT 1 FROM task_cancels WHERE task_id = ?',
+                                         (task_id,)).fetchone() is not None
+
+    def record_trigger(self, batch_id, fired_at, success, requests_count):
+        """记录一次资源更新触发"""
+        with self.transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO trigger_batches (batch_id, fired_at, success, requests) '
+                         'VALUES (?, ?, ?, ?)', (batch_id, fired_at, int(success), requests_count))
+
+    def last_trigger_since(self, since):
+        """返回 since 之后最早一次成功触发的批次ID，没有则返回None"""
+        row = self.connection().execute('SELECT batch_id FROM trigger_batches WHERE success = 1 AND fired_at >= ? '
+                                        'ORDER BY fired_at LIMIT 1', (since,)).fetchone()
+        return row[0] if row else None
+
+
+class NegativeShareCache(SQLiteStore):
+    """失效或没有可解析剧集的候选分享记录 - SQLite持久化，更新脚本和API各工作进程共用
+
+    记录在 ttl 秒内有效，期间这些候选在发出任何请求前直接跳过；ttl 为0时不记录也不跳过。
+    数据库在首次使用时才创建
+    """
+
+    def __init__(self, db_path, ttl=86400):
+        super().__init__(db_path)
+        self.ttl = ttl
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = super().connection()
+            conn.execute('CREATE TABLE IF NOT EXISTS negative_shares ('
+                         'share_key TEXT PRIMARY KEY, reason TEXT NOT NULL, recorded REAL NOT NULL)')
+        return conn
+
+    def add(self, share_key, reason):
+        if not self.ttl:
+            return
+        with self.transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO negative_shares (share_key, reason, recorded) VALUES (?, ?, ?)',
+                         (share_key, reason, time.time()))
+
+    def discard(self, share_key, reason):
+        """删除该分享指定原因的记录（分享已恢复），没有记录时不写入"""
+        if not self.ttl or not self.filter_known([share_key]):
+            return
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM negative_shares WHERE share_key = ? AND reason = ?', (share_key, reason))
+
+    def filter_known(self, share_keys):
+        """返回 {分享: 原因}，只包含仍在有效期内的记录"""
+        if not self.ttl or not share_keys:
+            return {}
+        share_keys = list(share_keys)
+        placeholders = ', '.join('?' * len(share_keys))
+        rows = self.connection().execute(
+            f'SELECT share_key, reason FROM negative_shares WHERE recorded >= ? AND share_key IN ({placeholders})',
+            [time.time() - self.ttl, *share_keys]).fetchall()
+        return dict(rows)
+
+    def prune(self):
+        """删除过期记录"""
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM negative_shares WHERE recorded < ?', (time.time() - self.ttl,))
+
+
+class TaskStore(SQLiteStore):
+    """任务列表存储 - 配置项 task_storage 为 "sqlite" 时使用，每个任务一行，按任务名和失效标记建立索引
+
+    添加或修改单个任务只写一行并标记为待导出；quark-auto-save 仍然读取配置文件中的 tasklist，
+    待导出的修改由 FailedTaskIncrementalUpdater.save_config 一次性写回配置文件。
+    配置文件被外部修改（如 quark-auto-save 标记失效）后整体导入，尚未导出的本地修改保留
+    """
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        with self.transaction() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS tasks ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, position INTEGER NOT NULL, taskname TEXT NOT NULL, '
+                         'failed INTEGER NOT NULL, pending INTEGER NOT NULL DEFAULT 0, data TEXT NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS tasks_position ON tasks (position)')
+            conn.execute('CREATE INDEX IF NOT EXISTS tasks_taskname ON tasks (taskname)')
+            conn.execute('CREATE INDEX IF NOT EXISTS tasks_failed ON tasks (failed, position)')
+            conn.execute('CREATE TABLE IF NOT EXISTS task_store_meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    @staticmethod
+    def row_values(task):
+        return task.get('taskname', ''), int(bool(task.get('shareurl_ban'))), json_dumps(task).decode('utf-8')
+
+    @staticmethod
+    def occurrence_keys(tasknames):
+        """按顺序为任务名编号：(任务名, 第几个同名任务)，同名任务各自对应，前面插入或删除其他任务时不受影响"""
+        seen = {}
+        keys = []
+        for taskname in tasknames:
+            keys.append((taskname, seen.get(taskname, 0)))
+            seen[taskname] = seen.get(taskname, 0) + 1
+        return keys
+
+    def import_tasklist(self, tasklist, source_mtime):
+        """导入配置文件中的 tasklist（quark-auto-save 格式），替换全部任务；
+        尚未导出的本地修改按 (任务名, 第几个同名任务) 对应保留，本地新增而配置文件中没有的任务追加在最后"""
+        with self.transaction() as conn:
+            local = conn.execute('SELECT taskname, pending, data FROM tasks ORDER BY position').fetchall()
+            pending = {key: data for key, (_, is_pending, data)
+                       in zip(self.occurrence_keys(row[0] for row in local), local) if is_pending}
+            conn.execute('DELETE FROM tasks')
+            rows = []
+            values = [self.row_values(task) for task in tasklist]
+            for key, (taskname, failed, data) in zip(self.occurrence_keys(v[0] for v in values), values):
+                if key in pending:
+                    data = pending.pop(key)
+                    failed = int(bool(json_loads(data).get('shareurl_ban')))
+                    rows.append((len(rows), taskname, failed, 1, data))
+                else:
+                    rows.append((len(rows), taskname, failed, 0, data))
+            for (taskname, _), data in pending.items():
+                rows.append((len(rows), taskname, int(bool(json_loads(data).get('shareurl_ban'))), 1, data))
+            conn.executemany('INSERT INTO tasks (position, taskname, failed, pending, data) VALUES (?, ?, ?, ?, ?)',
+                             rows)
+            conn.execute("INSERT OR REPLACE INTO task_store_meta (key, value) VALUES ('source_mtime', ?)",
+                         (str(source_mtime),))
+        return len(rows)
+
+    def source_mtime(self):
+        """上次导入或导出时配置文件的修改时间"""
+        row = self.connection().execute("SELECT value FROM task_store_meta WHERE key = 'source_mtime'").fetchone()
+        return row[0] if row else None
+
+    def mark_exported(self, source_mtime):
+        """全部任务已写入配置文件"""
+        with self.transaction() as conn:
+            conn.execute('UPDATE tasks SET pending = 0 WHERE pending = 1')
+            conn.execute("INSERT OR REPLACE INTO task_store_meta (key, value) VALUES ('source_mtime', ?)",
+                         (str(source_mtime),))
+
+    def tasklist(self):
+        """按配置顺序导出全部任务（quark-auto-save 格式）"""
+        return [json_loads(data) for data, in self.connection().execute('SELECT data FROM tasks ORDER BY position')]
+
+    def failed(self):
+        """按配置顺序返回 [(任务ID, 任务), ...]，只包含带失效标记的任务"""
+        return [(task_id, json_loads(data)) for task_id, data in self.connection().execute(
+            'SELECT id, data FROM tasks WHERE failed = 1 ORDER BY position')]
+
+    def exists(self, taskname):
+        return self.connection().execute('SELECT 1 FROM tasks WHERE taskname = ? LIMIT 1',
+                                         (taskname,)).fetchone() is not None
+
+    def count(self):
+        return self.connection().execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+
+    def has_pending(self):
+        return self.connection().execute('SELECT 1 FROM tasks WHERE pending = 1 LIMIT 1').fetchone() is not None
+
+    def add(self, tasks):
+        """在末尾追加任务"""
+        with self.transaction() as conn:
+            position = conn.execute('SELECT COALESCE(MAX(position), -1) FROM tasks').fetchone()[0]
+            conn.executemany('INSERT INTO tasks (position, taskname, failed, pending, data) VALUES (?, ?, ?, 1, ?)',
+                             [(position + i, *self.row_values(task)) for i, task in enumerate(tasks, 1)])
+
+    def update(self, task_id, task):
+        """只更新一个任务"""
+        with self.transaction() as conn:
+            conn.execute('UPDATE tasks SET taskname = ?, failed = ?, data = ?, pending = 1 WHERE id = ?',
+                         (*self.row_values(task), task_id))
+
+
+class RateLimiter:
+    """请求限速器 - 相邻两次请求的开始时间至少间隔 interval 秒，多个线程共用时一起排队"""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ShareCache(dict):
+    """一次分析过程共用的分享详情缓存 {分享规范键: 详情}，键见 ShareRef.key_of
+
+    同时持有该过程的限速器，并可在后台线程中预取后续要用到的分享详情：当前候选分析期间，
+    后续候选的请求延迟与之重叠；取用时若该链接正在预取则等待其完成，不会重复请求。
+    请求已发出但获取失败的链接缓存为None，本次分析中不再重复请求
+    """
+
+    def __init__(self, interval=1.0):
+        super().__init__()
+        self.limiter = RateLimiter(interval)
+        self.prefetching = {}
+        self.executor = None
+        self.local = threading.local()
+
+    def prefetch(self, fetch, urls):
+        """在后台依次获取尚未缓存的链接，fetch(url, share_cache) 为实际请求函数"""
+        with self.limiter.lock:
+            for url in urls:
+                key = ShareRef.key_of(url)
+                if key in self or key in self.prefetching:
+                    continue
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=1)
+                self.prefetching[key] = self.executor.submit(self._prefetch_one, fetch, url)
+
+    def _prefetch_one(self, fetch, url):
+        self.local.in_prefetch = True
+        try:
+            fetch(url, self)
+        finally:
+            self.local.in_prefetch = False
+
+    def wait(self, key):
+        """等待该链接的预取完成（没有预取时或在预取线程内立即返回）"""
+        if getattr(self.local, 'in_prefetch', False):
+            return
+        future = self.prefetching.get(key)
+        if future is not None:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    def close(self):
+        """停止预取，未开始的预取直接取消"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+class PrefixedOutput:
+    """并发处理任务时替换标准输出：工作线程中的输出按行加上所属任务名前缀并整行写出，
+    多个任务的日志不会交错在同一行；未设置前缀的线程原样输出"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @contextmanager
+    def prefix(self, text):
+        self.local.prefix = text
+        self.local.pending = ''
+        try:
+            yield
+        finally:
+            if self.local.pending:
+                self.write('\n')
+            self.local.prefix = None
+
+    def write(self, text):
+        prefix = getattr(self.local, 'prefix', None)
+        if prefix is None:
+            with self.lock:
+                return self.stream.write(text)
+        *lines, self.local.pending = (self.local.pending + text).split('\n')
+        if lines:
+            with self.lock:
+                self.stream.write(''.join(f"{prefix}{line}\n" if line else '\n' for line in lines))
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class UpstreamUnavailable(requests.exceptions.RequestException):
+    """上游服务熔断中，请求未发出"""
+
+
+class JobStopped(requests.exceptions.RequestException):
+    """任务已到截止时间或已被取消，请求未发出"""
+
+
+class JobContext:
+    """一次后台任务的截止时间和取消状态，搜索、遍历和评分各阶段在发出上游请求前检查
+
+    timeout 为任务总时长（秒），为空或0时不限时；is_cancelled() 返回True表示任务已被取消。
+    auto_check 为False时 cancelled() 不调用 is_cancelled，只返回最近一次 refresh() 的结果
+    （异步版本在线程中调用 refresh，避免在事件循环中读取任务状态库）
+    """
+
+    def __init__(self, timeout=None, is_cancelled=None, auto_check=True):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.is_cancelled = is_cancelled
+        self.auto_check = auto_check
+        self.cancel_seen = False
+
+    def refresh(self):
+        """查询一次取消状态，返回是否已被取消"""
+        if not self.cancel_seen and self.is_cancelled is not None and self.is_cancelled():
+            self.cancel_seen = True
+        return self.cancel_seen
+
+    def cancelled(self):
+        if self.auto_check:
+            return self.refresh()
+        return self.cancel_seen
+
+    def stopped(self):
+        """已被取消或已到截止时间，不应再发出上游请求"""
+        return self.cancelled() or self.expired()
+
+    def remaining(self):
+        """剩余秒数，不限时返回None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def limit_timeout(self, timeout):
+        """把请求超时限制在剩余时间内，timeout 可为秒数或 (连接超时, 读取超时)"""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if isinstance(timeout, tuple):
+            return tuple(min(t, remaining) for t in timeout)
+        return min(timeout, remaining)
+
+
+class CircuitBreaker:
+    """上游服务熔断器
+
+    连续 threshold 次请求失败（连接错误、超时、5xx）后熔断，熔断期间请求直接失败不再等待超时；
+    每隔 cooldown 秒放行一个探测请求，探测成功即恢复，失败则继续熔断。threshold 为0时不熔断
+    """
+
+    def __init__(self, threshold=5, cooldown=60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def is_open(self):
+        """是否处于熔断中（冷却期满、可以探测时视为未熔断）"""
+        with self.lock:
+            return self.opened_at is not None and (self.probing or self.retry_after() > 0)
+
+    def retry_after(self):
+        """距下次探测的剩余秒数"""
+        if self.opened_at is None:
+            return 0
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def allow(self):
+        """是否放行一次请求：未熔断时放行；熔断冷却期满后只放行一个探测请求"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or self.retry_after() > 0:
+                return False
+            self.probing = True
+            print("🔌 上游服务熔断冷却期满，发送探测请求...")
+            return True
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                print("✅ 上游服务已恢复，解除熔断")
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def release_probe(self):
+        """探测请求既未成功也未失败就结束时（如因任务剩余时间不足而超时）归还探测名额，下个请求重新探测"""
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing:
+                self.probing = False
+                self.opened_at = time.monotonic()
+                print(f"⛔ 探测请求失败，继续熔断 {self.cooldown} 秒")
+            elif self.opened_at is None and self.threshold and self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                print(f"⛔ 上游服务连续失败 {self.failures} 次，熔断 {self.cooldown} 秒")
+
+
+class TriggerCoordinator:
+    """资源更新触发合并器 - 窗口期内的多次触发请求合并为一次 /run_script_now 调用
+
+    window 为0时立即触发；history 为 TaskStatusStore 时在多个进程之间共享触发记录：
+    批次打开之后已有其他进程成功触发过，说明上游运行时已能读到本批次保存的配置，直接并入该次触发
+    """
+
+    def __init__(self, trigger, window=0, history=None):
+        self.trigger = trigger  # 实际发起触发的函数，返回是否成功
+        self.window = window
+        self.history = history
+        self.lock = threading.Lock()
+        self.pending = None
+
+    def request(self, callback=None, on_join=None):
+        """请求触发资源更新，返回加入的批次ID
+
+        on_join(batch_id) 在加入批次时调用，callback(batch_id, success) 在批次触发后调用
+        """
+        with self.lock:
+            batch = self.pending
+            if batch is None:
+                batch = self.pending = {
+                    'id': f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}",
+                    'opened': time.time(),
+                    'requests': 0,
+                    'callbacks': [],
+                    'fired': False
+                }
+                if self.window > 0:
+                    print(f"⏳ 资源更新将在 {self.window} 秒后合并触发（批次 {batch['id']}）")
+                    timer = threading.Timer(self.window, self.fire, args=(batch,))
+                    timer.daemon = True
+                    timer.start()
+            batch['requests'] += 1
+            if callback:
+                batch['callbacks'].append(callback)
+            if on_join:
+                on_join(batch['id'])
+
+        if self.window <= 0:
+            self.fire(batch)
+        return batch['id']
+
+    def flush(self):
+        """立即触发等待中的批次（退出前调用，避免请求丢失）"""
+        batch = self.pending
+        if batch is not None:
+            self.fire(batch)
+
+    def fire(self, batch):
+        with self.lock:
+            if batch['fired']:
+                return
+            batch['fired'] = True
+            if self.pending is batch:
+                self.pending = None
+
+        batch_id = batch['id']
+        shared_batch = self.history.last_trigger_since(batch['opened']) if self.history is not None else None
+        if shared_batch:
+            print(f"♻️ 批次 {batch_id} 打开后已由其他进程触发资源更新（批次 {shared_batch}），不再重复触发")
+            batch_id, success = shared_batch, True
+        else:
+            print(f"🔄 合并触发资源更新: 批次 {batch_id}，共 {batch['requests']} 个请求")
+            fired_at = time.time()
+            success = bool(self.trigger())
+            if self.history is not None:
+                self.history.record_trigger(batch_id, fired_at, success, batch['requests'])
+
+        for callback in batch['callbacks']:
+            try:
+                callback(batch_id, success)
+            except Exception as e:
+                print(f"⚠️ 触发结果回调出错: {e}")
+
+
+class FailedTaskScheduler:
+    """失效任务调度：按紧迫程度排序处理，超出单次运行时间预算后未开始的任务顺延到下次运行
+
+    紧迫程度为各项得分之和：runweek 包含今天 +100；last_updated 越近越高（30天内最多+30）；
+    上次处理时已转存范围内的缺集数（每集+2，最多+40）；每被顺延一次 +50，避免分数低的任务一直轮不到。
+    顺延次数和缺集数记录在配置文件旁的 <配置文件名>_schedule.json 中，只保留仍然失效的任务
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}  # {任务键: {'deferred': 顺延次数, 'missing': 缺集数}}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def task_key(task):
+        return f"{task.get('taskname', '')}|{task.get('shareurl', '')}"
+
+    def load(self):
+        self.records = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                self.records = json_loads(f.read()).get('tasks', {})
+        except Exception as e:
+            print(f"⚠️ 调度记录读取失败，忽略: {e}")
+
+    def save(self, failed_tasks):
+        """写入调度记录，只保留 failed_tasks 中的任务（先写临时文件再替换）"""
+        keys = {self.task_key(task) for task in failed_tasks}
+        with self.lock:
+            self.records = {key: record for key, record in self.records.items() if key in keys and record}
+            data = {'tasks': self.records}
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(json_dumps(data))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ 调度记录保存失败: {e}")
+
+    def priority(self, task, now):
+        record = self.records.get(self.task_key(task), {})
+        score = record.get('deferred', 0) * 50 + min(record.get('missing', 0), 20) * 2
+
+        runweek = [int(day) for day in task.get('runweek') or [] if str(day).isdigit()]
+        if now.isoweekday() in runweek:
+            score += 100
+
+        try:
+            days = (now - datetime.fromisoformat(task['last_updated'])).total_seconds() / 86400
+            score += max(0.0, 30 - days)
+        except (KeyError, TypeError, ValueError):
+            pass
+        return score
+
+    def order(self, failed_tasks, now=None):
+        """按紧迫程度从高到低排列 [(任务标识, 任务), ...]（传入时为配置顺序），分数相同时保持配置顺序"""
+        now = now or datetime.now()
+        scored = [(self.priority(entry[1], now), order, entry) for order, entry in enumerate(failed_tasks)]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [entry for _, _, entry in scored]
+
+    def record_missing(self, task, missing):
+        with self.lock:
+            self.records.setdefault(self.task_key(task), {})['missing'] = missing
+
+    def record_processed(self, task):
+        with self.lock:
+            self.records.get(self.task_key(task), {}).pop('deferred', None)
+
+    def record_deferred(self, task):
+        with self.lock:
+            record = self.records.setdefault(self.task_key(task), {})
+            record['deferred'] = record.get('deferred', 0) + 1
+
 
 class FailedTaskIncrementalUpdater:
+    # 断点状态文件格式版本，格式变化时旧文件会被忽略
+    UPDATE_STATE_VERSION = 3
+
+    # 上游 get_share_detail 失败信息中表示分享本身失效（过期、取消、删除、违规、提取码错误）的关键字；
+    # 登录/token 校验、请求过于频繁等与分享无关的错误即使同时包含这些关键字也不算失效
+    DEAD_SHARE_MESSAGES = ('失效', '过期', '取消', '删除', '不存在', '违规', '提取码', 'expired', 'cancel', 'not exist')
+    NOT_DEAD_SHARE_MESSAGES = ('token', '登录', 'login', 'auth', 'cookie', '频繁', 'rate limit')
+
+    # 预排序时从文件夹名和分享标题中提取集数线索：「1-30集」「更新至40集」「全24集」「24集全」
+    EPISODE_RANGE_PATTERN = re.compile(r'(\d{1,4})\s*[-~～到至]\s*(\d{1,4})')
+    EPISODE_TOTAL_PATTERN = re.compile(r'(?:更新至|更至|全)\s*第?\s*(\d{1,4})\s*[集话]|(\d{1,4})\s*[集话]全')
+
+    # 各上游接口默认的 (连接超时, 读取超时) 秒数，可通过配置项 timeouts 覆盖
+    DEFAULT_TIMEOUTS = {
+        'task_suggestions': (5, 100),
+        'get_share_detail': (5, 10),
+        'get_savepath_detail': (5, 10),
+        'run_script_now': (5, 30),
+    }
+
     def __init__(self, config_path):
+        started = time.perf_counter()
         self.config_path = config_path
         self.config_data = {}
+        self.config_mtime = None
+        self.name_matcher = None
+
+        # 配置文件读写锁：进程内可重入，多个进程之间通过 <配置文件>.lock 互斥
+        self.config_lock_path = f"{config_path}.lock"
+        self.config_rlock = threading.RLock()
+        self.config_lock_depth = 0
+        self.config_lock_file = None
+
+        # 任务列表存储（配置项 task_storage 为 "sqlite" 时为 TaskStore，加载配置时创建）
+        self.task_store = None
+
+        # 复用HTTP连接（守护模式下长期保持连接池）
+        self.session = requests.Session()
         
         # 从配置文件读取webui配置并生成token
         self.load_config()
@@ -27,12 +1222,40 @@ class FailedTaskIncrementalUpdater:
         # 从环境变量获取base_url，如果没有设置则使用默认值
         self.base_url = os.getenv('QUARK_BASE_URL', 'http://127.0.0.1:5005')
         
+        # 同时处理的失效任务数量（1表示逐个处理）
+        self.max_workers = 1
+
+        # 上游接口熔断器和失效候选记录（阈值、有效期等来自配置文件，配置重新加载后更新）
+        self.breaker = CircuitBreaker()
+        self.negative_cache = NegativeShareCache(f"{os.path.splitext(config_path)[0]}_negative_cache.db")
+        self.failed_share_folders = set()
+        self.configure_upstream()
+
+        # 资源更新触发统一经过合并器（单次运行立即触发，守护模式和API按配置的窗口合并）；
+        # 触发记录与API共用配置文件旁的任务状态库，守护进程和API服务之间的触发也能合并
+        self.trigger_history = TaskStatusStore(f"{os.path.splitext(config_path)[0]}_api_tasks.db")
+        self.trigger_coordinator = TriggerCoordinator(self.trigger_resource_update, history=self.trigger_history)
+
+        # 失效任务调度记录（顺延次数、缺集数），单次运行时间预算来自配置项 run_budget
+        self.scheduler = FailedTaskScheduler(f"{os.path.splitext(config_path)[0]}_schedule.json")
+        self.deferred_tasks = set()
+
+        # 守护模式收到 SIGTERM 后置位：不再开始新的任务，当前任务处理完后退出
+        self.stop_event = threading.Event()
+
+        # 断点续跑状态文件（与配置文件同目录）
+        self.state_path = f"{os.path.splitext(config_path)[0]}_update_state.json"
+        self.update_state = {'version': self.UPDATE_STATE_VERSION, 'tasks': {}}
+        self.state_lock = threading.Lock()
+
         self.video_extensions = ['.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.ts', '.rmvb']
         
         print(f"🔧 初始化配置:")
         print(f"   配置文件: {config_path}")
         print(f"   API地址: {self.base_url}")
         print(f"   API Token: {self.api_token[:8]}... (前8位)")
+        print(f"   JSON后端: {JSON_BACKEND}")
+        print(f"   启动耗时: {(time.perf_counter() - started) * 1000:.1f}ms")
 
     def generate_api_token(self):
         """根据webui配置生成API token"""
@@ -56,12 +1279,43 @@ class FailedTaskIncrementalUpdater:
             # 返回一个默认的token（如果生成失败）
             return os.getenv('QUARK_API_TOKEN', '87e7eb745cb0d5d8')
 
+    @contextmanager
+    def config_lock(self):
+        """独占配置文件，读取-修改-保存期间其他线程和进程不会交叉写入"""
+        with self.config_rlock:
+            if self.config_lock_depth == 0 and fcntl is not None:
+                try:
+                    self.config_lock_file = open(self.config_lock_path, 'a')
+                    fcntl.flock(self.config_lock_file, fcntl.LOCK_EX)
+                except OSError as e:
+                    print(f"⚠️ 配置文件锁不可用，仅在进程内加锁: {e}")
+                    if self.config_lock_file is not None:
+                        self.config_lock_file.close()
+                    self.config_lock_file = None
+            self.config_lock_depth += 1
+            try:
+                yield
+            finally:
+                self.config_lock_depth -= 1
+                if self.config_lock_depth == 0 and self.config_lock_file is not None:
+                    fcntl.flock(self.config_lock_file, fcntl.LOCK_UN)
+                    self.config_lock_file.close()
+                    self.config_lock_file = None
+
     def load_config(self):
         """加载配置文件"""
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                self.config_data = json.load(f)
-            print(f"✅ 配置文件加载成功: {self.config_path}")
+            started = time.perf_counter()
+            with self.config_lock():
+                # 先取修改时间再读取，读取期间的外部修改会在下次检查时被发现
+                mtime = self.get_config_mtime()
+                with open(self.config_path, 'rb') as f:
+                    self.config_data = json_loads(f.read())
+                self.config_mtime = mtime
+                self.name_matcher = None
+                self.sync_task_store()
+            print(f"✅ 配置文件加载成功: {self.config_path} "
+                  f"({(time.perf_counter() - started) * 1000:.1f}ms, {JSON_BACKEND})")
             return True
         except Exception as e:
             print(f"❌ 配置文件加载失败: {e}")
@@ -70,25 +1324,251 @@ class FailedTaskIncrementalUpdater:
     def save_config(self):
         """保存配置文件"""
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.config_data, f, ensure_ascii=False, indent=2)
-            print(f"✅ 配置文件保存成功: {self.config_path}")
+            started = time.perf_counter()
+            with self.config_lock():
+                if self.task_store is not None:
+                    # 导出前先导入外部修改（quark-auto-save 的失效标记、WebUI中的编辑和其他配置项），避免被覆盖
+                    if self.config_changed() and not self.load_config():
+                        return False
+                config_data = self.config_data
+                if self.task_store is not None:
+                    # 复制后替换 tasklist 的值，键的顺序与配置文件原来一致
+                    config_data = dict(self.config_data)
+                    config_data['tasklist'] = self.task_store.tasklist()
+                data = json_dumps(config_data, indent=True)
+                with open(self.config_path, 'wb') as f:
+                    f.write(data)
+                # 记录自身写入后的修改时间，避免守护模式把自己的保存当作外部变更
+                self.config_mtime = self.get_config_mtime()
+                if self.task_store is not None:
+                    self.task_store.mark_exported(self.config_mtime)
+            print(f"✅ 配置文件保存成功: {self.config_path} "
+                  f"({(time.perf_counter() - started) * 1000:.1f}ms, {JSON_BACKEND})")
             return True
         except Exception as e:
             print(f"❌ 配置保存失败: {e}")
             return False
 
+    def sync_task_store(self):
+        """按配置项 task_storage 启用SQLite任务存储（默认 "json" 为直接使用配置文件中的 tasklist）；
+        启用时配置文件自上次导入/导出后被修改过则导入其中的 tasklist；内存中只保留 tasklist 键（值为None）占位，
+        导出时按原来的键顺序写回"""
+        if self.get_setting('task_storage', 'json') != 'sqlite':
+            self.task_store = None
+            return
+        if self.task_store is None:
+            self.task_store = TaskStore(f"{os.path.splitext(self.config_path)[0]}_tasks.db")
+        tasklist = self.config_data.get('tasklist') or []
+        self.config_data['tasklist'] = None
+        if self.task_store.source_mtime() != str(self.config_mtime):
+            count = self.task_store.import_tasklist(tasklist, self.config_mtime)
+            print(f"📥 已将配置文件中的任务列表导入SQLite任务存储: {count} 个任务")
+
+    def list_tasks(self):
+        """全部任务（配置顺序）"""
+        if self.task_store is not None:
+            return self.task_store.tasklist()
+        return self.config_data.get('tasklist', [])
+
+    def count_tasks(self):
+        if self.task_store is not None:
+            return self.task_store.count()
+        return len(self.config_data.get('tasklist', []))
+
+    def list_failed_tasks(self):
+        """带失效标记的任务 [(任务标识, 任务), ...]（配置顺序）；标识为JSON存储中的位置或SQLite存储中的任务ID"""
+        if self.task_store is not None:
+            return self.task_store.failed()
+        return [(i, task) for i, task in enumerate(self.config_data.get('tasklist', [])) if task.get('shareurl_ban')]
+
+    def task_exists(self, taskname):
+        """是否已有同名任务"""
+        if self.task_store is not None:
+            return self.task_store.exists(taskname)
+        return any(task.get('taskname') == taskname for task in self.config_data.get('tasklist', []))
+
+    def add_tasks(self, tasks):
+        """追加新任务并保存，返回是否成功；SQLite存储只写入新行，配置文件在触发资源更新前导出"""
+        with self.config_lock():
+            if self.task_store is not None:
+                try:
+                    self.task_store.add(tasks)
+                    return True
+                except sqlite3.Error as e:
+                    print(f"❌ 任务保存失败: {e}")
+                    return False
+
+            tasklist = self.config_data.setdefault('tasklist', [])
+            tasklist.extend(tasks)
+            if self.save_config():
+                return True
+            for task in tasks:
+                tasklist.remove(task)
+            return False
+
+    def store_task(self, task_key, task):
+        """记录对单个任务的修改：SQLite存储只更新该行；JSON存储中任务已在内存中修改，随 save_config 保存"""
+        if self.task_store is not None:
+            with self.config_lock():
+                self.task_store.update(task_key, task)
+
+    def export_tasks(self):
+        """SQLite存储中有尚未写入配置文件的修改时导出，quark-auto-save 运行前需要读到最新的任务列表"""
+        if self.task_store is None:
+            return True
+        with self.config_lock():
+            # 先导入配置文件的外部修改，再判断是否还有待导出的修改
+            if not self.reload_config_if_changed():
+                return False
+            if self.task_store is None or not self.task_store.has_pending():
+                return True
+            return self.save_config()
+
+    def reload_config_if_changed(self):
+        """仅在配置文件自上次加载/保存后被修改时重新加载"""
+        with self.config_lock():
+            if self.config_mtime is not None and not self.config_changed():
+                return True
+            return self.load_config()
+
+    def get_config_mtime(self):
+        """获取配置文件的修改时间"""
+        try:
+            return os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def config_changed(self):
+        """检查配置文件自上次加载/保存后是否被修改"""
+        return self.get_config_mtime() != self.config_mtime
+
+    def get_setting(self, key, default=None):
+        """读取本脚本的配置项（配置文件中的 failed_task_update 段）"""
+        return self.config_data.get('failed_task_update', {}).get(key, default)
+
+    def load_update_state(self):
+        """加载上次中断运行留下的断点状态"""
+        self.update_state = {'version': self.UPDATE_STATE_VERSION, 'tasks': {}}
+        if not os.path.exists(self.state_path):
+            return False
+        try:
+            with open(self.state_path, 'rb') as f:
+                state = json_loads(f.read())
+            if state.get('version') != self.UPDATE_STATE_VERSION:
+                print(f"⚠️ 断点状态文件版本不匹配，忽略: {self.state_path}")
+                return False
+            self.update_state = state
+            self.update_state.setdefault('tasks', {})
+            print(f"♻️ 发现断点状态文件，将从上次中断处继续: {self.state_path}")
+            return True
+        except Exception as e:
+            print(f"⚠️ 断点状态文件读取失败，忽略: {e}")
+            self.update_state = {'version': self.UPDATE_STATE_VERSION, 'tasks': {}}
+            return False
+
+    def save_update_state(self):
+        """写入断点状态（先写临时文件再替换，避免中断时写坏）"""
+        tmp_path = f"{self.state_path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(json_dumps(self.update_state))
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            print(f"⚠️ 断点状态保存失败: {e}")
+
+    @staticmethod
+    def serialize_analysis(analysis):
+        """将分析结果转为紧凑的JSON结构：剧集按文件夹存为数组，不重复保存路径"""
+        data = {k: v for k, v in analysis.items()
+                if k not in ('all_episodes', 'folder_episodes', 'episode_set')}
+        data['folder_episodes'] = [
+            {
+                'key': folder_key,
+                'folder_path': folder_info['folder_path'],
+                'share_url': folder_info['share_url'],
+                'episodes': [[ep.fid, ep.file_name, ep.episode, ep.pdir_fid, ep.size]
+                             for ep in folder_info['episodes']]
+            }
+            for folder_key, folder_info in analysis.get('folder_episodes', {}).items()
+        ]
+        return data
+
+    @staticmethod
+    def deserialize_analysis(data):
+        """由 serialize_analysis 的结果还原分析结果"""
+        analysis = {k: v for k, v in data.items() if k != 'folder_episodes'}
+        if not analysis.get('is_valid'):
+            return analysis
+
+        analysis['all_episodes'] = []
+        analysis['folder_episodes'] = {}
+        for folder_data in data.get('folder_episodes', []):
+            folder = FolderNode.from_path(folder_data['folder_path'])
+            episodes = [EpisodeFile(fid, file_name, episode, pdir_fid, size, folder)
+                        for fid, file_name, episode, pdir_fid, size in folder_data['episodes']]
+            episode_numbers = sorted(ep.episode for ep in episodes)
+            analysis['all_episodes'].extend(episodes)
+            analysis['folder_episodes'][folder_data['key']] = {
+                'episodes': episodes,
+                'episode_numbers': episode_numbers,
+                'min_episode': episode_numbers[0],
+                'max_episode': episode_numbers[-1],
+                'folder_path': folder_data['folder_path'],
+                'share_url': folder_data['share_url']
+            }
+        if analysis['all_episodes']:
+            analysis['episode_set'] = EpisodeSet(ep.episode for ep in analysis['all_episodes'])
+        return analysis
+
+    def clear_update_state(self):
+        """本轮运行正常结束后删除断点状态"""
+        self.update_state = {'version': self.UPDATE_STATE_VERSION, 'tasks': {}}
+        try:
+            os.remove(self.state_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️ 断点状态文件删除失败: {e}")
+
+    def get_task_state(self, task):
+        """获取任务的断点记录（以任务名+失效链接区分）"""
+        key = f"{task.get('taskname', '')}|{task.get('shareurl', '')}"
+        with self.state_lock:
+            return self.update_state['tasks'].setdefault(key, {'analyses': {}})
+
+    def checkpoint_task_state(self, task_state, **changes):
+        """更新任务断点记录并立即落盘"""
+        with self.state_lock:
+            task_state.update(changes)
+            self.save_update_state()
+
+    def checkpoint_analysis(self, task_state, share_url, analysis):
+        """记录候选资源分析结果（以分享规范键为键）；complete 表示完整遍历了整个分享，
+        提前停止（stop_on_match）、到截止时间或部分子文件夹获取失败的结果为False，续跑时重新分析"""
+        data = self.serialize_analysis(analysis)
+        data['complete'] = not (analysis.get('stopped_early') or analysis.get('partial')
+                                or analysis.get('incomplete'))
+        with self.state_lock:
+            task_state['analyses'][ShareRef.key_of(share_url)] = data
+            self.save_update_state()
+
+    @staticmethod
+    def resumable_analysis(task_state, share_url):
+        """断点中该候选完整的分析结果，没有或不完整时返回None"""
+        data = task_state['analyses'].get(ShareRef.key_of(share_url))
+        return data if data and data.get('complete') else None
+
     def trigger_resource_update(self):
         """触发资源更新脚本"""
+        self.export_tasks()
         try:
-            url = f"{self.base_url}/run_script_now?token={self.api_token}"
             params = {"token": self.api_token}
             headers = {
                 "Content-Type": "application/json"
             }
 
             print("🔄 触发资源更新脚本...")
-            response = requests.post(url, json={}, headers=headers, params=params, timeout=30)
+            response = self.upstream_request('post', 'run_script_now', json={}, headers=headers, params=params)
 
             if response.status_code == 200:
                 result = response.json()
@@ -109,18 +1589,17 @@ class FailedTaskIncrementalUpdater:
             print(f"❌ 触发资源更新脚本时出错: {e}")
             return False
 
-    def get_new_resources(self, taskname):
-        """从接口获取新的资源地址"""
+    def get_new_resources(self, taskname, job=None):
+        """从接口获取新的资源地址，job 见 upstream_request"""
         try:
             #encoded_taskname = urllib.parse.quote(taskname)
-            url = f"{self.base_url}/task_suggestions"
             params = {
                 "q": taskname,
                 "d": 1,
                 "token": self.api_token
             }
 
-            response = requests.get(url, params=params, timeout=100)
+            response = self.upstream_request('get', 'task_suggestions', job=job, params=params)
             if response.status_code == 200:
                 data = response.json()
                 print(f"完整请求URL: {response.url}")
@@ -138,59 +1617,149 @@ class FailedTaskIncrementalUpdater:
             return None
 
     def get_saved_resources(self, savepath):
-        """通过API获取已转存的资源列表"""
+        """通过API获取已转存的资源列表，返回逐个产出文件条目的迭代器，请求失败时返回None
+
+        响应以流的方式读取并增量解析（读取超时按每次读取计算），保存目录中文件很多时
+        不需要把完整响应读入内存；迭代途中响应中断或格式异常时抛出异常
+        """
         try:
             # URL编码保存路径
             # encoded_path = urllib.parse.quote(savepath)
-            url = f"{self.base_url}/get_savepath_detail"
             params = {
                 "path": savepath,
                 "token": self.api_token
             }
 
-            response = requests.get(url, params=params, timeout=10)
+            response = self.upstream_request('get', 'get_savepath_detail', params=params, stream=True)
             if response.status_code == 200:
-                data = response.json()
-                if data.get('success') and data.get('data'):
-                    return data['data']['list']
-                else:
-                    print(f"❌ 已转存资源接口返回数据格式异常: {data}")
-                    return None
-            else:
-                print(f"❌ 已转存资源接口请求失败，状态码: {response.status_code}")
-                return None
+                return self.iter_saved_files(response)
+            response.close()
+            print(f"❌ 已转存资源接口请求失败，状态码: {response.status_code}")
+            return None
         except Exception as e:
             print(f"❌ 获取已转存资源时出错: {e}")
             return None
 
-    def is_taskname_match(self, candidate_taskname, original_taskname):
-        """判断候选任务名是否与原始任务名匹配"""
-
-        def clean_name(name):
-            name = re.sub(r'[【】\[\]\(\)（）]', '', name)
-            name = re.sub(r'\s+', '', name)
-            return name.lower()
-
-        clean_candidate = clean_name(candidate_taskname)
-        clean_original = clean_name(original_taskname)
-
-        # 检查候选任务名是否包含原始任务名
-        if clean_original in clean_candidate:
-            return True
+    @staticmethod
+    def iter_saved_files(response):
+        """逐个产出已转存资源接口响应中 data.list 的文件条目，迭代结束或中断时关闭连接"""
+        with closing(response):
+            yield from iter_json_array(response.iter_content(chunk_size=64 * 1024), 'list')
+
+    def configure_upstream(self):
+        """按配置更新熔断器：breaker_threshold 连续失败次数（默认5，0为不熔断），breaker_cooldown 探测间隔秒数（默认60）；
+        以及失效候选记录的有效期 negative_cache_ttl（秒，默认86400，0为关闭）
+        """
+        self.breaker.threshold = self.get_setting('breaker_threshold', 5)
+        self.breaker.cooldown = self.get_setting('breaker_cooldown', 60)
+        self.negative_cache.ttl = self.get_setting('negative_cache_ttl', 86400)
+
+    def dedupe_candidates(self, resources):
+        """同一分享的同一文件夹（按 ShareRef.key，忽略查询参数）只保留排序最靠前的一个候选；
+        指向同一分享不同子文件夹的链接分别保留（遍历只进入前几个子文件夹，深层的子文件夹可能看不到）；
+        保留的链接没有提取码而重复的链接有时，换用带提取码的那个
+        """
+        positions = {}
+        unique = []
+        for resource in resources:
+            ref = ShareRef.parse(resource.get('shareurl'))
+            identity = ref.key if ref else resource.get('shareurl')
+            if identity not in positions:
+                positions[identity] = len(unique)
+                unique.append(resource)
+                continue
+            kept = ShareRef.parse(unique[positions[identity]].get('shareurl'))
+            if ref and ref.pwd and kept and not kept.pwd:
+                unique[positions[identity]] = resource
+
+        if len(unique) < len(resources):
+            print(f"   🔗 合并同一分享的不同链接写法: 去掉 {len(resources) - len(unique)} 个重复候选")
+        return unique
+
+    def skip_negative_candidates(self, resources):
+        """去掉有效期内已确认失效或没有可解析剧集的候选，不再为它们发出任何请求"""
+        keys = {ShareRef.key_of(r.get('shareurl')) for r in resources if r.get('shareurl')}
+        known = self.negative_cache.filter_known(keys)
+        if not known:
+            return resources
+
+        reasons = {'dead': '已失效', 'empty': '无可解析剧集'}
+        for key, reason in known.items():
+            print(f"   🚫 跳过近期{reasons.get(reason, reason)}的候选: {key}")
+        return [r for r in resources if ShareRef.key_of(r.get('shareurl')) not in known]
+
+    def select_candidates(self, resources, taskname):
+        """过滤匹配任务名的候选并按相似度排序，合并同一分享的重复链接，跳过近期已确认失效或无剧集的候选"""
+        return self.skip_negative_candidates(self.dedupe_candidates(self.rank_matched_resources(resources, taskname)))
+
+    def record_negative_analysis(self, share_url, analysis, job=None):
+        """完整遍历后仍没有任何剧集的候选记入失效候选记录（部分遍历、取消或超时的结果不记录）；
+        找到剧集的候选删除其「无可解析剧集」记录（其他进程可能刚记录过）"""
+        if not analysis['is_valid']:
+            return
+        if analysis['all_episodes']:
+            self.negative_cache.discard(ShareRef.key_of(share_url), 'empty')
+            return
+        if (analysis.get('partial') or analysis.get('incomplete') or analysis.get('truncated')
+                or (job is not None and job.stopped())):
+            return
+        print(f"   🚫 该候选没有可解析的剧集，{self.negative_cache.ttl}秒内不再分析")
+        self.negative_cache.add(ShareRef.key_of(share_url), 'empty')
+
+    def get_timeout(self, endpoint):
+        """上游接口的超时设置：配置项 timeouts 中可为每个接口指定秒数或 [连接超时, 读取超时]"""
+        timeout = self.get_setting('timeouts', {}).get(endpoint, self.DEFAULT_TIMEOUTS.get(endpoint, (5, 30)))
+        return tuple(timeout) if isinstance(timeout, (list, tuple)) else timeout
+
+    def upstream_request(self, method, endpoint, job=None, **kwargs):
+        """请求上游接口：经过熔断器，使用该接口的超时设置
+
+        熔断中时抛出 UpstreamUnavailable；连接错误、超时和5xx响应计为失败，其余响应计为成功
+        job: 可选的 JobContext，超时不超过任务剩余时间，已取消或已到截止时间时抛出 JobStopped；
+        因任务剩余时间不足而超时的请求不计为上游失败，也不占用熔断器的探测名额
+        """
+        if job is not None and job.stopped():
+            raise JobStopped("任务已取消" if job.cancelled() else "任务已到截止时间")
+        if not self.breaker.allow():
+            raise UpstreamUnavailable(f"上游服务熔断中，{self.breaker.retry_after():.0f}秒后重试")
+
+        timeout = self.get_timeout(endpoint)
+        limited = job.limit_timeout(timeout) if job is not None else timeout
+        try:
+            response = self.session.request(method, f"{self.base_url}/{endpoint}", timeout=limited, **kwargs)
+        except requests.exceptions.Timeout:
+            if limited == timeout:
+                self.breaker.record_failure()
+            else:
+                self.breaker.release_probe()
+            raise
+        except requests.exceptions.RequestException:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
 
-        # 检查是否是同一内容的不同表述
-        common_patterns = [
-            (r'绝世唐门', r'绝世唐门'),
-            (r'斗罗大陆2', r'斗罗大陆2'),
-            (r'斗罗大陆Ⅱ', r'斗罗大陆2'),
-            (r'第(\d+)季', r'第\1季'),
-        ]
+    def get_name_matcher(self):
+        """获取任务名匹配器（别名表和阈值来自配置文件，配置重新加载后重建）"""
+        if self.name_matcher is None:
+            self.name_matcher = TasknameMatcher(self.get_setting('aliases', {}),
+                                                self.get_setting('match_threshold', 0.75))
+        return self.name_matcher
 
-        for pattern_orig, pattern_cand in common_patterns:
-            if re.search(pattern_orig, clean_original) and re.search(pattern_cand, clean_candidate):
-                return True
+    def is_taskname_match(self, candidate_taskname, original_taskname):
+        """判断候选任务名是否与原始任务名匹配"""
+        return self.get_name_matcher().is_match(candidate_taskname, original_taskname)
 
-        return False
+    def rank_matched_resources(self, resources, taskname):
+        """过滤出任务名匹配的候选资源，并按名称相似度从高到低排序"""
+        return self.get_name_matcher().rank(resources, taskname)
 
     def is_video_file(self, filename):
         """检查是否是视频文件"""
@@ -242,91 +1811,165 @@ class FailedTaskIncrementalUpdater:
 
         return None
 
-    def get_share_detail(self, share_url):
-        """获取分享链接详情 - 基于test1.py优化"""
-        url = f"{self.base_url}/get_share_detail"
+    def get_share_detail(self, share_url, share_cache=None, job=None):
+        """获取分享链接详情 - 基于test1.py优化
+
+        share_cache: 可选的 ShareCache（或普通字典），以 ShareRef 规范键缓存，同一分享的不同写法只请求一次；
+        请求前经过其限速器，正在预取的链接等待预取结果；获取失败时缓存为None，之后直接返回None
+        job: 可选的 JobContext，已取消或已到截止时间时只返回缓存中的结果，不再发出请求
+        """
+        key = ShareRef.key_of(share_url)
+        if share_cache is not None:
+            if isinstance(share_cache, ShareCache):
+                share_cache.wait(key)
+            if key in share_cache:
+                return share_cache[key]
+        if job is not None and job.stopped():
+            return None
+        if isinstance(share_cache, ShareCache):
+            share_cache.limiter.wait()
+
         params = {"token": self.api_token}
         payload = {"shareurl": share_url}
 
         try:
-            response = requests.post(url, params=params, json=payload, timeout=10)
+            response = self.upstream_request('post', 'get_share_detail', job=job, params=params, json=payload)
             response.raise_for_status()
             result = response.json()
 
             if result.get("success"):
+                self.negative_cache.discard(key, 'dead')
+                if share_cache is not None:
+                    share_cache[key] = result["data"]
                 return result["data"]
             else:
                 print(f"获取分享详情失败: {result}")
+                self.record_dead_share(share_url, result)
+                if share_cache is not None:
+                    share_cache[key] = None
                 return None
 
+        except (UpstreamUnavailable, JobStopped) as e:
+            # 请求未发出，不缓存失败结果
+            print(f"请求失败: {e}")
+            return None
         except Exception as e:
             print(f"请求失败: {e}")
+            if share_cache is not None:
+                share_cache[key] = None
             return None
 
+    def is_dead_share_result(self, result):
+        """上游返回的失败结果是否明确表示分享失效（见 DEAD_SHARE_MESSAGES）"""
+        data = result.get('data')
+        messages = [result.get('message'), result.get('msg')]
+        if isinstance(data, dict):
+            messages += [data.get('error'), data.get('message')]
+        text = ' '.join(str(m) for m in messages if m).lower()
+        if any(word in text for word in self.NOT_DEAD_SHARE_MESSAGES):
+            return False
+        return any(word in text for word in self.DEAD_SHARE_MESSAGES)
+
+    def record_dead_share(self, share_url, result):
+        """上游明确返回分享失效的链接按规范键记入失效候选记录（网络错误、熔断、登录失效等不记录）
+
+        分享中的文件夹第一次失败时只记下，同一文件夹再次失败才记录，避免根目录可用时因一次偶发错误跳过整个候选
+        """
+        if not self.is_dead_share_result(result):
+            return
+        key = ShareRef.key_of(share_url)
+        ref = ShareRef.parse(share_url)
+        if ref is not None and ref.fid:
+            with self.state_lock:
+                first_failure = key not in self.failed_share_folders
+                self.failed_share_folders.add(key)
+            if first_failure:
+                return
+        self.negative_cache.add(key, 'dead')
+
     def build_share_url(self, base_share_url, fid_path=None):
-        """构建包含路径的分享URL - 基于test1.py优化"""
-        if fid_path is None:
+        """构建包含路径的分享URL：同一分享中 fid_path 最后一级文件夹的规范链接"""
+        if not fid_path:
             return base_share_url
+        return self.build_subfolder_share_url(base_share_url, fid_path[-1])
+
+    def analyze_resource_structure_optimized(self, share_url, taskname, on_folder=None, stop_when=None,
+                                             share_cache=None, job=None):
+        """优化版资源结构分析 - 基于test1.py的完整文件夹遍历
+
+        on_folder(analysis, folder_info): 每解析完一个包含剧集的文件夹后回调（用于显示实时进度）
+        stop_when(analysis, folder_info): 返回True时停止继续遍历，使用已解析的部分结果（结果中 stopped_early 为True）
+        share_cache, job: 共享的分享详情缓存和任务截止时间/取消状态，见 get_share_detail；
+        到截止时间后只继续解析已缓存的目录，结果中 partial 为True；任务取消后立即停止遍历
+        """
+        analysis = {'url': share_url, 'is_valid': False}
+        own_cache = share_cache is None
+        if own_cache:
+            share_cache = self.new_share_cache()
 
-        # # 从基础分享URL中提取分享ID
-        # if base_share_url.startswith("https://pan.quark.cn/s/"):
-        #     share_id = base_share_url.split("/")[-1]
-        # else:
-        #     # 如果已经是带路径的URL，提取基础部分
-        #     if "#" in base_share_url:
-        #         base_part = base_share_url.split("#")[0]
-        #         share_id = base_part.split("/")[-1]
-        #         print(base_part)
-        #     else:
-        #         share_id = base_share_url.split("/")[-1]
-        if "#" in base_share_url:
-            base_part = base_share_url.split("#")[0]
-            #share_id = base_part.split("/")[-1]
-            
-        else:
-            #share_id = base_share_url.split("/")[-1]
-            base_part = base_share_url.split("/")[:-1]
-        # 构建带路径的URL
-        # path_part = "/".join(fid_path)
-        print(base_part)
-        path_part = fid_path[-1]
-        return f"{base_part}#/list/share/{path_part}"
-
-    def analyze_resource_structure_optimized(self, share_url, taskname):
-        """优化版资源结构分析 - 基于test1.py的完整文件夹遍历"""
+        try:
+            with closing(self.iter_resource_structure(share_url, taskname, analysis, share_cache,
+                                                      job)) as folder_batches:
+                for folder_info in folder_batches:
+                    if on_folder:
+                        on_folder(analysis, folder_info)
+                    if stop_when and stop_when(analysis, folder_info):
+                        print(f"   ⏹️ 已找到满足条件的文件夹，停止继续遍历")
+                        analysis['stopped_early'] = True
+                        break
+        finally:
+            if own_cache:
+                share_cache.close()
+
+        analysis = self.finalize_resource_analysis(analysis)
+        self.record_negative_analysis(share_url, analysis, job)
+        return analysis
+
+    def iter_resource_structure(self, share_url, taskname, analysis, share_cache=None, job=None):
+        """流式分析资源结构：每获取并解析完一个文件夹，就产出该文件夹的剧集信息
+
+        analysis 会被就地填充，调用方可随时停止迭代并使用已解析的部分结果
+        """
         print(f"   🔍 开始深度分析资源结构: {share_url}")
 
         # 获取分享详情
-        share_data = self.get_share_detail(share_url)
+        share_data = self.get_share_detail(share_url, share_cache, job)
+        root = self.start_resource_analysis(analysis, share_data)
+        if root is None:
+            return
+
+        # 以规范链接（保留提取码）作为各文件夹的分享链接
+        print(f"   🔄 开始递归遍历文件夹结构...")
+        yield from self.recursive_analyze_folders(ShareRef.canonical_url(share_url), *root, taskname, analysis, 0,
+                                                  share_cache, job)
+
+    def start_resource_analysis(self, analysis, share_data):
+        """用分享详情初始化分析结果，返回 (根目录节点, 根目录文件列表)；详情获取失败时返回None"""
         if not share_data:
-            return {
-                'url': share_url,
-                'is_valid': False,
-                'error': '获取分享详情失败'
-            }
+            analysis['error'] = '获取分享详情失败'
+            return None
 
         share_info = share_data.get("share", {})
         print(f"   📋 分享标题: {share_info.get('title', '未知')}")
         print(f"   📁 文件数量: {share_info.get('all_file_num', share_info.get('file_num', 0))}")
 
-        analysis = {
-            'url': share_url,
+        full_path = share_data.get("full_path", [])
+        analysis.update({
             'is_valid': True,
             'folders': [],
-            'files': [],
             'all_episodes': [],
             'folder_episodes': {},  # 记录每个文件夹的剧集
             'share_info': share_info,
-            'full_path': share_data.get('full_path', []),
-            'file_list': share_data.get('list', [])
-        }
+            'full_path': full_path
+        })
 
-        # 开始递归遍历
-        current_items = share_data.get("list", [])
-        full_path = share_data.get("full_path", [])
+        # 原始文件列表只用于遍历，不保存在分析结果中（详情可能来自共享缓存，不能就地修改）
+        return FolderNode.from_path(full_path), share_data.get("list", [])
 
-        print(f"   🔄 开始递归遍历文件夹结构...")
-        self.recursive_analyze_folders(share_url, full_path, current_items, taskname, analysis, 0)
+    def finalize_resource_analysis(self, analysis):
+        """统计分析结果的剧集范围"""
+        if not analysis['is_valid']:
+            return analysis
 
         # 统计结果
         episode_count = len(analysis['all_episodes'])
@@ -334,15 +1977,19 @@ class FailedTaskIncrementalUpdater:
 
         if episode_count > 0:
             # 计算最大最小集数
-            episodes = [ep['episode'] for ep in analysis['all_episodes']]
-            analysis['min_episode'] = min(episodes)
-            analysis['max_episode'] = max(episodes)
+            episode_set = EpisodeSet(ep.episode for ep in analysis['all_episodes'])
+            analysis['episode_set'] = episode_set
+            analysis['min_episode'] = episode_set.min_episode
+            analysis['max_episode'] = episode_set.max_episode
             print(f"   📊 剧集范围: 第{analysis['min_episode']}集 - 第{analysis['max_episode']}集")
 
         return analysis
 
-    def recursive_analyze_folders(self, base_share_url, current_path, items, taskname, analysis, depth):
-        """递归分析文件夹结构 - 基于test1.py优化"""
+    def parse_folder_items(self, base_share_url, folder, items, taskname, analysis, depth):
+        """解析一个文件夹的文件列表（不发请求）
+
+        剧集记入 analysis，返回 (该文件夹的剧集信息或None, 待遍历的 [(子文件夹节点, 子文件夹分享URL), ...])
+        """
         indent = "  " * depth
 
         # 分离文件和文件夹
@@ -361,156 +2008,332 @@ class FailedTaskIncrementalUpdater:
                 episode = self.extract_episode_number_enhanced(filename, taskname)
 
                 if episode is not None:
-                    file_data = {
-                        'fid': file_item.get('fid'),
-                        'file_name': filename,
-                        'episode': episode,
-                        'pdir_fid': file_item.get('pdir_fid'),
-                        'size': file_item.get('size', 0),
-                        'is_folder': False,
-                        'folder_path': [item.get('file_name') for item in current_path],
-                        'folder_fids': [item.get('fid') for item in current_path]
-                    }
-
-                    analysis['files'].append(file_data)
+                    file_data = EpisodeFile(file_item.get('fid'), filename, episode, file_item.get('pdir_fid'),
+                                            file_item.get('size', 0), folder)
+
                     analysis['all_episodes'].append(file_data)
                     current_folder_episodes.append(file_data)
 
                     print(f"{indent}     ├─ {filename} - 第{episode}集")
 
         # 记录当前文件夹的剧集信息
+        folder_info = None
         if current_folder_episodes:
-            folder_key = "/".join([item.get('file_name', '') for item in current_path]) or "根目录"
-            analysis['folder_episodes'][folder_key] = {
+            folder_path = folder.path_items()
+            folder_key = "/".join([item['file_name'] for item in folder_path]) or "根目录"
+            # 预先排序的集数列表，评分时直接二分查找
+            episode_numbers = sorted(ep.episode for ep in current_folder_episodes)
+            folder_info = analysis['folder_episodes'][folder_key] = {
                 'episodes': current_folder_episodes,
-                'min_episode': min(ep['episode'] for ep in current_folder_episodes),
-                'max_episode': max(ep['episode'] for ep in current_folder_episodes),
-                'folder_path': current_path,
+                'episode_numbers': episode_numbers,
+                'min_episode': episode_numbers[0],
+                'max_episode': episode_numbers[-1],
+                'folder_path': folder_path,
                 'share_url': base_share_url
             }
 
-        # 递归处理子文件夹
+        subfolders = []
         if directories:
             print(f"{indent}   📁 发现 {len(directories)} 个子文件夹，继续分析...")
 
+            if len(directories) > 3:
+                analysis['truncated'] = True  # 未完整遍历，没有剧集时也不记入失效候选记录
             for dir_item in directories[:3]:  # 限制分析前3个子文件夹以避免过度请求
-                dir_name = dir_item.get("file_name", "未知")
-                dir_fid = dir_item.get("fid", "")
-
-                print(f"{indent}     └─ 分析文件夹: {dir_name}")
-
-                # 构建新的路径
-                new_path = current_path + [dir_item]
-                fid_path = [item.get("fid") for item in new_path]
-                #print(new_path)
-                #print(fid_path)
-                # 构建新的分享URL
-                #new_share_url = self.build_share_url(base_share_url, fid_path)
-                # print(new_share_url)
-                    # 检查是否是第一种情况（没有#/list/share/部分）
-                if "#/list/share/" not in base_share_url:
-                    # 如果是基本链接，直接添加#/list/share/{fid}
-                    if base_share_url.startswith(base_share_url):
-                        new_share_url=f"{base_share_url}#/list/share/{fid_path[-1]}"
-                    else:
-                        # 如果不是标准链接，可能需要更复杂的处理
-                        # 这里保持原样，但你可以根据实际情况调整
-                        new_share_url=url
-                elif "#/list/share/" in base_share_url:
-                
-                    # 第二种情况：已经有#/list/share/部分
-                    # 分割链接，获取#之前的部分
-                    parts = base_share_url.split("#/list/share/")
-                    if len(parts) >= 2:
-                        # 保留#之前的部分，替换fid
-                        new_share_url=f"{parts[0]}#/list/share/{fid_path[-1]}"
-
-
-
-                # new_share_url = f"{base_share_url}#/list/share/{fid_path[-1]}"
-                print(base_share_url)
-                # 获取子目录内容
-                sub_dir_data = self.get_share_detail(new_share_url)
-                if sub_dir_data:
-                    sub_items = sub_dir_data.get("list", [])
-                    self.recursive_analyze_folders(new_share_url, new_path, sub_items, taskname, analysis, depth + 1)
-                else:
-                    print(f"{indent}       ❌ 获取子目录失败")
+                sub_folder = folder.child(dir_item)
+                subfolders.append((sub_folder, self.build_subfolder_share_url(base_share_url, sub_folder.fid)))
+
+        return folder_info, subfolders
+
+    @staticmethod
+    def build_subfolder_share_url(base_share_url, fid):
+        """子文件夹的分享URL：同一分享（保留提取码）中该文件夹的规范链接"""
+        ref = ShareRef.parse(base_share_url)
+        if ref is None:
+            return f"{base_share_url.split('#')[0]}#/list/share/{fid}"
+        return ref.child(fid).url
+
+    def recursive_analyze_folders(self, base_share_url, folder, items, taskname, analysis, depth, share_cache=None,
+                                  job=None):
+        """递归分析文件夹结构 - 基于test1.py优化，每解析完一个包含剧集的文件夹就产出其信息"""
+        indent = "  " * depth
+
+        folder_info, subfolders = self.parse_folder_items(base_share_url, folder, items, taskname, analysis, depth)
+        if folder_info:
+            yield folder_info
+
+        # 递归处理子文件夹
+        for sub_folder, new_share_url in subfolders:
+            if job is not None and job.cancelled():
+                return
+
+            print(f"{indent}     └─ 分析文件夹: {sub_folder.name or '未知'}")
+
+            # 到截止时间后只解析已缓存（如已预取）的子目录
+            if job is not None and job.expired() and (share_cache is None
+                                                      or ShareRef.key_of(new_share_url) not in share_cache):
+                print(f"{indent}       ⏱️ 已到截止时间，跳过该文件夹")
+                analysis['partial'] = True
+                continue
 
-                # 避免请求过快
-                time.sleep(1)
+            # 获取子目录内容（请求间隔由 share_cache 的限速器控制）
+            sub_dir_data = self.get_share_detail(new_share_url, share_cache, job)
+            if sub_dir_data:
+                sub_items = sub_dir_data.get("list", [])
+                yield from self.recursive_analyze_folders(new_share_url, sub_folder, sub_items, taskname,
+                                                          analysis, depth + 1, share_cache, job)
+            else:
+                print(f"{indent}       ❌ 获取子目录失败")
+                analysis['incomplete'] = True
 
     def get_saved_episodes(self, task):
         """通过API获取已保存的剧集信息"""
+        saved_episodes = EpisodeSet()
         try:
             savepath = task.get('savepath', '')
             if not savepath:
-                return []
+                return saved_episodes
 
-            # 通过API获取已转存资源列表
+            # 通过API获取已转存资源列表，边读取边提取集数，不保留文件条目
             saved_files = self.get_saved_resources(savepath)
-            if not saved_files:
-                return []
+            if saved_files is None:
+                return saved_episodes
 
-            saved_episodes = []
-            # print(saved_files)
             for file_info in saved_files:
                 episode = self.extract_episode_number_enhanced(file_info.get('file_name', ''), task['taskname'])
                 if episode is not None:
-                    saved_episodes.append(episode)
-                #saved_episodes.append(file_info)
+                    saved_episodes.add(episode)
 
-            return sorted(saved_episodes)
+            return saved_episodes
         except Exception as e:
+            # 列表未读完时已提取的集数不完整，按没有已保存剧集处理
             print(f"获取已保存剧集出错: {e}")
-            return []
+            return EpisodeSet()
 
-    def find_continuation_point(self, candidate_episodes, saved_episodes):
-        """找到剧集连续性的断点"""
-        if not saved_episodes:
-            return 1  # 如果没有保存的剧集，从第1集开始
+    def score_root_listing(self, share_data, taskname, target_episode):
+        """根据分享根目录列表估计候选资源包含目标集的可能性，返回 (等级, 最大集数线索)
 
-        max_saved = max(saved_episodes)
+        等级 3: 根目录直接包含目标集；2: 有子文件夹，且文件夹名/分享标题/根目录剧集表明集数已达到目标集；
+        1: 有子文件夹但无法判断，或没有子文件夹但根目录有目标集之后的剧集（缺集时评分仍可能从后续集继续）；
+        0: 链接失效、根目录为空，或没有子文件夹且根目录只有目标集之前的剧集
+        """
+        if not share_data:
+            return 0, None
 
-        # 检查候选资源中是否有下一集
-        candidate_episode_nums = [ep['episode'] for ep in candidate_episodes]
+        items = share_data.get('list', [])
+        episodes = []
+        for item in items:
+            filename = item.get('file_name', '')
+            if item.get('file') and self.is_video_file(filename):
+                episode = self.extract_episode_number_enhanced(filename, taskname)
+                if episode is not None:
+                    episodes.append(episode)
+        if target_episode in episodes:
+            return 3, max(episodes)
+
+        dir_names = [item.get('file_name', '') for item in items if item.get('dir')]
+        hints = list(episodes)
+        for text in dir_names + [share_data.get('share', {}).get('title', '')]:
+            for start, end in self.EPISODE_RANGE_PATTERN.findall(text):
+                # 排除「2019-2023」之类的年份区间
+                if int(start) <= int(end) and int(start) < 1900:
+                    hints.append(int(end))
+            for match in self.EPISODE_TOTAL_PATTERN.finditer(text):
+                hints.append(int(match.group(1) or match.group(2)))
+        max_hint = max(hints) if hints else None
+
+        if not dir_names:
+            if any(episode > target_episode for episode in episodes):
+                return 1, max_hint
+            return 0, max_hint
+        if max_hint is not None and max_hint >= target_episode:
+            return 2, max_hint
+        return 1, max_hint
+
+    def rank_root_listings(self, resources, listings, taskname, target_episode, top_k, mirrors=None):
+        """按根目录列表对候选资源预排序，返回最可能包含目标集的前 top_k 个候选
+
+        listings 为 {分享规范键: 根目录详情}；等级相同时依次按任务名匹配度、集数线索和原顺序排序
+        传入 mirrors（MirrorIndex）时，与排名更靠前的候选内容相同的镜像分享不占用 top_k 名额
+        """
+        ranked = []
+        for order, resource in enumerate(resources):
+            url = resource.get('shareurl')
+            if not url:
+                continue
+            tier, max_hint = self.score_root_listing(listings.get(ShareRef.key_of(url)), taskname, target_episode)
+            print(f"   🧮 预排序 {resource.get('taskname', '未知资源')}: 等级{tier}"
+                  + (f"，集数线索{max_hint}" if max_hint is not None else ""))
+            if tier > 0:
+                ranked.append(((tier, resource.get('match_score') or 0, max_hint or 0, -order), resource))
+
+        ranked.sort(key=lambda entry: entry[0], reverse=True)
+        selected = []
+        for _, resource in ranked:
+            if len(selected) >= top_k:
+                break
+            url = resource['shareurl']
+            if mirrors is not None and mirrors.mirror_of(url, listings.get(ShareRef.key_of(url))):
+                print(f"   🪞 跳过镜像分享 {resource.get('taskname', '未知资源')}: 内容与已选候选相同")
+                continue
+            selected.append(resource)
+        print(f"   🎯 预排序完成: {len(resources)} 个候选中选出 {len(selected)} 个进行深度分析")
+        return selected
+
+    def prerank_candidates(self, resources, taskname, target_episode, share_cache, job=None, mirrors=None):
+        """预排序阶段：每个候选只请求一次根目录（结果存入 share_cache 供深度分析复用），
+        只返回最可能包含目标集的前 prerank_top_k 个候选；prerank_top_k 为0时不预排序
+        job 已取消或到截止时间后不再请求，未获取根目录的候选按失效处理；mirrors 见 rank_root_listings
+        """
+        top_k = self.get_setting('prerank_top_k', 3)
+        if not top_k:
+            return resources
+
+        print(f"   🧮 预排序 {len(resources)} 个候选资源（目标: 第{target_episode}集）...")
+        for i, resource in enumerate(resources):
+            if job is not None and job.stopped():
+                print(f"   ⏱️ 任务已取消或已到截止时间，其余候选不再获取根目录")
+                break
+            # 当前根目录请求期间，后台预取其后几个候选的根目录
+            self.prefetch_candidates(resources[i + 1:], share_cache)
+            url = resource.get('shareurl')
+            if url:
+                self.get_share_detail(url, share_cache, job)
+
+        return self.rank_root_listings(resources, share_cache, taskname, target_episode, top_k, mirrors)
+
+    def skip_mirror(self, resource, share_cache, mirrors):
+        """候选的根目录已在 share_cache 中且内容与之前分析过的分享相同时返回True（复用那个分享的分析结果）；
+        否则登记该候选的指纹（根目录未获取时不登记）"""
+        url = resource.get('shareurl')
+        key = ShareRef.key_of(url)
+        if isinstance(share_cache, ShareCache):
+            share_cache.wait(key)  # 根目录正在预取时等其完成，深度分析本来也要用到
+        original = mirrors.mirror_of(url, share_cache.get(key))
+        if original:
+            print(f"   🪞 跳过镜像分享 {resource.get('taskname', '未知资源')}: 内容与 {original} 相同，复用其分析结果")
+        return original is not None
+
+    def new_share_cache(self):
+        """创建一次分析过程使用的分享详情缓存，请求间隔取配置项 request_interval（秒，默认1）
+
+        多个线程共用该缓存时也共用其限速器，总请求速率与逐个处理时相同
+        """
+        return ShareCache(self.get_setting('request_interval', 1))
+
+    def prefetch_candidates(self, resources, share_cache):
+        """后台预取接下来 prefetch_depth 个候选（默认2，0为关闭）的分享详情
+
+        根目录尚未获取的先预取根目录；根目录已在缓存中的（如预排序时已获取）预取其前几个子文件夹，
+        与当前候选的深度分析重叠进行；预取请求与正常请求共用限速器
+        """
+        if not isinstance(share_cache, ShareCache):
+            return
+        urls = self.prefetch_urls(resources, share_cache)
+        if urls:
+            share_cache.prefetch(self.get_share_detail, urls)
+
+    def prefetch_urls(self, resources, share_cache):
+        """prefetch_candidates 要预取的链接（异步版本共用）"""
+        depth = self.get_setting('prefetch_depth', 2)
+        if not depth:
+            return []
 
-        # 首先尝试找连续剧集
-        for episode in range(max_saved + 1, max_saved + 10):  # 检查接下来10集
-            if episode in candidate_episode_nums:
-                return episode
+        urls = []
+        for resource in resources[:depth]:
+            url = resource.get('shareurl')
+            if not url:
+                continue
+            root = share_cache.get(ShareRef.key_of(url))
+            if not root:
+                urls.append(url)
+                continue
+            dirs = [item for item in root.get('list', []) if item.get('dir')]
+            urls.extend(self.build_subfolder_share_url(url, item.get('fid')) for item in dirs[:3])
+        return urls
 
-        # 如果没有找到连续剧集，检查是否有比当前更大的剧集
-        larger_episodes = [ep for ep in candidate_episode_nums if ep > max_saved]
-        if larger_episodes:
-            next_episode = min(larger_episodes)
-            return next_episode
+    def get_continuation_target(self, saved_episodes, resources_analysis=()):
+        """确定续播目标集数：默认为已保存最大集数+1，开启 fill_gaps 时优先补齐候选资源能提供的缺集"""
+        if not saved_episodes:
+            return 1
+
+        if self.get_setting('fill_gaps', False):
+            if not isinstance(saved_episodes, EpisodeSet):
+                saved_episodes = EpisodeSet(saved_episodes)
+            candidate_sets = [r['episode_set'] for r in resources_analysis if r.get('episode_set')]
+            for start, end in saved_episodes.gaps():
+                for candidate_set in candidate_sets:
+                    episode = candidate_set.next_episode(start)
+                    if episode is not None and episode <= end:
+                        return episode
+
+        if isinstance(saved_episodes, EpisodeSet):
+            return saved_episodes.max_episode + 1
+        return max(saved_episodes) + 1
 
-        # 如果都没有，返回最大保存集数+1
-        return max_saved + 1
+    def find_continuation_point(self, candidate_episodes, saved_episodes):
+        """找到剧集连续性的断点"""
+        if not saved_episodes:
+            return 1  # 如果没有保存的剧集，从第1集开始
 
-    def select_best_folder_for_continuation(self, resource_analysis, saved_episodes):
+        if not isinstance(saved_episodes, EpisodeSet):
+            saved_episodes = EpisodeSet(saved_episodes)
+        if not isinstance(candidate_episodes, EpisodeSet):
+            candidate_episodes = EpisodeSet(ep.episode for ep in candidate_episodes)
+
+        # 开启补缺时，优先返回候选资源中能补上的第一个缺集
+        if self.get_setting('fill_gaps', False):
+            for start, end in saved_episodes.gaps():
+                episode = candidate_episodes.next_episode(start)
+                if episode is not None and episode <= end:
+                    return episode
+
+        # 候选资源中大于已保存最大集数的最小一集，都没有则返回最大保存集数+1
+        max_saved = saved_episodes.max_episode
+        next_episode = candidate_episodes.next_episode(max_saved + 1)
+        return next_episode if next_episode is not None else max_saved + 1
+
+    def build_folder_score_index(self, resource_analysis):
+        """收集资源所有文件夹的有序集数列表，供批量评分使用"""
+        index = []
+        for folder_name, folder_info in resource_analysis['folder_episodes'].items():
+            episode_numbers = folder_info.get('episode_numbers')
+            if episode_numbers is None:
+                # 兼容没有预排序集数的分析结果
+                episode_numbers = folder_info['episode_numbers'] = sorted(
+                    ep.episode for ep in folder_info['episodes'])
+            index.append((folder_name, folder_info, episode_numbers))
+        return index
+
+    def select_best_folder_for_continuation(self, resource_analysis, saved_episodes, folder_index=None,
+                                            continuation_point=None):
     ##"""选择包含续播点的最佳文件夹 - 优化版本"""
         if not resource_analysis.get('folder_episodes'):
             print(f"      ❌ 该资源没有可用的文件夹剧集信息")
             return None, None
 
-        max_saved = max(saved_episodes) if saved_episodes else 0
-        continuation_point = max_saved + 1
+        if continuation_point is None:
+            continuation_point = self.get_continuation_target(saved_episodes, [resource_analysis])
 
         print(f"   🎯 寻找包含第{continuation_point}集的最佳文件夹...")
 
+        if folder_index is None:
+            folder_index = self.build_folder_score_index(resource_analysis)
+
         best_folder_info = None
         best_score = -1
         best_episode_gap = float('inf')  # 与目标集数的差距
 
-        for folder_name, folder_info in resource_analysis['folder_episodes'].items():
-            folder_episodes = [ep['episode'] for ep in folder_info['episodes']]
+        for folder_name, folder_info, folder_episodes in folder_index:
             min_ep = folder_info['min_episode']
             max_ep = folder_info['max_episode']
+            episode_count = len(folder_episodes)
+
+            # 有序列表上二分查找，避免逐个比较
+            cp_pos = bisect_left(folder_episodes, continuation_point)
+            has_continuation = cp_pos < episode_count and folder_episodes[cp_pos] == continuation_point
 
             # 计算与目标集数的差距
-            if continuation_point in folder_episodes:
+            if has_continuation:
                 episode_gap = 0  # 完美匹配
             elif continuation_point < min_ep:
                 episode_gap = min_ep - continuation_point  # 文件夹起始集晚于目标
@@ -523,7 +2346,7 @@ class FailedTaskIncrementalUpdater:
             score = 0
 
             # 1. 是否包含续播点（最高优先级）
-            if continuation_point in folder_episodes:
+            if has_continuation:
                 score += 200  # 增加权重
                 print(f"     ✅ {folder_name}: 完美匹配续播点第{continuation_point}集")
 
@@ -532,7 +2355,7 @@ class FailedTaskIncrementalUpdater:
                 # 目标集数在文件夹范围内
                 score += 100
                 # 范围内有剧集越多越好
-                score += min(len([ep for ep in folder_episodes if ep >= continuation_point]), 20)
+                score += min(episode_count - cp_pos, 20)
             elif continuation_point < min_ep:
                 # 文件夹起始集晚于目标，差距越小越好
                 gap = min_ep - continuation_point
@@ -546,9 +2369,8 @@ class FailedTaskIncrementalUpdater:
                     score += 60 - gap * 5
 
             # 3. 剧集数量（但避免包含大量过时剧集的文件夹）
-            episode_count = len(folder_episodes)
             # 只计算接近目标集数的剧集数量
-            relevant_episodes = len([ep for ep in folder_episodes if ep >= continuation_point - 10])
+            relevant_episodes = episode_count - bisect_left(folder_episodes, continuation_point - 10)
             score += min(relevant_episodes * 3, 30)
 
             # 4. 文件夹深度（浅层文件夹优先）
@@ -584,31 +2406,35 @@ class FailedTaskIncrementalUpdater:
 
         print(f"   📊 找到 {len(valid_resources)} 个包含剧集的有效资源，正在评估...")
 
-        # 获取最大保存集数
-        max_saved = max(saved_episodes) if saved_episodes else 0
-
         best_resource = None
         best_folder = None
-        best_continuation_point = max_saved + 1
+        best_folder_episodes = None
+        best_continuation_point = self.get_continuation_target(saved_episodes, valid_resources)
         best_episode_gap = float('inf')
         best_score = -1
 
         for resource in valid_resources:
+            # 每个资源只收集一次有序集数列表
+            folder_index = self.build_folder_score_index(resource)
+
             # 为每个资源选择最佳文件夹
-            best_folder_for_resource, episode_gap = self.select_best_folder_for_continuation(resource, saved_episodes)
+            best_folder_for_resource, episode_gap = self.select_best_folder_for_continuation(
+                resource, saved_episodes, folder_index, best_continuation_point)
 
             if not best_folder_for_resource:
                 continue
 
             # 计算资源评分（主要基于文件夹评分）
-            folder_episodes = [ep['episode'] for ep in best_folder_for_resource['episodes']]
+            folder_episodes = next(eps for _, info, eps in folder_index if info is best_folder_for_resource)
             min_ep = best_folder_for_resource['min_episode']
             max_ep = best_folder_for_resource['max_episode']
+            cp_pos = bisect_left(folder_episodes, best_continuation_point)
+            has_continuation = cp_pos < len(folder_episodes) and folder_episodes[cp_pos] == best_continuation_point
             
             score = 0
             
             # 1. 与目标集数的接近程度（最重要）
-            if best_continuation_point in folder_episodes:
+            if has_continuation:
                 score += 300
             elif min_ep <= best_continuation_point <= max_ep:
                 score += 200
@@ -620,16 +2446,19 @@ class FailedTaskIncrementalUpdater:
             
             # 2. 剧集连续性（检查是否有连续剧集）
             if min_ep <= best_continuation_point <= max_ep:
-                # 计算从目标集数开始的连续剧集数量
+                # 计算从目标集数开始的连续剧集数量（有序列表中顺序扫描，重复集数跳过）
                 continuous_count = 0
                 current = best_continuation_point
-                while current in folder_episodes:
-                    continuous_count += 1
-                    current += 1
+                for ep in folder_episodes[cp_pos:]:
+                    if ep == current:
+                        continuous_count += 1
+                        current += 1
+                    elif ep > current:
+                        break
                 score += min(continuous_count * 5, 50)
             
             # 3. 总剧集数量（但只考虑目标集数之后的）
-            future_episodes = len([ep for ep in folder_episodes if ep >= best_continuation_point])
+            future_episodes = len(folder_episodes) - cp_pos
             score += min(future_episodes * 2, 40)
             
             # 4. 优先选择剧集较新的资源
@@ -642,6 +2471,7 @@ class FailedTaskIncrementalUpdater:
                 best_score = score
                 best_resource = resource
                 best_folder = best_folder_for_resource
+                best_folder_episodes = folder_episodes
 
         if best_resource and best_folder:
             print(f"   🏆 选择最佳资源:")
@@ -649,17 +2479,12 @@ class FailedTaskIncrementalUpdater:
             print(f"     最佳文件夹剧集: 第{best_folder['min_episode']}集 - 第{best_folder['max_episode']}集")
             print(f"     与目标集数差距: {best_episode_gap}集")
 
-            # 计算实际的起始点
-            folder_episodes = [ep['episode'] for ep in best_folder['episodes']]
-            if best_continuation_point in folder_episodes:
-                start_episode = best_continuation_point
+            # 计算实际的起始点：续播点本身，或文件夹中第一个更大的剧集，都没有则选最新的
+            cp_pos = bisect_left(best_folder_episodes, best_continuation_point)
+            if cp_pos < len(best_folder_episodes):
+                start_episode = best_folder_episodes[cp_pos]
             else:
-                # 选择文件夹中最接近目标集数的剧集
-                larger_episodes = [ep for ep in folder_episodes if ep >= best_continuation_point]
-                if larger_episodes:
-                    start_episode = min(larger_episodes)
-                else:
-                    start_episode = max(folder_episodes)  # 如果没有更大的，选择最新的
+                start_episode = best_folder_episodes[-1]
             
             # 将最佳文件夹信息添加到资源中
             best_resource['best_folder'] = best_folder
@@ -667,62 +2492,76 @@ class FailedTaskIncrementalUpdater:
 
         return best_resource
 
-    def update_failed_tasks_incremental(self):
-        """只更新失效任务，并且更新到最新剧集所在的文件夹"""
-        if not self.config_data.get('tasklist'):
-            print("❌ 配置文件中没有任务列表")
-            return False
+    def find_task_update(self, task, share_cache=None):
+        """为单个失效任务寻找最佳替代资源，只返回更新内容，不修改配置
 
-        # 找出所有失效任务
-        failed_tasks = []
-        for i, task in enumerate(self.config_data['tasklist']):
-            if task.get('shareurl_ban'):
-                failed_tasks.append((i, task))
-
-        if not failed_tasks:
-            print("🎉 没有发现失效任务")
-            return False
-
-        print(f"🔍 发现 {len(failed_tasks)} 个失效任务，开始增量更新...")
-
-        updated_count = 0
-
-        for i, (index, task) in enumerate(failed_tasks, 1):
-            taskname = task.get('taskname', '未知任务')
-            print(f"\n[{i}/{len(failed_tasks)}] 更新失效任务: {taskname}")
-            print(f"   ⚠️ 失效原因: {task['shareurl_ban']}")
+        share_cache: 多个任务同时处理时共用的 ShareCache（共用一个限速器），为空时本任务单独创建
+        """
+        taskname = task.get('taskname', '未知任务')
 
-            # 获取已保存的剧集信息
-            saved_episodes = self.get_saved_episodes(task)
-            if saved_episodes:
-                print(f"   💾 已转存剧集: {saved_episodes} (共{len(saved_episodes)}集)")
+        # 上次中断的运行中已经为该任务选好了替代资源，直接复用
+        task_state = self.get_task_state(task)
+        if task_state.get('update'):
+            print(f"   ♻️ 从断点恢复已选定的替代资源")
+            return task_state['update']
 
-            print(f"   🔍 正在寻找新的资源地址...")
+        # 上游服务熔断中时直接跳过，等下次运行（或守护模式下次重试）再处理
+        if self.breaker.is_open():
+            print(f"   ⛔ 上游服务熔断中（{self.breaker.retry_after():.0f}秒后探测），跳过该任务")
+            return None
 
-            # 获取新的资源列表
-            new_resources = self.get_new_resources(taskname)
-            if not new_resources:
-                print(f"   ❌ 未找到新的资源地址")
-                continue
+        # 获取已保存的剧集信息
+        saved_episodes = self.get_saved_episodes(task)
+        gaps = saved_episodes.gaps() if saved_episodes else []
+        if saved_episodes:
+            print(f"   💾 已转存剧集: {saved_episodes} (共{len(saved_episodes)}集)")
+            if gaps:
+                gap_text = ", ".join(f"{a}" if a == b else f"{a}-{b}" for a, b in gaps)
+                print(f"   🕳️ 已转存范围内缺集: {gap_text}")
+        # 缺集数用于下次运行时的调度排序
+        self.scheduler.record_missing(task, sum(b - a + 1 for a, b in gaps))
+
+        print(f"   🔍 正在寻找新的资源地址...")
+
+        # 获取新的资源列表
+        new_resources = self.get_new_resources(taskname)
+        if not new_resources:
+            print(f"   ❌ 未找到新的资源地址")
+            return None
 
-            # 过滤匹配的任务名
-            matched_resources = []
-            for resource in new_resources:
-                candidate_taskname = resource.get('taskname', '')
-                if candidate_taskname and self.is_taskname_match(candidate_taskname, taskname):
-                    matched_resources.append(resource)
+        # 过滤匹配的任务名，按相似度排序后优先分析最相关的候选（合并重复链接，跳过近期已确认失效或无剧集的候选）
+        matched_resources = self.select_candidates(new_resources, taskname)
 
-            if not matched_resources:
-                print(f"   ❌ 未找到任务名匹配的资源")
-                continue
+        if not matched_resources:
+            print(f"   ❌ 未找到任务名匹配的资源")
+            return None
 
-            print(f"   ✅ 找到 {len(matched_resources)} 个任务名匹配的资源")
+        print(f"   ✅ 找到 {len(matched_resources)} 个任务名匹配的资源")
 
-            # 使用优化版分析所有候选资源
-            resources_analysis = []
-            analysis_count = min(len(matched_resources), 10)  # 限制分析数量
+        # 使用优化版分析所有候选资源
+        resources_analysis = []
+        candidates = matched_resources[:10]  # 限制分析数量
+        target_episode = self.get_continuation_target(saved_episodes)
 
-            for j, resource in enumerate(matched_resources[:analysis_count]):
+        # 断点中已有分析结果的候选不再预排序；其余候选先按根目录预排序，只深度分析最可能包含续播点的几个
+        own_cache = share_cache is None
+        if own_cache:
+            share_cache = self.new_share_cache()
+        mirrors = MirrorIndex()
+        try:
+            resumed = [resource for resource in candidates
+                       if self.resumable_analysis(task_state, resource.get('shareurl'))]
+            candidates = resumed + self.prerank_candidates(
+                [resource for resource in candidates if resource not in resumed], taskname, target_episode,
+                share_cache, mirrors=mirrors)
+            analysis_count = len(candidates)
+
+            # 开启 stop_on_match 时，候选资源中出现包含续播点的文件夹后即停止遍历其余子文件夹
+            stop_when = None
+            if self.get_setting('stop_on_match', False):
+                stop_when = lambda analysis, folder_info: target_episode in folder_info['episode_numbers']
+
+            for j, resource in enumerate(candidates):
                 new_url = resource.get('shareurl')
                 new_taskname = resource.get('taskname', '未知资源')
 
@@ -731,112 +2570,346 @@ class FailedTaskIncrementalUpdater:
 
                 print(f"   🔄 分析资源 {j + 1}/{analysis_count}: {new_taskname}")
 
-                # 使用优化的深度分析方法
-                analysis = self.analyze_resource_structure_optimized(new_url, taskname)
+                # 复用中断前完整的分析结果（不完整的重新分析）
+                saved_analysis = self.resumable_analysis(task_state, new_url)
+                if saved_analysis:
+                    print(f"   ♻️ 复用断点中的分析结果: {new_url}")
+                    resources_analysis.append(self.deserialize_analysis(saved_analysis))
+                    continue
+
+                # 内容与已分析候选相同的镜像分享不再深度分析
+                if self.skip_mirror(resource, share_cache, mirrors):
+                    continue
+
+                # 分析当前候选期间，后台预取后续候选的目录
+                self.prefetch_candidates(candidates[j + 1:], share_cache)
+
+                # 使用优化的深度分析方法（根目录已在预排序时获取，请求间隔由 share_cache 限速）
+                analysis = self.analyze_resource_structure_optimized(new_url, taskname, stop_when=stop_when,
+                                                                     share_cache=share_cache)
+                # 未预排序时根目录在分析后才获取，此时才能识别镜像
+                if self.skip_mirror(resource, share_cache, mirrors):
+                    continue
                 resources_analysis.append(analysis)
+                if analysis['is_valid']:
+                    self.checkpoint_analysis(task_state, new_url, analysis)
+        finally:
+            if own_cache:
+                share_cache.close()
+
+        if mirrors.skipped:
+            print(f"   🪞 共跳过 {mirrors.skipped} 个镜像分享")
+
+        # 分析途中上游熔断时部分候选未能获取，结果不可靠，不做替换
+        if self.breaker.is_open():
+            print(f"   ⛔ 分析过程中上游服务熔断，放弃本次结果")
+            return None
 
-                # 避免请求过快
-                time.sleep(2)
+        # 选择最佳资源（考虑文件夹结构）
+        best_resource = self.select_best_resource(resources_analysis, taskname, saved_episodes)
 
-            # 选择最佳资源（考虑文件夹结构）
-            best_resource = self.select_best_resource(resources_analysis, taskname, saved_episodes)
+        if not best_resource or not best_resource.get('best_folder'):
+            print(f"   💔 未找到包含续播点的合适文件夹")
+            return None
 
-            if best_resource and best_resource.get('best_folder'):
-                best_folder = best_resource['best_folder']
-                continuation_point = best_resource['continuation_point']
+        best_folder = best_resource['best_folder']
+        continuation_point = best_resource['continuation_point']
+
+        # 查找起始文件ID（续播点剧集）
+        startfid = None
+        for ep in best_folder['episodes']:
+            if ep.episode == continuation_point:
+                startfid = ep.fid
+                break
+
+        if not startfid and best_folder['episodes']:
+            # 如果没有找到精确匹配，使用文件夹中最接近的剧集
+            min_gap = float('inf')
+            for ep in best_folder['episodes']:
+                gap = abs(ep.episode - continuation_point)
+                if gap < min_gap:
+                    min_gap = gap
+                    startfid = ep.fid
+
+        update = {
+            # 使用最佳文件夹的分享链接
+            'shareurl': best_folder['share_url'],
+            'startfid': startfid,
+            'continuation_point': continuation_point,
+            'folder_path': [item.get('file_name', '') for item in best_folder['folder_path']],
+            'min_episode': best_folder['min_episode'],
+            'max_episode': best_folder['max_episode']
+        }
+        self.checkpoint_task_state(task_state, update=update)
+        return update
+
+    def apply_task_update(self, task, update):
+        """将找到的替代资源写入任务配置"""
+        old_url = task['shareurl']
+        task['shareurl'] = update['shareurl']
+        task.pop('shareurl_ban', None)  # 移除失效标记
+        task['last_updated'] = datetime.now().isoformat()
+
+        # 设置startfid
+        if update['startfid']:
+            task['startfid'] = update['startfid']
+
+        print(f"   ✨ 已更新分享链接到最佳文件夹:")
+        print(f"      旧链接: {old_url}")
+        print(f"      新链接: {update['shareurl']}")
+        print(f"      文件夹: {'/'.join(update['folder_path']) or '根目录'}")
+        print(f"      起始点: {task.get('startfid', '未设置')} (第{update['continuation_point']}集)")
+        print(f"      剧集范围: 第{update['min_episode']}集 - 第{update['max_episode']}集")
+
+    def find_task_update_safe(self, task, share_cache=None):
+        """单任务错误隔离：任何异常只影响当前任务"""
+        try:
+            return self.find_task_update(task, share_cache)
+        except Exception as e:
+            print(f"   ❌ 处理任务 {task.get('taskname', '未知任务')} 时出错: {e}")
+            return None
 
-                # 使用最佳文件夹的分享链接
-                optimized_url = best_folder['share_url']
+    def update_failed_tasks_incremental(self, max_workers=None):
+        """只更新失效任务，并且更新到最新剧集所在的文件夹
 
-                # 查找起始文件ID（续播点剧集）
-                startfid = None
-                for ep in best_folder['episodes']:
-                    if ep['episode'] == continuation_point:
-                        startfid = ep.get('fid')
-                        break
+        任务按紧迫程度依次开始处理（见 FailedTaskScheduler）；配置项 run_budget（秒，默认0为不限）为本次运行的时间预算，
+        超出预算后不再开始新的任务，未开始的任务记入 deferred_tasks 并在下次运行时优先处理；已开始的任务会处理完
+        """
+        self.deferred_tasks = set()
+        if not self.count_tasks():
+            print("❌ 配置文件中没有任务列表")
+            return False
 
-                if not startfid and best_folder['episodes']:
-                    # 如果没有找到精确匹配，使用文件夹中最接近的剧集
-                    closest_episode = None
-                    min_gap = float('inf')
-                    for ep in best_folder['episodes']:
-                        gap = abs(ep['episode'] - continuation_point)
-                        if gap < min_gap:
-                            min_gap = gap
-                            closest_episode = ep['episode']
-                            startfid = ep.get('fid')
-
-                # 更新任务配置
-                old_url = task['shareurl']
-                task['shareurl'] = optimized_url
-                task.pop('shareurl_ban', None)  # 移除失效标记
-                task['last_updated'] = datetime.now().isoformat()
-
-                # 设置startfid
-                if startfid:
-                    task['startfid'] = startfid
-
-                print(f"   ✨ 已更新分享链接到最佳文件夹:")
-                print(f"      旧链接: {old_url}")
-                print(f"      新链接: {optimized_url}")
-                folder_path_str = "/".join([item.get('file_name', '') for item in best_folder['folder_path']]) or "根目录"
-                print(f"      文件夹: {folder_path_str}")
-                print(f"      起始点: {task.get('startfid', '未设置')} (第{continuation_point}集)")
-                print(f"      剧集范围: 第{best_folder['min_episode']}集 - 第{best_folder['max_episode']}集")
-
-                updated_count += 1
-            else:
-                print(f"   💔 未找到包含续播点的合适文件夹")
+        # 找出所有失效任务
+        failed_tasks = self.list_failed_tasks()
 
-        print(f"\n📊 失效任务增量更新完成: 共更新了 {updated_count} 个任务")
+        if not failed_tasks:
+            print("🎉 没有发现失效任务")
+            return False
+
+        max_workers = max(1, min(max_workers or self.max_workers, len(failed_tasks)))
+        print(f"🔍 发现 {len(failed_tasks)} 个失效任务，开始增量更新...")
+        self.load_update_state()
+
+        # 按紧迫程度排序；设置了时间预算时超出预算后不再开始新任务
+        self.scheduler.load()
+        ordered = self.scheduler.order(failed_tasks)
+        budget = self.get_setting('run_budget', 0)
+        deadline = time.time() + budget if budget else None
+        if budget:
+            print(f"⏳ 本次运行时间预算: {budget}秒")
+
+        def process(i, task, share_cache=None):
+            if self.stop_event.is_set() or (deadline is not None and time.time() >= deadline):
+                return False, None
+            print(f"\n[{i}/{len(ordered)}] 更新失效任务: {task.get('taskname', '未知任务')}")
+            print(f"   ⚠️ 失效原因: {task['shareurl_ban']}")
+            return True, self.find_task_update_safe(task, share_cache)
+
+        def process_prefixed(i, task, share_cache):
+            with output.prefix(f"[{task.get('taskname', '未知任务')}] "):
+                return process(i, task, share_cache)
 
-        # 如果成功更新了任务，触发资源更新
-        if updated_count > 0:
-            print(f"\n🚀 触发资源更新脚本...")
-            if self.trigger_resource_update():
-                print("✅ 已成功触发资源更新")
+        updated_count = 0
+        results = {}
+
+        if max_workers > 1:
+            # 并发处理：各任务互相独立，按紧迫程度依次开始，结果按配置顺序合并；
+            # 所有任务共用一个分享详情缓存和限速器，总请求速率与逐个处理时相同，日志每行带任务名前缀
+            print(f"⚡ 并发模式: {max_workers} 个任务同时处理")
+            share_cache = self.new_share_cache()
+            output = PrefixedOutput(sys.stdout)
+            sys.stdout = output
+            try:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    futures = {index: executor.submit(process_prefixed, i, task, share_cache)
+                               for i, (index, task) in enumerate(ordered, 1)}
+                    results = {index: future.result() for index, future in futures.items()}
+            finally:
+                sys.stdout = output.stream
+                share_cache.close()
+
+            print(f"\n📥 合并任务更新结果...")
+            for index, task in failed_tasks:
+                _, update = results[index]
+                if update:
+                    print(f"\n[{task.get('taskname', '未知任务')}]")
+                    self.apply_task_update(task, update)
+                    self.store_task(index, task)
+                    updated_count += 1
+        else:
+            for i, (index, task) in enumerate(ordered, 1):
+                results[index] = process(i, task)
+                _, update = results[index]
+                if update:
+                    self.apply_task_update(task, update)
+                    self.store_task(index, task)
+                    updated_count += 1
+
+        # 未开始的任务顺延到下次运行
+        deferred_names = []
+        for index, task in ordered:
+            if results[index][0]:
+                self.scheduler.record_processed(task)
             else:
-                print("⚠️ 资源更新脚本触发失败，但任务配置已更新")
+                self.scheduler.record_deferred(task)
+                self.deferred_tasks.add((task.get('taskname', ''), task.get('shareurl', '')))
+                deferred_names.append(task.get('taskname', '未知任务'))
+        self.scheduler.save([task for _, task in failed_tasks if task.get('shareurl_ban')])
+
+        if deferred_names:
+            reason = "收到停止信号" if self.stop_event.is_set() else "超出运行时间预算"
+            print(f"\n⏳ {reason}，{len(deferred_names)} 个任务顺延到下次运行: {'、'.join(deferred_names)}")
+        print(f"\n📊 失效任务增量更新完成: 共更新了 {updated_count} 个任务")
 
         return updated_count > 0
 
+    def request_resource_update(self, callback=None, on_join=None):
+        """请求触发资源更新（经过合并器），返回加入的批次ID"""
+        return self.trigger_coordinator.request(callback, on_join)
+
+    def report_resource_update(self, batch_id, success):
+        """打印配置保存后触发资源更新的结果"""
+        if success:
+            print(f"✅ 已成功触发资源更新（批次 {batch_id}）")
+        else:
+            print(f"⚠️ 资源更新脚本触发失败，但任务配置已更新（批次 {batch_id}）")
+
     def run(self):
         """运行资源更新"""
         print("🚀 夸克资源失效任务增量更新脚本启动（修复版）")
         print("=" * 50)
 
-        if not self.load_config():
+        # 初始化时已加载过配置，文件未变化时不再重复解析
+        if not self.reload_config_if_changed():
             return False
 
         # 检查是否有任务列表
-        if not self.config_data.get('tasklist'):
+        if not self.count_tasks():
             print("ℹ️ 配置文件中没有任务列表，无需更新")
             return True
 
+        self.negative_cache.prune()
         has_updates = self.update_failed_tasks_incremental()
 
         if has_updates:
             if self.save_config():
+                self.clear_update_state()
+                # 配置保存后再触发，上游运行时才能读到更新后的任务
+                print(f"\n🚀 触发资源更新脚本...")
+                self.request_resource_update(self.report_resource_update)
                 print(f"\n🎉 配置已更新，请重新运行夸克自动转存脚本")
                 return True
             else:
+                # 保留断点状态，下次运行可直接复用已选定的更新
                 print(f"\n❌ 配置保存失败")
                 return False
         else:
+            self.clear_update_state()
             print(f"\nℹ️ 没有需要更新的任务")
             return True
 
+    def get_failed_task_keys(self):
+        """获取当前所有失效任务的标识集合"""
+        return {(task.get('taskname', ''), task.get('shareurl', '')) for _, task in self.list_failed_tasks()}
+
+    def run_daemon(self, poll_interval=5, retry_interval=3600):
+        """守护模式：常驻内存，轮询配置文件变化，发现新的失效任务后立即更新
+
+        Ctrl+C 立即停止；SIGTERM（如 systemd/docker stop）不再开始新的任务，当前任务处理并保存后停止，
+        两者都经过 shutdown_daemon
+        """
+        print("🚀 夸克资源失效任务增量更新守护进程启动")
+        print(f"   轮询间隔: {poll_interval}秒，失败重试间隔: {retry_interval}秒")
+        print("=" * 50)
+
+        if not self.reload_config_if_changed():
+            return False
+        self.trigger_coordinator.window = self.get_setting('trigger_window', 10)
+        self.configure_upstream()
+
+        handled_keys = set()
+        last_attempt = 0
+
+        def request_stop(signum, frame):
+            print(f"\n🛑 收到停止信号，处理完当前任务后退出")
+            self.stop_event.set()
+
+        self.stop_event.clear()
+        try:
+            previous_handler = signal.signal(signal.SIGTERM, request_stop)
+        except ValueError:
+            # 只有主线程可以安装信号处理器
+            previous_handler = None
+
+        try:
+            while not self.stop_event.is_set():
+                if self.config_changed():
+                    print(f"\n📝 检测到配置文件变化，重新加载: {self.config_path}")
+                    if self.load_config():
+                        # webui账号可能被修改，重新生成token
+                        self.api_token = self.generate_api_token()
+                        self.trigger_coordinator.window = self.get_setting('trigger_window', 10)
+                        self.configure_upstream()
+
+                failed_keys = self.get_failed_task_keys()
+                new_keys = failed_keys - handled_keys
+                retry_due = failed_keys and time.time() - last_attempt >= retry_interval
+
+                if new_keys or retry_due:
+                    if new_keys:
+                        print(f"\n🔔 发现 {len(new_keys)} 个新的失效任务")
+                    else:
+                        print(f"\n⏰ 到达重试间隔，重新处理失效任务")
+                    last_attempt = time.time()
+
+                    if not self.update_failed_tasks_incremental():
+                        self.clear_update_state()
+                    elif self.save_config():
+                        self.clear_update_state()
+                        self.request_resource_update(self.report_resource_update)
+                    # 超出时间预算而顺延的任务在下一次轮询时继续处理
+                    handled_keys = failed_keys - self.deferred_tasks
+
+                self.stop_event.wait(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if previous_handler is not None:
+                signal.signal(signal.SIGTERM, previous_handler)
+
+        self.shutdown_daemon()
+        return True
+
+    def shutdown_daemon(self):
+        """守护进程退出：立即执行窗口期内等待中的资源更新触发，并把SQLite任务存储中尚未导出的修改写回配置文件"""
+        self.trigger_coordinator.flush()
+        if not self.export_tasks():
+            print("⚠️ 任务存储中的修改导出失败，保留在数据库中，下次保存配置时再写回")
+        print("\n👋 守护进程已停止")
+
 
 def main():
     """主函数"""
     import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description='夸克资源失效任务增量更新脚本')
+    parser.add_argument('config', nargs='?', default='quark_config.json', help='配置文件路径')
+    parser.add_argument('--daemon', action='store_true', help='以守护模式运行，监听配置文件变化')
+    parser.add_argument('--poll-interval', type=float, default=5, help='守护模式下检查配置文件的间隔（秒）')
+    parser.add_argument('--retry-interval', type=float, default=3600, help='守护模式下重试未解决失效任务的间隔（秒）')
+    parser.add_argument('--workers', type=int, default=1, help='同时处理的失效任务数量')
 
-    # 配置文件路径
-    config_path = sys.argv[1] if len(sys.argv) > 1 else "quark_config.json"
+    args = parser.parse_args()
 
     # 创建更新器并运行
-    updater = FailedTaskIncrementalUpdater(config_path)
-    success = updater.run()
+    updater = FailedTaskIncrementalUpdater(args.config)
+    updater.max_workers = args.workers
+    if args.daemon:
+        success = updater.run_daemon(args.poll_interval, args.retry_interval)
+    else:
+        success = updater.run()
 
     if success:
         print("✅ 脚本执行完成")
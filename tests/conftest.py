@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""测试共用设置：直接导入仓库根目录下的脚本模块，并提供使用临时配置文件的更新器"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def updater(tmp_path):
+    """使用临时配置文件的更新器，不发出网络请求"""
+    from quark_failed_task_update import FailedTaskIncrementalUpdater
+    config_path = tmp_path / 'config.json'
+    config_path.write_text(json.dumps({'tasklist': []}), encoding='utf-8')
+    return FailedTaskIncrementalUpdater(str(config_path))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""CircuitBreaker：连续失败后熔断，冷却期满只放行一个探测请求"""
+import pytest
+
+import quark_failed_task_update
+from quark_failed_task_update import CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(quark_failed_task_update.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_opens_after_threshold_consecutive_failures(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # 成功后重新计数
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow() and not breaker.is_open()
+    breaker.record_failure()
+    assert breaker.is_open()
+    assert not breaker.allow()
+    assert breaker.retry_after() == 60
+
+
+def test_single_probe_after_cooldown(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record_failure()
+    clock[0] += 60
+    assert not breaker.is_open()
+    assert breaker.allow()
+    assert not breaker.allow()  # 探测请求进行中，其余请求仍然失败
+    assert breaker.is_open()
+
+
+def test_failed_probe_reopens_and_successful_probe_closes(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record_failure()
+    clock[0] += 60
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open() and breaker.retry_after() == 60
+
+    clock[0] += 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_zero_threshold_never_opens(clock):
+    breaker = CircuitBreaker(threshold=0)
+    for _ in range(100):
+        breaker.record_failure()
+    assert breaker.allow() and not breaker.is_open()
+
+
+def test_released_probe_allows_next_probe(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record_failure()
+    clock[0] += 60
+    assert breaker.allow()
+    breaker.release_probe()
+    assert not breaker.is_open()
+    assert breaker.allow()  # 重新探测，不会一直熔断
+    breaker.record_success()
+    assert not breaker.is_open()
+
+
+def test_capped_probe_timeout_does_not_leave_breaker_open(updater, clock):
+    import requests
+    from quark_failed_task_update import JobContext
+
+    def timeout(*args, **kwargs):
+        raise requests.exceptions.Timeout()
+
+    updater.breaker = CircuitBreaker(threshold=1, cooldown=60)
+    updater.breaker.record_failure()
+    clock[0] += 60
+    updater.session.request = timeout
+    job = JobContext(timeout=1)  # 剩余时间小于接口超时，探测请求的超时被截短
+    with pytest.raises(requests.exceptions.Timeout):
+        updater.upstream_request('GET', 'task_suggestions', job=job)
+    assert not updater.breaker.probing
+    assert updater.breaker.allow()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""只有上游明确表示分享失效时才记入失效候选记录"""
+from quark_failed_task_update import ShareRef
+
+
+class FakeResponse:
+    def __init__(self, result):
+        self.result = result
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.result
+
+
+def recorded(updater, share_url):
+    return updater.negative_cache.filter_known([ShareRef.key_of(share_url)])
+
+
+def test_explicit_share_errors_are_recorded(updater):
+    for i, error in enumerate(['分享地址已失效', '好友已取消了分享', '提取码错误', 'share expired']):
+        url = f'https://pan.quark.cn/s/dead{i:02d}'
+        updater.record_dead_share(url, {'success': False, 'data': {'error': error}})
+        assert recorded(updater, url) == {ShareRef.key_of(url): 'dead'}
+
+
+def test_auth_and_unknown_errors_are_not_recorded(updater):
+    for i, result in enumerate([{'success': False, 'message': '未登录'},
+                                {'success': False, 'data': {'error': 'token校验异常，分享无法访问'}},
+                                {'success': False, 'data': {'error': '请求过于频繁'}},
+                                {'success': False, 'data': {'error': 'no dir'}},
+                                {'success': False}]):
+        url = f'https://pan.quark.cn/s/live{i:02d}'
+        updater.record_dead_share(url, result)
+        assert not recorded(updater, url)
+
+
+def test_subfolder_is_recorded_on_second_failure(updater):
+    url = 'https://pan.quark.cn/s/abc123#/list/share/0123456789abcdef0123456789abcdef'
+    result = {'success': False, 'data': {'error': '文件已被分享者删除'}}
+    updater.record_dead_share(url, result)
+    assert not recorded(updater, url)
+    updater.record_dead_share(url, result)
+    assert recorded(updater, url)
+
+
+def test_successful_fetch_clears_dead_record(updater):
+    url = 'https://pan.quark.cn/s/abc123'
+    updater.record_dead_share(url, {'success': False, 'data': {'error': '分享地址已失效'}})
+    updater.upstream_request = lambda *args, **kwargs: FakeResponse({'success': True, 'data': {'list': []}})
+    assert updater.get_share_detail(url) == {'list': []}
+    assert not recorded(updater, url)
+
+
+def empty_share(updater, folder_count):
+    """根目录只有 folder_count 个空文件夹的分享，详情全部放入缓存（不发请求）"""
+    url = 'https://pan.quark.cn/s/abc123'
+    fids = [f'{i:032x}' for i in range(1, folder_count + 1)]
+    share_cache = {ShareRef.key_of(url): {'list': [{'fid': fid, 'file_name': f'文件夹{i}', 'dir': True}
+                                                   for i, fid in enumerate(fids)]}}
+    for fid in fids:
+        share_cache[ShareRef.key_of(updater.build_subfolder_share_url(url, fid))] = {'list': []}
+    return url, share_cache
+
+
+def test_fully_traversed_empty_share_is_recorded(updater):
+    url, share_cache = empty_share(updater, 2)
+    updater.analyze_resource_structure_optimized(url, '测试剧', share_cache=share_cache)
+    assert recorded(updater, url) == {ShareRef.key_of(url): 'empty'}
+
+
+def test_truncated_traversal_is_not_recorded_as_empty(updater):
+    """只遍历了前3个子文件夹，后面的文件夹可能有剧集"""
+    url, share_cache = empty_share(updater, 5)
+    analysis = updater.analyze_resource_structure_optimized(url, '测试剧', share_cache=share_cache)
+    assert analysis['truncated']
+    assert not recorded(updater, url)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""EpisodeSet 位图集合：成员判断、区间计数、续播点和缺集查找"""
+import pytest
+
+from quark_failed_task_update import EpisodeSet
+
+
+def test_membership_and_bounds():
+    episodes = EpisodeSet([5, 1, 3, 3, 16])
+    assert len(episodes) == 4
+    assert list(episodes) == [1, 3, 5, 16]
+    assert (episodes.min_episode, episodes.max_episode) == (1, 16)
+    assert 3 in episodes and 16 in episodes
+    assert 2 not in episodes and 17 not in episodes and 1000 not in episodes
+    assert -1 not in episodes and '3' not in episodes
+
+
+def test_negative_episode_is_rejected():
+    with pytest.raises(ValueError):
+        EpisodeSet([-1])
+
+
+def test_count_range_crosses_byte_boundaries():
+    episodes = EpisodeSet(range(1, 31))
+    assert episodes.count_range(1, 30) == 30
+    assert episodes.count_range(7, 9) == 3
+    assert episodes.count_range(25, 100) == 6
+    assert episodes.count_range(-5, 0) == 0
+    assert episodes.count_range(10, 5) == 0
+
+
+def test_next_episode():
+    episodes = EpisodeSet([2, 9, 40])
+    assert episodes.next_episode(0) == 2
+    assert episodes.next_episode(3) == 9
+    assert episodes.next_episode(10) == 40
+    assert episodes.next_episode(41) is None
+    assert EpisodeSet().next_episode(1) is None
+
+
+def test_intervals_and_gaps_round_trip():
+    episodes = EpisodeSet([1, 2, 3, 5, 8, 9, 10])
+    assert episodes.intervals() == [(1, 3), (5, 5), (8, 10)]
+    assert episodes.gaps() == [(4, 4), (6, 7)]
+    assert episodes.gaps(1, 12) == [(4, 4), (6, 7), (11, 12)]
+    assert list(EpisodeSet.from_intervals(episodes.intervals())) == list(episodes)
+    assert EpisodeSet().gaps() == []
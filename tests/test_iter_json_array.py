@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""iter_json_array 增量解析：任意块边界（包括多字节字符中间）下结果与整体解析一致"""
+import json
+
+import pytest
+
+from quark_failed_task_update import iter_json_array
+
+ITEMS = [{'fid': f'{i:032x}', 'file_name': f'测试剧 第{i}集 [4K].mkv', 'tags': ['国语', {'x': i}], 'size': i * 1024}
+         for i in range(20)]
+BODY = json.dumps({'success': True, 'data': {'total': 20, 'list': ITEMS, 'list_extra': []}},
+                  ensure_ascii=False, indent=1).encode('utf-8')
+
+
+def chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7, 64, len(BODY)])
+def test_any_chunk_size_yields_every_item(size):
+    assert list(iter_json_array(chunks(BODY, size), 'list')) == ITEMS
+
+
+def test_key_split_across_chunks_after_long_prefix():
+    body = json.dumps({'padding': 'x' * 500, 'list': ITEMS[:2]}).encode('utf-8')
+    split = body.index(b'"list"') + 3
+    assert list(iter_json_array([body[:split], body[split:]], 'list')) == ITEMS[:2]
+
+
+def test_empty_array():
+    assert list(iter_json_array([b'{"data": {"list": [ ]}}'], 'list')) == []
+
+
+def test_truncated_stream_raises_after_complete_items():
+    truncated = BODY[:BODY.index(b'"fid": "' + f'{5:032x}'.encode())]
+    items = []
+    with pytest.raises(ValueError):
+        for item in iter_json_array(chunks(truncated, 16), 'list'):
+            items.append(item)
+    assert items == ITEMS[:5]
+
+
+def test_missing_key_raises():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'{"data": {"other": []}}'], 'list'))
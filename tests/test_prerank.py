@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""预排序：按分享根目录列表估计候选包含目标集的可能性，只剔除明显不含续播集的候选"""
+from quark_failed_task_update import ShareRef
+
+TASKNAME = '测试剧'
+SHARE_URL = 'https://pan.quark.cn/s/abc123'
+
+
+def listing(*episodes, dirs=(), title=''):
+    items = [{'file_name': f'{TASKNAME}.E{episode:02d}.mp4', 'file': True, 'dir': False} for episode in episodes]
+    items += [{'file_name': name, 'file': False, 'dir': True} for name in dirs]
+    return {'list': items, 'share': {'title': title}}
+
+
+def test_tiers(updater):
+    score = updater.score_root_listing
+    assert score(None, TASKNAME, 6) == (0, None)
+    assert score(listing(), TASKNAME, 6) == (0, None)
+    assert score(listing(5, 6, 7), TASKNAME, 6) == (3, 7)
+    assert score(listing(dirs=['1-30集']), TASKNAME, 6) == (2, 30)
+    assert score(listing(dirs=['第一季']), TASKNAME, 6) == (1, None)
+    assert score(listing(1, 2, 3), TASKNAME, 6) == (0, 3)
+
+
+def test_flat_listing_with_later_episodes_is_kept(updater):
+    """已保存1-5集，平铺分享缺第6集但有7-12集：评分会从第7集继续，预排序不能剔除"""
+    share_data = listing(*range(7, 13))
+    assert updater.score_root_listing(share_data, TASKNAME, 6) == (1, 12)
+
+    resources = [{'taskname': TASKNAME, 'shareurl': SHARE_URL}]
+    listings = {ShareRef.key_of(SHARE_URL): share_data}
+    assert updater.rank_root_listings(resources, listings, TASKNAME, 6, top_k=3) == resources
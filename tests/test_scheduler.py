@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""FailedTaskScheduler：按紧迫程度排序，分数相同时保持配置顺序，顺延的任务下次优先"""
+from datetime import datetime, timedelta
+
+from quark_failed_task_update import FailedTaskScheduler
+
+NOW = datetime(2024, 9, 2, 12, 0)  # 星期一
+
+
+def names(entries):
+    return [task['taskname'] for _, task in entries]
+
+
+def test_ties_keep_config_order(tmp_path):
+    scheduler = FailedTaskScheduler(str(tmp_path / 'schedule.json'))
+    tasks = list(enumerate({'taskname': name} for name in 'ABCD'))
+    assert names(scheduler.order(tasks, NOW)) == ['A', 'B', 'C', 'D']
+
+
+def test_runweek_recency_and_missing_episodes(tmp_path):
+    scheduler = FailedTaskScheduler(str(tmp_path / 'schedule.json'))
+    tasks = list(enumerate([
+        {'taskname': '普通'},
+        {'taskname': '今天更新', 'runweek': [1, 3, 5]},
+        {'taskname': '明天更新', 'runweek': [2]},
+        {'taskname': '最近更新', 'last_updated': (NOW - timedelta(days=1)).isoformat()},
+        {'taskname': '很久以前', 'last_updated': (NOW - timedelta(days=90)).isoformat()},
+        {'taskname': '缺集', 'last_updated': 'invalid'},
+    ]))
+    scheduler.record_missing(tasks[5][1], 3)
+    assert names(scheduler.order(tasks, NOW)) == ['今天更新', '最近更新', '缺集', '普通', '明天更新', '很久以前']
+
+
+def test_deferred_tasks_move_ahead_and_persist(tmp_path):
+    path = str(tmp_path / 'schedule.json')
+    scheduler = FailedTaskScheduler(path)
+    tasks = list(enumerate([{'taskname': '今天更新', 'runweek': [1]}, {'taskname': '顺延'}]))
+    for _ in range(3):
+        scheduler.record_deferred(tasks[1][1])
+    scheduler.save([task for _, task in tasks])
+
+    reloaded = FailedTaskScheduler(path)
+    reloaded.load()
+    assert names(reloaded.order(tasks, NOW)) == ['顺延', '今天更新']
+
+    reloaded.record_processed(tasks[1][1])
+    assert names(reloaded.order(tasks, NOW)) == ['今天更新', '顺延']
+
+
+def test_save_drops_tasks_no_longer_failed(tmp_path):
+    path = str(tmp_path / 'schedule.json')
+    scheduler = FailedTaskScheduler(path)
+    scheduler.record_deferred({'taskname': '已恢复'})
+    scheduler.record_deferred({'taskname': '仍失效'})
+    scheduler.save([{'taskname': '仍失效'}])
+
+    reloaded = FailedTaskScheduler(path)
+    reloaded.load()
+    assert list(reloaded.records) == [FailedTaskScheduler.task_key({'taskname': '仍失效'})]
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""ShareCache：同一分享只请求一次，获取失败的结果也缓存"""
+import requests
+
+from quark_failed_task_update import ShareCache
+
+
+class FakeResponse:
+    def __init__(self, result):
+        self.result = result
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.result
+
+
+def fake_upstream(updater, result=None, error=None):
+    calls = []
+
+    def upstream_request(method, endpoint, job=None, **kwargs):
+        calls.append(kwargs['json']['shareurl'])
+        if error is not None:
+            raise error
+        return FakeResponse(result)
+    updater.upstream_request = upstream_request
+    return calls
+
+
+def test_variants_of_one_share_are_requested_once(updater):
+    calls = fake_upstream(updater, {'success': True, 'data': {'list': []}})
+    share_cache = ShareCache(0)
+    assert updater.get_share_detail('https://pan.quark.cn/s/abc123', share_cache) == {'list': []}
+    assert updater.get_share_detail('https://pan.quark.cn/s/abc123?pwd=x#/list/share', share_cache) == {'list': []}
+    assert len(calls) == 1
+
+
+def test_failed_prefetch_is_not_requested_again(updater):
+    calls = fake_upstream(updater, {'success': False, 'message': '分享已失效'})
+    share_cache = ShareCache(0)
+    share_cache.prefetch(updater.get_share_detail, ['https://pan.quark.cn/s/dead00'])
+    assert updater.get_share_detail('https://pan.quark.cn/s/dead00', share_cache) is None
+    share_cache.close()
+    assert calls == ['https://pan.quark.cn/s/dead00']
+
+
+def test_request_errors_are_cached_as_failures(updater):
+    calls = fake_upstream(updater, error=requests.exceptions.ConnectionError('down'))
+    share_cache = ShareCache(0)
+    assert updater.get_share_detail('https://pan.quark.cn/s/abc123', share_cache) is None
+    assert updater.get_share_detail('https://pan.quark.cn/s/abc123', share_cache) is None
+    assert len(calls) == 1
+
+
+def test_share_cache_interval_is_not_divided_by_workers(updater):
+    """批量添加的各线程共用一个缓存和限速器，间隔就是配置的 request_interval"""
+    updater.config_data['failed_task_update'] = {'request_interval': 2, 'batch_workers': 4}
+    cache = updater.new_share_cache()
+    try:
+        assert cache.limiter.interval == 2
+    finally:
+        cache.close()
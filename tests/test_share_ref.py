@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""ShareRef 分享链接解析与规范键"""
+from quark_failed_task_update import ShareRef
+
+FID = '0123456789abcdef0123456789abcdef'
+SUB_FID = 'fedcba9876543210fedcba9876543210'
+
+
+def test_parse_share_id_pwd_and_fid():
+    ref = ShareRef.parse(f'https://pan.quark.cn/s/abc123?pwd=x9Y2#/list/share/{FID}')
+    assert (ref.share_id, ref.pwd, ref.fid) == ('abc123', 'x9Y2', FID)
+    assert ref.key == f'abc123/{FID}'
+    assert ref.url == f'https://pan.quark.cn/s/abc123?pwd=x9Y2#/list/share/{FID}'
+
+
+def test_deepest_fid_in_nested_fragment_is_used():
+    ref = ShareRef.parse(f'https://pan.quark.cn/s/abc123#/list/share/{FID}-第一季/{SUB_FID}-S01')
+    assert ref.fid == SUB_FID
+
+
+def test_spellings_of_one_share_have_the_same_key():
+    keys = {ShareRef.key_of(url) for url in [
+        'https://pan.quark.cn/s/abc123',
+        'https://pan.quark.cn/s/abc123?pwd=x9Y2',
+        'https://pan.quark.cn/s/abc123#/list/share',
+        'https://pan.quark.cn/s/abc123?entry=sharepage&pwd=x9Y2',
+    ]}
+    assert keys == {'abc123'}
+    assert ShareRef.key_of(f'https://pan.quark.cn/s/abc123#/list/share/{FID}') != 'abc123'
+
+
+def test_fid_outside_share_fragment_is_ignored():
+    assert ShareRef.parse(f'https://pan.quark.cn/s/abc123#/other/{FID}').fid is None
+
+
+def test_unparseable_urls():
+    assert ShareRef.parse('') is None
+    assert ShareRef.parse(None) is None
+    assert ShareRef.parse('https://example.com/file') is None
+    assert ShareRef.key_of('https://example.com/file') == 'https://example.com/file'
+    assert ShareRef.canonical_url('https://example.com/file') == 'https://example.com/file'
+
+
+def test_child_keeps_share_and_pwd():
+    child = ShareRef.parse('https://pan.quark.cn/s/abc123?pwd=x9Y2').child(FID)
+    assert child == ShareRef('abc123', None, FID)
+    assert child.url == f'https://pan.quark.cn/s/abc123?pwd=x9Y2#/list/share/{FID}'
+
+
+def test_dedupe_keeps_first_spelling_and_prefers_pwd(updater):
+    resources = [
+        {'taskname': 'a', 'shareurl': 'https://pan.quark.cn/s/abc123'},
+        {'taskname': 'b', 'shareurl': 'https://pan.quark.cn/s/abc123?pwd=x9Y2#/list/share'},
+        {'taskname': 'c', 'shareurl': 'https://pan.quark.cn/s/def456'},
+    ]
+    assert [r['taskname'] for r in updater.dedupe_candidates(resources)] == ['b', 'c']
+
+
+def test_dedupe_keeps_subfolder_of_same_share(updater):
+    """指向同一分享深层子文件夹的候选不能被根目录候选合并掉"""
+    resources = [
+        {'taskname': 'root', 'shareurl': 'https://pan.quark.cn/s/abc123'},
+        {'taskname': 'sub', 'shareurl': f'https://pan.quark.cn/s/abc123#/list/share/{FID}'},
+        {'taskname': 'sub2', 'shareurl': f'https://pan.quark.cn/s/abc123?entry=x#/list/share/{FID}'},
+    ]
+    assert [r['taskname'] for r in updater.dedupe_candidates(resources)] == ['root', 'sub']
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""TaskStore 导入配置文件时保留尚未导出的本地修改"""
+from quark_failed_task_update import TaskStore
+
+
+def test_import_keeps_pending_rows_for_duplicate_names(tmp_path):
+    store = TaskStore(str(tmp_path / 'tasks.db'))
+    store.import_tasklist([{'taskname': '测试剧', 'savepath': '/a'},
+                           {'taskname': '测试剧', 'savepath': '/b'}], 1)
+    (first_id, _), (second_id, _) = [(task_id, task) for task_id, task in store.connection().execute(
+        'SELECT id, data FROM tasks ORDER BY position')]
+    store.update(first_id, {'taskname': '测试剧', 'savepath': '/a', 'shareurl': 'new-a'})
+    store.update(second_id, {'taskname': '测试剧', 'savepath': '/b', 'shareurl': 'new-b'})
+
+    # 外部修改：第二个同名任务被标记失效，前面插入了另一个任务
+    store.import_tasklist([{'taskname': '其他剧'},
+                           {'taskname': '测试剧', 'savepath': '/a'},
+                           {'taskname': '测试剧', 'savepath': '/b', 'shareurl_ban': '失效'}], 2)
+
+    tasks = store.tasklist()
+    assert [task.get('shareurl') for task in tasks] == [None, 'new-a', 'new-b']
+    assert [task.get('savepath') for task in tasks] == [None, '/a', '/b']
+    assert store.has_pending()
+
+
+def test_import_appends_local_only_tasks_and_export_clears_pending(tmp_path):
+    store = TaskStore(str(tmp_path / 'tasks.db'))
+    store.import_tasklist([{'taskname': '甲'}], 1)
+    store.add([{'taskname': '乙'}, {'taskname': '乙'}])
+    store.import_tasklist([{'taskname': '甲', 'shareurl_ban': '失效'}], 2)
+    assert [task['taskname'] for task in store.tasklist()] == ['甲', '乙', '乙']
+    assert [task['taskname'] for _, task in store.failed()] == ['甲']
+
+    store.mark_exported(3)
+    assert not store.has_pending()
+    assert store.source_mtime() == '3'
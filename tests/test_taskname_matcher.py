@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""TasknameMatcher 相似度评分"""
+from quark_failed_task_update import TasknameMatcher
+
+
+def test_same_name_and_decorated_candidates_match():
+    matcher = TasknameMatcher()
+    assert matcher.score('测试剧', '测试剧') == 1.0
+    assert matcher.is_match('【测试剧】全集 4K', '测试剧')
+    assert matcher.is_match('测试剧 第二季', '测试剧')
+
+
+def test_season_spellings_are_equivalent():
+    matcher = TasknameMatcher()
+    assert matcher.score('测试剧 S2', '测试剧 第二季') == 1.0
+    assert matcher.score('测试剧 第2季 更新至10集', '测试剧 第二季') == 1.0
+
+
+def test_different_seasons_are_rejected():
+    matcher = TasknameMatcher()
+    assert matcher.score('测试剧 第一季', '测试剧 第二季') == 0.0
+    assert matcher.score('测试剧 S01 1080p', '测试剧 S02') == 0.0
+
+
+def test_candidate_without_season_is_below_threshold():
+    # 原任务指定了季数而候选没有时无法确认是同一季，不能通过匹配
+    matcher = TasknameMatcher()
+    assert matcher.score('测试剧', '测试剧 第二季') <= TasknameMatcher.MISSING_SEASON_SCORE
+    assert not matcher.is_match('测试剧', '测试剧 第二季')
+    assert not matcher.is_match('【测试剧】全集', '测试剧 第二季')
+
+
+def test_aliases_are_applied_to_both_names():
+    matcher = TasknameMatcher({'权游': '权力的游戏'})
+    assert matcher.score('权游 全集', '权力的游戏') == 1.0
+    assert matcher.score('斗罗大陆Ⅱ绝世唐门', '绝世唐门') == 1.0
+
+
+def test_rank_filters_and_orders_by_score():
+    matcher = TasknameMatcher()
+    resources = [{'taskname': '另一部剧'}, {'taskname': '测试剧'}, {'taskname': ''}, {'taskname': '测试剧 4K'}]
+    ranked = matcher.rank(resources, '测试剧')
+    assert [resource['taskname'] for resource in ranked] == ['测试剧', '测试剧 4K']
+    assert all(resource['match_score'] == 1.0 for resource in ranked)
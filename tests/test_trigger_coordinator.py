@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""TriggerCoordinator：更新脚本与API通过配置文件旁的任务状态库共享触发记录"""
+from quark_failed_task_update import FailedTaskIncrementalUpdater
+
+
+def test_daemon_batch_joins_trigger_fired_by_another_process(updater):
+    other = FailedTaskIncrementalUpdater(updater.config_path)  # 另一个进程（例如API服务）
+    calls = []
+    updater.trigger_coordinator.trigger = lambda: calls.append('daemon') or True
+    other.trigger_coordinator.trigger = lambda: calls.append('api') or True
+
+    results = []
+    updater.trigger_coordinator.window = 3600
+    updater.request_resource_update(lambda batch_id, success: results.append((batch_id, success)))
+    api_batch = other.request_resource_update()  # 窗口为0，立即触发并记录
+    updater.trigger_coordinator.flush()
+
+    assert calls == ['api']
+    assert results == [(api_batch, True)]
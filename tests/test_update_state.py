@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""断点状态：只有完整遍历的分析结果在续跑时复用"""
+from quark_failed_task_update import EpisodeFile
+
+
+def make_analysis(url, **flags):
+    episodes = [EpisodeFile(f'fid{ep}', f'测试剧 第{ep}集.mp4', ep) for ep in (1, 2, 3)]
+    return {'url': url, 'is_valid': True, 'all_episodes': episodes,
+            'folder_episodes': {'根目录': {'episodes': episodes, 'folder_path': [], 'share_url': url}}, **flags}
+
+
+def test_only_complete_analyses_are_resumed(updater):
+    task_state = updater.get_task_state({'taskname': '测试剧', 'shareurl': 'https://pan.quark.cn/s/old'})
+    cases = {
+        'https://pan.quark.cn/s/full01': {},
+        'https://pan.quark.cn/s/stop01': {'stopped_early': True},
+        'https://pan.quark.cn/s/part01': {'partial': True},
+        'https://pan.quark.cn/s/inco01': {'incomplete': True},
+    }
+    for url, flags in cases.items():
+        updater.checkpoint_analysis(task_state, url, make_analysis(url, **flags))
+
+    # 重新加载断点文件，模拟中断后再次运行
+    assert updater.load_update_state()
+    task_state = updater.get_task_state({'taskname': '测试剧', 'shareurl': 'https://pan.quark.cn/s/old'})
+    resumed = {url for url in cases if updater.resumable_analysis(task_state, url)}
+    assert resumed == {'https://pan.quark.cn/s/full01'}
+
+    analysis = updater.deserialize_analysis(updater.resumable_analysis(task_state, 'https://pan.quark.cn/s/full01'))
+    assert [ep.episode for ep in analysis['all_episodes']] == [1, 2, 3]